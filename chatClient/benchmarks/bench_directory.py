@@ -0,0 +1,107 @@
+# Micro-benchmark: /list em texto contra o /directory paginado com etag
+#
+# Sobe o servidor de referência no mesmo processo com N clientes registrados
+# (conexões sem socket, só para povoar o diretório) e mede, para um cliente
+# de verdade, bytes recebidos e tempo até ter a lista de IDs: o /list
+# raspado com regex como o chatClientQt fazia, a leitura completa do
+# diretório e a revalidação quando nada mudou.
+#
+#   cd chatClient && python -m benchmarks.bench_directory --clients 50000
+import argparse
+import asyncio
+import re
+import time
+
+from chatcore import CLIENT_LIST_PREFIX, SERVER_ID, ChatEngine, EngineHandler
+from chatcore.server import ChatServer, ClientConnection
+
+HOST = "127.0.0.1"
+
+
+class CountingEngine(ChatEngine):
+    received = 0
+
+    def data_received(self, data):
+        self.received += len(data)
+        super().data_received(data)
+
+
+class Handler(EngineHandler):
+    def __init__(self):
+        self.ready = asyncio.get_running_loop().create_future()
+        self.result = None
+
+    def on_client_id(self, engine, client_id):
+        if not self.ready.done():
+            self.ready.set_result(None)
+
+    def on_directory(self, engine, changed):
+        self.result.set_result(changed)
+
+    def on_message(self, engine, data):
+        content = data.get("Content", "")
+        if data.get("SenderId") == SERVER_ID and CLIENT_LIST_PREFIX in content:
+            ids = []
+            for line in content.splitlines()[1:]:
+                match = re.match(r"ID:\s*(\d+)", line)
+                if match:
+                    ids.append(int(match.group(1)))
+            self.result.set_result(ids)
+
+
+async def measure(engine, handler, request):
+    handler.result = asyncio.get_running_loop().create_future()
+    engine.received = 0
+    start = time.perf_counter()
+    request()
+    value = await asyncio.wait_for(handler.result, 60)
+    return value, engine.received, time.perf_counter() - start
+
+
+async def main_async(args):
+    server = ChatServer(HOST, 0)
+    await server.start()
+    port = server._server.sockets[0].getsockname()[1]
+    for _ in range(args.clients):
+        server.register(ClientConnection(server))
+
+    handler = Handler()
+    engine = CountingEngine(HOST, port, handler=handler, keepalive=False)
+    await engine.connect()
+    await handler.ready
+    # Espera as respostas da conexão (sessão, binário, grupos)
+    while engine._probes:
+        await asyncio.sleep(0.01)
+
+    runs = (
+        ("/list (texto + regex)", engine.request_clients_list),
+        ("/directory completo", lambda: engine.refresh_directory(args.page)),
+        ("/directory sem mudança", lambda: engine.refresh_directory(args.page)),
+    )
+    print(f"{args.clients} clientes conectados, páginas de {args.page}:")
+    for label, request in runs:
+        times = []
+        for _ in range(args.repeat):
+            if label == "/directory completo":
+                engine.directory.etag = None    # descarta a cópia local
+            value, received, elapsed = await measure(engine, handler, request)
+            times.append(elapsed)
+        count = len(value) if isinstance(value, list) else len(engine.directory)
+        print(f"  {label:<24} {received / 1024:9.1f} KB recebidos, {min(times) * 1000:8.2f} ms "
+              f"({count} clientes)")
+
+    engine.close()
+    server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do diretório de clientes")
+    parser.add_argument("--clients", type=int, default=20000)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
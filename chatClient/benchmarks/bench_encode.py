@@ -0,0 +1,68 @@
+# Micro-benchmark: codificação de frames antes/depois do chatcore.protocol
+#
+#   cd chatClient && python -m benchmarks.bench_encode
+import json
+import time
+from timeit import repeat
+
+from chatcore import MessageEncoder
+
+CLIENT_ID = 17
+PEER_ID = 42
+CONTENT = "Olá, tudo bem? Esta é uma mensagem de tamanho típico no chat."
+
+
+def legacy_message():
+    msg_dict = {
+        "SenderId": CLIENT_ID,
+        "ReceiverId": PEER_ID,
+        "Content": CONTENT,
+        "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
+        "ConversationId": PEER_ID
+    }
+    return json.dumps(msg_dict).encode('utf-8')
+
+
+def legacy_heartbeat():
+    msg_dict = {
+        "SenderId": CLIENT_ID,
+        "ReceiverId": 0,
+        "Content": "heartbeat",
+        "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
+        "ConversationId": 0
+    }
+    return json.dumps(msg_dict).encode('utf-8')
+
+
+def legacy_ack():
+    msg_dict = {
+        "SenderId": CLIENT_ID,
+        "ReceiverId": PEER_ID,
+        "Content": "/acknoledgment",
+        "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
+        "ConversationId": PEER_ID
+    }
+    return json.dumps(msg_dict).encode('utf-8')
+
+
+def encodes_per_second(func, number=100_000):
+    best = min(repeat(func, number=number, repeat=5))
+    return number / best
+
+
+def main():
+    encoder = MessageEncoder(CLIENT_ID)
+    cases = [
+        ("message", legacy_message, lambda: encoder.message(PEER_ID, CONTENT)),
+        ("heartbeat", legacy_heartbeat, lambda: encoder.heartbeat),
+        ("ack", legacy_ack, lambda: encoder.ack(PEER_ID)),
+    ]
+    print(f"{'frame':<10} {'antes (enc/s)':>15} {'depois (enc/s)':>15} {'ganho':>8}")
+    for name, before, after in cases:
+        rate_before = encodes_per_second(before)
+        rate_after = encodes_per_second(after)
+        print(f"{name:<10} {rate_before:>15,.0f} {rate_after:>15,.0f} {rate_after / rate_before:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# Micro-benchmark: N identidades de bot como o testetcp01 (threads por
+# conexão) contra as mesmas N no gateway (um event loop)
+#
+# O servidor de referência roda num processo à parte e cada modo num
+# processo próprio, para medir memória (RSS), threads e CPU só do cliente.
+# Carga: as identidades formam pares e cada uma manda `--messages` mensagens
+# ao seu par, que confirma cada uma; depois tudo fica ocioso por `--idle` s.
+#
+#   cd chatClient && python -m benchmarks.bench_gateway --identities 300
+import argparse
+import asyncio
+import multiprocessing
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from chatcore import (
+    ASSIGNED_ID_PREFIX, BLOCK, DEFAULT_IDLE_TIMEOUT, DELIVERED, MSG_DELIVERED, SERVER_ID,
+    FrameDecoder, MessageEncoder, SocketWriter, interval_for
+)
+from chatcore.gateway import BotGateway
+
+HOST = "127.0.0.1"
+
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+class ThreadedBot:
+    # O que cada cópia do testetcp01 faz: writer com thread própria, thread
+    # de recepção e uma thread parada esperando entrada (aqui uma fila)
+    def __init__(self, port):
+        self.sock = socket.create_connection((HOST, port))
+        self.decoder = FrameDecoder()
+        self.client_id = None
+        while self.client_id is None:
+            self.decoder.recv_into(self.sock)
+            for data in self.decoder.messages():
+                if ASSIGNED_ID_PREFIX in data.get("Content", ""):
+                    self.client_id = data["ReceiverId"]
+        self.encoder = MessageEncoder(self.client_id)
+        self.writer = SocketWriter(self.sock, policy=BLOCK)
+        self.writer.set_keepalive(self.encoder.heartbeat, interval_for(DEFAULT_IDLE_TIMEOUT))
+        self.writer.start()
+        self.delivered = 0
+        self.done = threading.Event()
+        self.expected = 0
+        self.input = queue.Queue()
+        threading.Thread(target=self.receive, daemon=True).start()
+        threading.Thread(target=self.read_input, daemon=True).start()
+
+    def receive(self):
+        while True:
+            for data in self.decoder.messages():
+                sender = data.get("SenderId")
+                if sender == SERVER_ID:
+                    if data.get("Content") == DELIVERED:
+                        self.delivered += 1
+                        if self.delivered >= self.expected:
+                            self.done.set()
+                else:
+                    self.writer.send(self.encoder.ack(sender), priority=True)
+            try:
+                if self.decoder.recv_into(self.sock) == 0:
+                    return
+            except OSError:
+                return
+
+    def read_input(self):
+        # input() do testetcp01
+        while True:
+            frame = self.input.get()
+            if frame is None:
+                return
+            self.writer.send(frame)
+
+    def close(self):
+        self.input.put(None)
+        self.writer.close()
+        self.sock.close()
+
+
+def run_threads(port, count, messages, idle):
+    base = rss_kb()
+    bots = [ThreadedBot(port) for _ in range(count)]
+    connected_rss = rss_kb()
+    cpu = time.process_time()
+    start = time.perf_counter()
+    for a, b in zip(bots[0::2], bots[1::2]):
+        for bot, peer in ((a, b), (b, a)):
+            bot.expected = messages
+            bot.input.put(bot.encoder.connect(peer.client_id))
+    time.sleep(0.5)     # /connect antes das mensagens (o servidor .NET exige)
+    for bot in bots[:count // 2 * 2]:
+        peer_id = bots[bots.index(bot) ^ 1].client_id
+        for i in range(messages):
+            bot.input.put(bot.encoder.message(peer_id, f"alerta {i}"))
+    for bot in bots[:count // 2 * 2]:
+        bot.done.wait(60)
+    work = time.perf_counter() - start - 0.5
+    work_cpu = time.process_time() - cpu
+    cpu = time.process_time()
+    time.sleep(idle)
+    idle_cpu = time.process_time() - cpu
+    result = (connected_rss - base, threading.active_count(), work, work_cpu, idle_cpu, rss_kb() - base)
+    for bot in bots:
+        bot.close()
+    return result
+
+
+async def gateway_async(port, count, messages, idle):
+    base = rss_kb()
+    gateway = BotGateway(HOST, port)
+    await gateway.add_many([f"bot-{i}" for i in range(count)])
+    connected_rss = rss_kb()
+    names = list(gateway.identities)
+    pending = {"left": (count // 2 * 2) * messages}
+    finished = asyncio.get_running_loop().create_future()
+
+    def on_event(event):
+        if event["event"] == "state" and event["state"] == MSG_DELIVERED:
+            pending["left"] -= 1
+            if pending["left"] == 0 and not finished.done():
+                finished.set_result(None)
+    gateway.subscribe(on_event)
+
+    cpu = time.process_time()
+    start = time.perf_counter()
+    for a, b in zip(names[0::2], names[1::2]):
+        for name, peer in ((a, b), (b, a)):
+            peer_id = gateway.identities[peer].client_id
+            for i in range(messages):
+                gateway.send(name, peer_id, f"alerta {i}")
+    await asyncio.wait_for(finished, 60)
+    work = time.perf_counter() - start
+    work_cpu = time.process_time() - cpu
+    cpu = time.process_time()
+    await asyncio.sleep(idle)
+    idle_cpu = time.process_time() - cpu
+    result = (connected_rss - base, threading.active_count(), work, work_cpu, idle_cpu, rss_kb() - base)
+    await gateway.close()
+    return result
+
+
+def run_gateway(port, count, messages, idle):
+    return asyncio.run(gateway_async(port, count, messages, idle))
+
+
+def worker(mode, port, count, messages, idle, results):
+    run = run_threads if mode == "threads" else run_gateway
+    results.put(run(port, count, messages, idle))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do gateway de bots")
+    parser.add_argument("--identities", type=int, default=300)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--idle", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=8897)
+    args = parser.parse_args()
+
+    server = subprocess.Popen([sys.executable, "-m", "chatcore.server", "--port", str(args.port),
+                               "--log-level", "WARNING"])
+    try:
+        time.sleep(1.0)
+        n = args.identities
+        print(f"{n} identidades, {args.messages} mensagens cada (com confirmação), "
+              f"{args.idle:g} s ociosas:")
+        for mode in ("threads", "gateway"):
+            results = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=worker, args=(mode, args.port, n, args.messages, args.idle, results))
+            process.start()
+            rss, threads, work, work_cpu, idle_cpu, final_rss = results.get()
+            process.join()
+            total = (n // 2 * 2) * args.messages
+            print(f"  {mode:<8} threads {threads:5d} | RSS {rss / n:6.1f} KB/identidade "
+                  f"(após carga {final_rss / n:6.1f}) | carga {total / work:9,.0f} msg/s, "
+                  f"CPU {work_cpu / total * 1e6:6.1f} µs/msg | ocioso {idle_cpu / args.idle * 100:5.1f}% CPU")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
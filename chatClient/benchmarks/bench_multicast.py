@@ -0,0 +1,139 @@
+# Micro-benchmark: /multicast para um grupo contra N envios privados
+#
+# Sobe o servidor de referência no mesmo processo, conecta N receptores e
+# um remetente, e mede o tempo até todos os N receberem a mensagem e quanto
+# o remetente precisou mandar para isso.
+#
+#   cd chatClient && python -m benchmarks.bench_multicast --receivers 500
+import argparse
+import asyncio
+import statistics
+import time
+
+from chatcore import SERVER_ID, ChatEngine, EngineHandler
+from chatcore.server import ChatServer
+
+HOST = "127.0.0.1"
+
+
+class Receiver(EngineHandler):
+    def __init__(self, port, binary):
+        self.engine = ChatEngine(HOST, port, handler=self, binary=binary, keepalive=False)
+        self.ready = asyncio.get_running_loop().create_future()
+        self.counter = None
+
+    def on_group(self, engine, event, group_id, name):
+        if event == "list" and not self.ready.done():
+            self.ready.set_result(None)
+
+    def on_message(self, engine, data):
+        if data.get("SenderId") != SERVER_ID and self.counter is not None:
+            self.counter.hit()
+
+
+class Counter:
+    def __init__(self, target):
+        self.target = target
+        self.seen = 0
+        self.done = asyncio.get_running_loop().create_future()
+
+    def hit(self):
+        self.seen += 1
+        if self.seen == self.target and not self.done.done():
+            self.done.set_result(time.perf_counter())
+
+
+class Sender(Receiver):
+    def __init__(self, port, binary):
+        super().__init__(port, binary)
+        self.sent_bytes = 0
+        self.sent_frames = 0
+
+    def count(self, frame):
+        self.sent_bytes += len(frame)
+        self.sent_frames += 1
+
+
+async def run_round(sender, receivers, send):
+    counter = Counter(len(receivers))
+    for receiver in receivers:
+        receiver.counter = counter
+    bytes_before, frames_before = sender.sent_bytes, sender.sent_frames
+    start = time.perf_counter()
+    send()
+    finished = await asyncio.wait_for(counter.done, 30)
+    return finished - start, sender.sent_bytes - bytes_before, sender.sent_frames - frames_before
+
+
+def report(label, results):
+    times = [r[0] * 1000 for r in results]
+    print(f"  {label:<26} mediana {statistics.median(times):8.2f} ms  "
+          f"p95 {sorted(times)[int(len(times) * 0.95) - 1]:8.2f} ms  "
+          f"enviado: {results[0][2]} frames, {results[0][1]:,} bytes")
+
+
+async def main_async(args):
+    server = ChatServer(HOST, 0)
+    await server.start()
+    port = server._server.sockets[0].getsockname()[1]
+
+    receivers = [Receiver(port, args.binary) for _ in range(args.receivers)]
+    sender = Sender(port, args.binary)
+    for client in receivers + [sender]:
+        await client.engine.connect()
+    await asyncio.gather(*(client.ready for client in receivers + [sender]))
+
+    # Conta o que o remetente entrega ao transport
+    engine = sender.engine
+    original_send = engine.send
+
+    def counting_send(frame, priority=False):
+        sender.count(frame)
+        return original_send(frame, priority)
+    engine.send = counting_send
+
+    ids = [r.engine.client_id for r in receivers]
+    engine.create_group("bench", ids)
+    while not engine.groups:
+        await asyncio.sleep(0.01)
+    group_id = next(iter(engine.groups))
+    text = "x" * args.size
+
+    def fan_out():
+        engine.send_message(group_id, text)
+
+    def separate():
+        # O jeito de hoje: uma mensagem privada por destinatário, cada uma
+        # precedida da troca de conversa (/exit + /connect) feita pelo engine
+        for client_id in ids:
+            engine.send_message(client_id, text)
+
+    print(f"{args.receivers} receptores, mensagem de {args.size} bytes, "
+          f"formato {engine.wire}, {args.rounds} rodadas:")
+    for label, send in (("/multicast (grupo)", fan_out), ("N envios separados", separate)):
+        results = []
+        for _ in range(args.rounds):
+            results.append(await run_round(sender, receivers, send))
+            await engine.drain()
+            # Deixa as respostas do servidor ao remetente chegarem antes da próxima
+            await asyncio.sleep(0.05)
+        report(label, results)
+
+    for client in receivers + [sender]:
+        client.engine.close()
+    server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de envio para vários destinos")
+    parser.add_argument("--receivers", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--json", dest="binary", action="store_false",
+                        help="fica no formato JSON em vez de negociar o binário")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# Micro-benchmark: custo do índice FTS5 por mensagem e latência das buscas
+#
+#   cd chatClient && python -m benchmarks.bench_search --messages 2000000
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import time
+
+from chatcore import MessageStore
+from chatcore.store import BATCH_SIZE, _INSERT, _SCHEMA, _connect
+
+# Vocabulário com frequências de Zipf: poucas palavras muito comuns e uma
+# cauda longa de raras, como em conversa de verdade
+COMMON = ("oi olá tudo bem bom dia boa noite obrigado valeu sim não talvez "
+          "hoje amanhã agora depois reunião projeto servidor cliente mensagem").split()
+
+
+def make_vocabulary(size, rng):
+    letters = "abcdefghijlmnoprstuvz"
+    words = list(COMMON)
+    while len(words) < size:
+        words.append("".join(rng.choice(letters) for _ in range(rng.randint(4, 10))))
+    cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    return words, cumulative
+
+
+def make_rows(count, peers, vocabulary, rng):
+    words, cumulative = vocabulary
+    base = time.time() - count
+    for i in range(count):
+        peer = i % peers
+        text = " ".join(rng.choices(words, cum_weights=cumulative, k=rng.randint(3, 14)))
+        yield peer, peer, None, base + i, None, text
+
+
+def write_plain(path, rows, batch_size):
+    # Mesmo esquema e mesmos lotes, sem o índice: a diferença é o custo do FTS5
+    db = _connect(path)
+    db.executescript(_SCHEMA)
+    start = time.perf_counter()
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            with db:
+                db.executemany(_INSERT, batch)
+            batch = []
+    if batch:
+        with db:
+            db.executemany(_INSERT, batch)
+    elapsed = time.perf_counter() - start
+    db.close()
+    return elapsed
+
+
+def write_store(path, rows):
+    store = MessageStore(path)
+    start = time.perf_counter()
+    for row in rows:
+        peer, sender, conversation_id, received_at, timestamp, content = row
+        store.add(peer, sender, content, conversation_id, timestamp, received_at)
+    store.flush()
+    return store, time.perf_counter() - start
+
+
+def measure(label, run, queries):
+    latencies = []
+    hits = 0
+    for _ in range(queries):
+        t0 = time.perf_counter()
+        hits += len(run())
+        latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"  {label:<28} p50 {p50:7.2f} ms  p99 {p99:7.2f} ms  ({hits / queries:.0f} resultados)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da busca no histórico (FTS5)")
+    parser.add_argument("--messages", type=int, default=2_000_000)
+    parser.add_argument("--peers", type=int, default=1000)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    print(f"gerando {args.messages:,} mensagens...")
+    rows = list(make_rows(args.messages, args.peers, vocabulary, rng))
+
+    with tempfile.TemporaryDirectory(prefix="chattcp-bench-") as directory:
+        plain = write_plain(os.path.join(directory, "sem-indice.db"), rows, BATCH_SIZE)
+        path = os.path.join(directory, "mensagens.db")
+        store, indexed = write_store(path, rows)
+        n = args.messages
+        print(f"gravação sem índice: {plain / n * 1e6:.1f} µs/msg | com FTS5: {indexed / n * 1e6:.1f} µs/msg "
+              f"| custo do índice: {(indexed - plain) / n * 1e6:.1f} µs/msg")
+        print(f"arquivo: {os.path.getsize(path) / 1e6:.0f} MB")
+        del rows
+
+        words = vocabulary[0]
+        rare = words[len(words) // 2:]
+        newest = time.time()
+        week = 7 * 86400
+        limit = args.limit
+        print(f"buscas (limite {limit}):")
+        measure("termo comum", lambda: store.search(rng.choice(COMMON), limit=limit), args.queries)
+        measure("termo raro", lambda: store.search(rng.choice(rare), limit=limit), args.queries)
+        measure("prefixo (3 letras)", lambda: store.search(rng.choice(rare)[:3] + "*", limit=limit),
+                args.queries)
+        measure("frase", lambda: store.search('"bom dia"', limit=limit), args.queries)
+        measure("comum + raro (AND)",
+                lambda: store.search(f"{rng.choice(COMMON)} {rng.choice(rare)}", limit=limit), args.queries)
+        measure("termo comum + par", lambda: store.search(
+            rng.choice(COMMON), peer=rng.randrange(args.peers), limit=limit), args.queries)
+        measure("termo raro + par", lambda: store.search(
+            rng.choice(rare), peer=rng.randrange(args.peers), limit=limit), args.queries)
+        measure("termo comum + período", lambda: store.search(
+            rng.choice(COMMON), since=newest - n / 2 - week, until=newest - n / 2, limit=limit), args.queries)
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Micro-benchmark: gravação em lote e leitura da última página no MessageStore
+#
+#   cd chatClient && python -m benchmarks.bench_store --messages 1000000
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from chatcore import MessageStore
+
+CONTENT = "Olá, tudo bem? Esta é uma mensagem de tamanho típico no chat."
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do armazenamento SQLite")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--peers", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--page", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="chattcp-bench-") as directory:
+        path = os.path.join(directory, "mensagens.db")
+        store = MessageStore(path)
+        start = time.perf_counter()
+        base = time.time() - args.messages
+        for i in range(args.messages):
+            peer = i % args.peers
+            store.add(peer, peer, CONTENT, peer, None, base + i)
+        enqueued = time.perf_counter() - start
+        store.flush()
+        elapsed = time.perf_counter() - start
+        print(f"gravação: {args.messages:,} mensagens em {elapsed:.2f} s "
+              f"({args.messages / elapsed:,.0f} msg/s; enfileirar: {args.messages / enqueued:,.0f} msg/s, "
+              f"{store.batches:,} lotes)")
+
+        latencies = []
+        for _ in range(args.queries):
+            peer = random.randrange(args.peers)
+            t0 = time.perf_counter()
+            page = store.latest(peer, args.page)
+            latencies.append(time.perf_counter() - t0)
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+        print(f"última página ({len(page)} linhas): p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+        print(f"arquivo: {os.path.getsize(path) / 1e6:.0f} MB")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Micro-benchmark: vazão de uma transferência de arquivo e latência do chat
+# enquanto ela acontece
+#
+# Sobe o servidor de referência no mesmo processo, conecta remetente e
+# receptor e envia um arquivo aleatório; durante o envio o remetente manda
+# uma mensagem de chat a cada 20 ms e mede o tempo até o "Message delivered.".
+#
+#   cd chatClient && python -m benchmarks.bench_transfer --megabytes 500
+import argparse
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+
+from chatcore import FILE_COMPLETE, FILE_FAILED, WIRE_BINARY, ChatEngine, EngineHandler
+from chatcore.server import ChatServer
+
+HOST = "127.0.0.1"
+CHAT_INTERVAL = 0.02
+
+
+class Handler(EngineHandler):
+    def __init__(self):
+        self.ready = asyncio.get_running_loop().create_future()
+        self.done = asyncio.get_running_loop().create_future()
+
+    def on_client_id(self, engine, client_id):
+        if not self.ready.done():
+            self.ready.set_result(None)
+
+    def on_file(self, engine, transfer):
+        if transfer.state in (FILE_COMPLETE, FILE_FAILED) and not self.done.done():
+            self.done.set_result(transfer)
+
+
+def write_random(path, megabytes):
+    with open(path, "wb") as f:
+        for _ in range(megabytes):
+            f.write(os.urandom(1024 * 1024))
+
+
+def digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+async def main_async(args, directory):
+    source = os.path.join(directory, "origem.bin")
+    write_random(source, args.megabytes)
+    size = os.path.getsize(source)
+
+    server = ChatServer(HOST, 0)
+    await server.start()
+    port = server._server.sockets[0].getsockname()[1]
+    sender, receiver = Handler(), Handler()
+    a = ChatEngine(HOST, port, handler=sender, keepalive=False)
+    b = ChatEngine(HOST, port, handler=receiver, keepalive=False,
+                   download_dir=os.path.join(directory, "recebidos"))
+    await a.connect()
+    await b.connect()
+    await asyncio.gather(sender.ready, receiver.ready)
+    # O binário é negociado logo depois da sessão
+    while a.wire != WIRE_BINARY or b.wire != WIRE_BINARY:
+        await asyncio.sleep(0.01)
+    a.connect_to(b.client_id)
+    await a.drain()
+    await asyncio.sleep(0.1)
+
+    async def chat():
+        while not sender.done.done():
+            a.send_message(b.client_id, "mensagem durante a transferência")
+            await asyncio.sleep(CHAT_INTERVAL)
+
+    start = time.perf_counter()
+    a.send_file(b.client_id, source)
+    chatting = asyncio.ensure_future(chat())
+    sent = await asyncio.wait_for(sender.done, 600)
+    received = await asyncio.wait_for(receiver.done, 600)
+    elapsed = time.perf_counter() - start
+    chatting.cancel()
+
+    print(f"{size / 1e6:.0f} MB em {elapsed:.2f} s: {size / elapsed / 1e6:.0f} MB/s "
+          f"(envio: {sent.state}, recepção: {received.state})")
+    print(f"chat durante a transferência: {a.delivery.summary()}")
+    if received.state == FILE_COMPLETE:
+        print(f"conteúdo idêntico: {digest(source) == digest(received.path)}")
+
+    a.close()
+    b.close()
+    server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de transferência de arquivos")
+    parser.add_argument("--megabytes", type=int, default=200)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix="chattcp-bench-") as directory:
+        asyncio.run(main_async(args, directory))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# Micro-benchmark: formato JSON vs binário (bytes por frame e enc/dec por segundo)
+#
+#   cd chatClient && python -m benchmarks.bench_wire
+from timeit import repeat
+
+from chatcore import WIRE_BINARY, WIRE_JSON, MessageEncoder, decode_payload
+
+CLIENT_ID = 17
+PEER_ID = 42
+CONTENT = "Olá, tudo bem? Esta é uma mensagem de tamanho típico no chat."
+
+
+def ops_per_second(func, number=100_000):
+    best = min(repeat(func, number=number, repeat=5))
+    return number / best
+
+
+def frames(wire):
+    encoder = MessageEncoder(CLIENT_ID, wire=wire)
+    return [
+        ("message", lambda: encoder.message(PEER_ID, CONTENT)),
+        ("heartbeat", lambda: encoder.heartbeat),
+        ("ack", lambda: encoder.ack(PEER_ID)),
+    ]
+
+
+def payload(wire, frame):
+    # O binário sai com o prefixo de tamanho de 4 bytes; o decoder recebe só o payload
+    return frame[4:] if wire == WIRE_BINARY else frame
+
+
+def main():
+    json_cases = frames(WIRE_JSON)
+    binary_cases = frames(WIRE_BINARY)
+    print(f"{'frame':<10} {'json (B)':>9} {'bin (B)':>8} {'json enc/s':>12} {'bin enc/s':>12}"
+          f" {'json dec/s':>12} {'bin dec/s':>12}")
+    for (name, json_encode), (_, binary_encode) in zip(json_cases, binary_cases):
+        json_frame = json_encode()
+        binary_frame = binary_encode()
+        json_payload = payload(WIRE_JSON, json_frame)
+        binary_payload = payload(WIRE_BINARY, binary_frame)
+        print(f"{name:<10} {len(json_frame):>9} {len(binary_frame):>8}"
+              f" {ops_per_second(json_encode):>12,.0f} {ops_per_second(binary_encode):>12,.0f}"
+              f" {ops_per_second(lambda: decode_payload(json_payload)):>12,.0f}"
+              f" {ops_per_second(lambda: decode_payload(binary_payload)):>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
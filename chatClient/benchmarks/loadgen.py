@@ -0,0 +1,246 @@
+# Gerador de carga para o servidor de chat
+#
+# Cada cliente sintético faz o mesmo fluxo do testetcp01.py: recebe o ID
+# ("Your assigned client ID is"), conecta com um par via /connect e troca
+# mensagens privadas. Os clientes são divididos entre alguns processos, cada
+# um com um event loop asyncio.
+#
+#   cd chatClient && python -m benchmarks.loadgen --clients 2000 --processes 4 \
+#       --duration 30 --output resultados.json
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import time
+from collections import deque
+
+from chatcore import CONNECTED_PREFIX, DELIVERED, SERVER_ID, ChatEngine, EngineHandler
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentiles(samples_ns):
+    if not samples_ns:
+        return {"count": 0}
+    ordered = sorted(samples_ns)
+    result = {"count": len(ordered)}
+    for p in PERCENTILES:
+        index = max(0, -(-len(ordered) * p // 100) - 1)
+        result[f"p{p}_ms"] = ordered[index] / 1e6
+    result["max_ms"] = ordered[-1] / 1e6
+    return result
+
+
+class LoadClient(EngineHandler):
+    def __init__(self, host, port, window, ack):
+        self.engine = ChatEngine(host, port, handler=self)
+        self.window = window
+        self.ack = ack
+        self.peer = None
+        self.in_flight = deque()     # instantes de envio aguardando "Message delivered."
+        self.wakeup = asyncio.Event()
+        self.got_id = asyncio.get_running_loop().create_future()
+        self.paired = asyncio.get_running_loop().create_future()
+        self.delivered_ns = []
+        self.peer_ns = []
+        self.sent = 0
+
+    def on_client_id(self, engine, client_id):
+        if not self.got_id.done():
+            self.got_id.set_result(client_id)
+
+    def on_message(self, engine, data):
+        now = time.perf_counter_ns()
+        sender = data.get("SenderId")
+        content = data.get("Content", "")
+        if sender == SERVER_ID:
+            if content == DELIVERED:
+                if self.in_flight:
+                    self.delivered_ns.append(now - self.in_flight.popleft())
+                self.wakeup.set()
+            elif content.startswith(CONNECTED_PREFIX) and not self.paired.done():
+                self.paired.set_result(True)
+            return
+        if sender == self.peer and content.startswith("lg "):
+            self.peer_ns.append(now - int(content.split(" ", 2)[1]))
+            if self.ack:
+                engine.acknowledge(sender)
+
+    def on_disconnected(self, engine, exc):
+        for future in (self.got_id, self.paired):
+            if not future.done():
+                future.set_result(None)
+        self.wakeup.set()
+
+    async def run_messages(self, deadline, interval):
+        next_send = time.perf_counter()
+        while time.perf_counter() < deadline and self.engine.connected:
+            if len(self.in_flight) >= self.window:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), deadline - time.perf_counter())
+                except asyncio.TimeoutError:
+                    break
+                continue
+            if interval:
+                delay = next_send - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                next_send += interval
+            sent_at = time.perf_counter_ns()
+            self.in_flight.append(sent_at)
+            self.engine.send_message(self.peer, f"lg {sent_at} {self.sent}")
+            self.sent += 1
+
+
+async def run_worker(config, count):
+    host, port = config["host"], config["port"]
+    limit = asyncio.Semaphore(config["connect_concurrency"])
+    setup_ns = []
+    failed = 0
+
+    async def open_client():
+        nonlocal failed
+        async with limit:
+            client = LoadClient(host, port, config["window"], config["ack"])
+            started = time.perf_counter_ns()
+            try:
+                await client.engine.connect()
+                client_id = await asyncio.wait_for(client.got_id, config["timeout"])
+            except (OSError, asyncio.TimeoutError):
+                client_id = None
+            if client_id is None:
+                failed += 1
+                client.engine.close()
+                return None
+            setup_ns.append(time.perf_counter_ns() - started)
+            return client
+
+    setup_started = time.perf_counter()
+    clients = await asyncio.gather(*(open_client() for _ in range(count)))
+    setup_seconds = time.perf_counter() - setup_started
+    clients = [c for c in clients if c is not None]
+
+    # Forma pares dentro do processo e conecta cada lado com o outro
+    pairs = [(clients[i], clients[i + 1]) for i in range(0, len(clients) - 1, 2)]
+    for a, b in pairs:
+        a.peer, b.peer = b.engine.client_id, a.engine.client_id
+        a.engine.connect_to(a.peer)
+        b.engine.connect_to(b.peer)
+    active = [c for pair in pairs for c in pair]
+    results = await asyncio.gather(
+        *(asyncio.wait_for(c.paired, config["timeout"]) for c in active),
+        return_exceptions=True)
+    active = [c for c, r in zip(active, results) if r is True]
+
+    interval = 1.0 / config["rate"] if config["rate"] > 0 else 0.0
+    started = time.perf_counter()
+    deadline = started + config["duration"]
+    await asyncio.gather(*(c.run_messages(deadline, interval) for c in active))
+    elapsed = time.perf_counter() - started
+
+    for c in clients:
+        c.engine.close()
+    await asyncio.sleep(0)
+
+    return {
+        "attempted": count,
+        "established": len(clients),
+        "failed": failed,
+        "messaging": len(active),
+        "setup_seconds": setup_seconds,
+        "setup_ns": setup_ns,
+        "elapsed": elapsed,
+        "sent": sum(c.sent for c in active),
+        "delivered_ns": [x for c in active for x in c.delivered_ns],
+        "peer_ns": [x for c in active for x in c.peer_ns],
+    }
+
+
+def raise_fd_limit():
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def worker(args):
+    config, count = args
+    raise_fd_limit()
+    return asyncio.run(run_worker(config, count))
+
+
+def summarize(config, parts):
+    setup_seconds = max(p["setup_seconds"] for p in parts)
+    elapsed = max(p["elapsed"] for p in parts) or 1e-9
+    established = sum(p["established"] for p in parts)
+    delivered_ns = [x for p in parts for x in p["delivered_ns"]]
+    peer_ns = [x for p in parts for x in p["peer_ns"]]
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
+        "host": platform.node(),
+        "config": config,
+        "connections": {
+            "attempted": sum(p["attempted"] for p in parts),
+            "established": established,
+            "failed": sum(p["failed"] for p in parts),
+            "messaging": sum(p["messaging"] for p in parts),
+            "setup_seconds": setup_seconds,
+            "setup_rate_per_s": established / setup_seconds if setup_seconds else 0.0,
+            "setup_latency": percentiles([x for p in parts for x in p["setup_ns"]]),
+        },
+        "messages": {
+            "sent": sum(p["sent"] for p in parts),
+            "delivered": len(delivered_ns),
+            "peer_received": len(peer_ns),
+            "duration_seconds": elapsed,
+            "delivered_per_s": len(delivered_ns) / elapsed,
+        },
+        "latency_delivered": percentiles(delivered_ns),
+        "latency_peer": percentiles(peer_ns),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerador de carga do chat TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--processes", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--duration", type=float, default=30.0, help="segundos de troca de mensagens")
+    parser.add_argument("--rate", type=float, default=1.0, help="mensagens/s por cliente (0 = sem limite)")
+    parser.add_argument("--window", type=int, default=1, help="mensagens sem confirmação por cliente")
+    parser.add_argument("--ack", action="store_true", help="responder /acknoledgment como o testetcp01.py")
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="arquivo JSON de resultados (padrão: stdout)")
+    args = parser.parse_args()
+
+    config = {
+        "host": args.host, "port": args.port, "clients": args.clients,
+        "processes": args.processes, "duration": args.duration, "rate": args.rate,
+        "window": args.window, "ack": args.ack,
+        "connect_concurrency": args.connect_concurrency, "timeout": args.timeout,
+    }
+    # Número par de clientes por processo para que todos tenham par
+    base = (args.clients // args.processes) & ~1
+    counts = [base] * args.processes
+    counts[-1] += (args.clients - base * args.processes) & ~1
+
+    with multiprocessing.Pool(args.processes) as pool:
+        parts = pool.map(worker, [(config, n) for n in counts if n])
+
+    report = json.dumps(summarize(config, parts), indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
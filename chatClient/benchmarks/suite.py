@@ -0,0 +1,398 @@
+# Suíte de micro-benchmarks dos caminhos quentes do cliente, com resultados
+# guardados por commit e limite de regressão
+#
+#   cd chatClient && python -m benchmarks.suite                 roda e compara
+#   cd chatClient && python -m benchmarks.suite --save          ... e guarda
+#   cd chatClient && python -m benchmarks.suite -k decode --quick
+#
+# Cada caso mede ns por operação (o menor de --repeat rodadas, com o número
+# de iterações calibrado para cada rodada durar --min-time s). Os resultados
+# vão, com --save, para uma linha JSON em --results (commit, máquina, Python).
+# A comparação usa a última linha da mesma máquina e Python de outro commit
+# (ou --baseline <commit>) e sai com código 1 se algum caso ficou mais lento
+# do que o limite (--threshold, 10% por padrão). Casos com orçamento (ms por
+# chamada, pela mediana) também falham se passarem dele, com ou sem base.
+#
+# Os casos de ida e volta usam o servidor de referência no mesmo processo;
+# os de interface rodam com QT_QPA_PLATFORM=offscreen e são pulados se o
+# PyQt5 não estiver instalado.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import deque
+
+from chatcore import (
+    CLIENT_LIST_PREFIX, DELIVERED, REACHED, SERVER_ID, WIRE_BINARY, WIRE_JSON, ChatEngine,
+    EngineHandler, FrameDecoder, HistoryEntry, HistoryStore, MessageEncoder, OutboxEntry,
+    encode_for, encode_page, parse_directory
+)
+from chatcore.server import ChatServer
+
+HOST = "127.0.0.1"
+CLIENT_ID = 17
+PEER_ID = 42
+CONTENT = "Olá, tudo bem? Esta é uma mensagem de tamanho típico no chat."
+DIRECTORY_SIZE = 1000
+STREAM_FRAMES = 200
+RESULTS = os.path.join(".benchmarks", "results.jsonl")
+THRESHOLD = 0.10
+FRAME_BUDGET_MS = 16    # um quadro, como o FRAME_INTERVAL_MS do chatui (que exige PyQt5)
+
+BENCHMARKS = []     # (nome, preparo, orçamento em ms por chamada ou None); o
+                    # preparo devolve (função, operações por chamada)
+_teardown = []      # o que os preparos deixaram aberto, desfeito depois de cada caso
+
+
+def benchmark(name, budget_ms=None):
+    def register(setup):
+        BENCHMARKS.append((name, setup, budget_ms))
+        return setup
+    return register
+
+
+# Codificação
+
+@benchmark("encode.dict_dumps")
+def bench_dict_dumps():
+    # Referência: o que os clientes faziam antes do chatcore.protocol
+    def run():
+        msg_dict = {
+            "SenderId": CLIENT_ID,
+            "ReceiverId": PEER_ID,
+            "Content": CONTENT,
+            "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
+            "ConversationId": PEER_ID
+        }
+        return json.dumps(msg_dict).encode('utf-8')
+    return run, 1
+
+
+@benchmark("encode.message_json")
+def bench_encode_json():
+    encoder = MessageEncoder(CLIENT_ID)
+    return lambda: encoder.message(PEER_ID, CONTENT), 1
+
+
+@benchmark("encode.message_binary")
+def bench_encode_binary():
+    encoder = MessageEncoder(CLIENT_ID, wire=WIRE_BINARY)
+    return lambda: encoder.message(PEER_ID, CONTENT), 1
+
+
+# Decodificação (o laço de receive_messages: feed + frames + payload)
+
+def _stream(wire):
+    frames = [encode_for(wire, PEER_ID, CLIENT_ID, f"{CONTENT} {i}", PEER_ID)
+              for i in range(STREAM_FRAMES)]
+    return b"".join(frames)
+
+
+def _bench_decode(wire):
+    data = _stream(wire)
+    decoder = FrameDecoder()
+
+    def run():
+        decoder.feed(data)
+        for _ in decoder.messages():
+            pass
+    return run, STREAM_FRAMES
+
+
+@benchmark("decode.stream_json")
+def bench_decode_json():
+    return _bench_decode(WIRE_JSON)
+
+
+@benchmark("decode.stream_binary")
+def bench_decode_binary():
+    return _bench_decode(WIRE_BINARY)
+
+
+# Lista de clientes (por entrada)
+
+@benchmark("parse.list_regex")
+def bench_list_regex():
+    # O /list em texto raspado como o chatClientQt fazia
+    content = CLIENT_LIST_PREFIX + "\n" + "".join(
+        f"ID: {i}, Name: Anonymous\n" for i in range(1, DIRECTORY_SIZE + 1))
+
+    def run():
+        ids = []
+        for line in content.splitlines()[1:]:
+            match = re.match(r"ID:\s*(\d+)", line)
+            if match:
+                ids.append(int(match.group(1)))
+        return ids
+    return run, DIRECTORY_SIZE
+
+
+@benchmark("parse.directory_page")
+def bench_directory_page():
+    entries = [(i, "Anonymous") for i in range(1, DIRECTORY_SIZE + 1)]
+    content = encode_page("abcd.1", DIRECTORY_SIZE, None, entries)
+    return lambda: parse_directory(content), DIRECTORY_SIZE
+
+
+# Despacho no engine (data_received -> _dispatch -> handler)
+
+class _Handler(EngineHandler):
+    def __init__(self):
+        self.received = 0
+
+    def on_message(self, engine, data):
+        self.received += 1
+
+
+@benchmark("dispatch.inbound")
+def bench_dispatch():
+    # Um terço de cada: mensagens de pares, "Message delivered." casando com
+    # o outbox e "Message Reached!." casando com as entregues
+    engine = ChatEngine(handler=_Handler(), keepalive=False)
+    engine.client_id = CLIENT_ID
+    engine.encoder = MessageEncoder(CLIENT_ID)
+    count = STREAM_FRAMES // 3
+    frames = []
+    for i in range(count):
+        frames.append(encode_for(WIRE_JSON, PEER_ID, CLIENT_ID, f"{CONTENT} {i}", PEER_ID))
+        frames.append(encode_for(WIRE_JSON, SERVER_ID, PEER_ID, DELIVERED, PEER_ID))
+        frames.append(encode_for(WIRE_JSON, SERVER_ID, CLIENT_ID, REACHED, PEER_ID))
+    data = b"".join(frames)
+    entries = [OutboxEntry(PEER_ID, CONTENT) for _ in range(count)]
+    for seq, entry in enumerate(entries, 1):
+        entry.seq = seq
+
+    def run():
+        for entry in entries:
+            engine.delivery.sent(entry)
+        engine.outbox = deque(entries)
+        engine.data_received(data)
+    return run, 3 * count
+
+
+# Ida e volta pelo servidor no mesmo processo
+
+class _Peer(EngineHandler):
+    def __init__(self):
+        self.ready = asyncio.get_running_loop().create_future()
+        self.waiting = 0
+        self.done = None
+
+    def on_client_id(self, engine, client_id):
+        if not self.ready.done():
+            self.ready.set_result(None)
+
+    def on_message_state(self, engine, message):
+        self.waiting -= 1
+        if self.waiting == 0 and self.done is not None and not self.done.done():
+            self.done.set_result(None)
+
+
+@benchmark("roundtrip.inprocess")
+def bench_roundtrip():
+    # send_message de uma rajada até o último "Message delivered."
+    loop = asyncio.new_event_loop()
+    burst = 100
+
+    async def setup():
+        server = ChatServer(HOST, 0)
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+        sender, receiver = _Peer(), _Peer()
+        a = ChatEngine(HOST, port, handler=sender, keepalive=False)
+        b = ChatEngine(HOST, port, handler=receiver, keepalive=False)
+        await a.connect()
+        await b.connect()
+        await asyncio.gather(sender.ready, receiver.ready)
+        while a._probes or b._probes:
+            await asyncio.sleep(0.01)
+        return server, a, b, sender
+
+    server, a, b, sender = loop.run_until_complete(setup())
+
+    def close():
+        a.close()
+        b.close()
+        server.close()
+        loop.run_until_complete(asyncio.sleep(0.05))
+        loop.close()
+    _teardown.append(close)
+
+    async def one_burst():
+        sender.waiting = burst
+        sender.done = loop.create_future()
+        for _ in range(burst):
+            a.send_message(b.client_id, CONTENT)
+        await sender.done
+
+    return lambda: loop.run_until_complete(one_burst()), burst
+
+
+# Interface
+
+def _qt_app():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication(sys.argv[:1])
+
+
+@benchmark("ui.append", budget_ms=FRAME_BUDGET_MS)
+def bench_ui_append():
+    # Um lote do UiBatcher entrando num MessageListModel com a view visível,
+    # já no limite do histórico (cada lote também despeja as linhas mais
+    # antigas no disco); o flush e o layout que ele causa cabem num quadro
+    app = _qt_app()
+    from chatui import MessageListModel, MessageView, UiBatcher
+    store = HistoryStore(cap=2000)
+    model = MessageListModel(store.get(PEER_ID), lambda entry: f"Cliente {entry.sender}: {entry.text}")
+    view = MessageView()
+    view.resize(600, 500)
+    view.show()
+    view.setModel(model)
+    batcher = UiBatcher(lambda key, entries: model.extend(entries))
+    batch = [HistoryEntry(PEER_ID, f"{CONTENT} {i}") for i in range(50)]
+    for _ in range(2000 // len(batch)):
+        model.extend(batch)
+    app.processEvents()
+
+    def run():
+        for entry in batch:
+            batcher.add(PEER_ID, entry)
+        batcher.flush()
+        app.processEvents()
+    run.keep = (store, view, batcher)   # a view precisa continuar viva enquanto o caso roda
+    return run, len(batch)
+
+
+# Medição, armazenamento e comparação
+
+def measure(func, ops, min_time, repeat):
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 5:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(min_time / 5 / elapsed))
+    number = max(1, int(number * min_time / elapsed))
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number / ops * 1e9)
+    return {"min_ns": min(samples), "median_ns": statistics.median(samples), "ops": ops}
+
+
+def current_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def environment():
+    return {"machine": platform.node(), "cpu": platform.processor() or platform.machine(),
+            "python": platform.python_version()}
+
+
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def find_baseline(history, env, commit, wanted=None):
+    for entry in reversed(history):
+        if entry["env"] != env:
+            continue
+        if wanted is not None:
+            if entry["commit"].startswith(wanted):
+                return entry
+        elif entry["commit"] != commit:
+            return entry
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks dos caminhos quentes do cliente")
+    parser.add_argument("-k", dest="filter", default="", help="só os casos cujo nome contém isto")
+    parser.add_argument("--quick", action="store_true", help="rodadas curtas, para conferir")
+    parser.add_argument("--min-time", type=float, default=0.2, help="segundos por rodada")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--results", default=RESULTS)
+    parser.add_argument("--save", action="store_true", help="guarda os resultados deste commit")
+    parser.add_argument("--baseline", help="commit de referência (padrão: o último guardado)")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="fração de piora aceita antes de falhar (0.10 = 10%%)")
+    args = parser.parse_args()
+    if args.quick:
+        args.min_time, args.repeat = 0.02, 3
+
+    commit = current_commit()
+    env = environment()
+    history = load_results(args.results)
+    baseline = find_baseline(history, env, commit, args.baseline)
+    previous = baseline["results"] if baseline else {}
+    if baseline:
+        print(f"comparando com {baseline['commit']} ({baseline['date']}), limite {args.threshold:.0%}")
+    elif args.baseline:
+        print(f"nenhum resultado guardado para {args.baseline} nesta máquina")
+
+    results = {}
+    regressions = []
+    over_budget = []
+    print(f"{'caso':<24} {'ns/op':>10} {'mediana':>10} {'antes':>10} {'variação':>9}")
+    for name, setup, budget_ms in BENCHMARKS:
+        if args.filter not in name:
+            continue
+        try:
+            func, ops = setup()
+        except ImportError as e:
+            print(f"{name:<24} pulado ({e})")
+            continue
+        result = results[name] = measure(func, ops, args.min_time, args.repeat)
+        while _teardown:
+            _teardown.pop()()
+        line = f"{name:<24} {result['min_ns']:>10,.1f} {result['median_ns']:>10,.1f}"
+        before = previous.get(name)
+        if before:
+            change = result["min_ns"] / before["min_ns"] - 1
+            line += f" {before['min_ns']:>10,.1f} {change:>+8.1%}"
+            if change > args.threshold:
+                regressions.append(name)
+                line += "  REGRESSÃO"
+        if budget_ms is not None and result["median_ns"] * ops / 1e6 > budget_ms:
+            over_budget.append(name)
+            line += f"  ACIMA DE {budget_ms:g} ms/chamada"
+        print(line)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.results) or ".", exist_ok=True)
+        with open(args.results, "a") as f:
+            f.write(json.dumps({"commit": commit, "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                "env": env, "results": results}) + "\n")
+        print(f"resultados de {commit} guardados em {args.results}")
+    if regressions:
+        print(f"{len(regressions)} caso(s) acima do limite: {', '.join(regressions)}")
+    if over_budget:
+        print(f"{len(over_budget)} caso(s) acima do orçamento: {', '.join(over_budget)}")
+    if regressions or over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
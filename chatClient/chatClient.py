@@ -1,34 +1,79 @@
-from sre_parse import State
 import tkinter as tk
 from tkinter import scrolledtext
+import queue
 import socket
 import threading
-import json
-import time
+
+from chatcore import (
+    ASSIGNED_ID_PREFIX, DEFAULT_IDLE_TIMEOUT, REJECT, FrameDecoder, MessageEncoder,
+    SocketWriter, enable_tcp_keepalive, interval_for, is_group
+)
 
 receiver_id = 0
 conversation_id = 0
 client_id = 0 
+encoder = None
+writer = None
+TCP_KEEPALIVE = False  # keepalive do kernel para notar servidor morto (opcional)
+
+# O Tk só pode ser usado pela thread principal: a thread de recepção apenas
+# enfileira linhas e a janela as aplica a cada DRAIN_MS, um insert por lote
+inbox = queue.SimpleQueue()
+DRAIN_MS = 30
+MAX_BATCH = 5000         # linhas por lote: rajadas maiores ficam para o próximo
+SCROLLBACK_LINES = 5000  # linhas mais antigas são descartadas da área de texto
+
+def show(text):
+    # Pode ser chamada de qualquer thread
+    inbox.put(text)
+
+def drain_inbox():
+    lines = []
+    try:
+        while len(lines) < MAX_BATCH:
+            lines.append(inbox.get_nowait())
+    except queue.Empty:
+        pass
+    if lines:
+        # O que passaria do limite seria apagado logo em seguida
+        del lines[:-SCROLLBACK_LINES]
+        at_bottom = text_area.yview()[1] >= 1.0
+        text_area.configure(state='normal')
+        text_area.insert(tk.END, "\n".join(lines) + "\n")
+        excess = int(text_area.index('end-1c').split('.')[0]) - 1 - SCROLLBACK_LINES
+        if excess > 0:
+            text_area.delete('1.0', f'{excess + 1}.0')
+        text_area.configure(state='disabled')
+        # Só acompanha o fim se o usuário não estiver lendo mais acima
+        if at_bottom:
+            text_area.see(tk.END)
+    window.after(DRAIN_MS, drain_inbox)
 
 # Função para receber mensagens
-def receive_messages(sock, client_id, text_area):
+def receive_messages(sock, encoder, decoder):
     while True:
         try:
-            message = sock.recv(1024).decode('utf-8')
-            if message:
-                data = json.loads(message)
+            # Processa todos os frames completos já no buffer antes de ler de novo
+            for data in decoder.messages():
                 if 'SenderId' in data and data['SenderId'] == 0:
-                    text_area.insert(tk.END, f"Server: {data['Content']}\n")
+                    show(f"Server: {data['Content']}")
+                elif is_group(data.get('ConversationId')):
+                    # Mensagem de grupo (/multicast): sem confirmação, senão o
+                    # remetente receberia uma por membro
+                    show(f"[Grupo {data['ConversationId']}] Cliente {data['SenderId']}: {data['Content']}")
+                    continue
                 else:
-                    text_area.insert(tk.END, f"{data['Content']}\n")
-                text_area.see(tk.END)
+                    show(data['Content'])
                 if 'SenderId' in data and data['SenderId'] != 0:
-                    acknoledgment(sock, data, client_id)
+                    acknoledgment(sock, data, encoder)
+            if decoder.recv_into(sock) == 0:
+                show("Desconectado do servidor.")
+                break
         except Exception as e:
-            text_area.insert(tk.END, f"Erro: {str(e)}\n")
+            show(f"Erro: {str(e)}")
             break
 
-def send_message(sock, client_id, entry, text_area):
+def send_message(sock, entry):
     global conversation_id
     global receiver_id
     
@@ -36,6 +81,7 @@ def send_message(sock, client_id, entry, text_area):
     entry.delete(0, tk.END)
     
     if message.lower() == 'exit':
+        writer.close()
         sock.close()
         window.quit()
         return
@@ -46,80 +92,54 @@ def send_message(sock, client_id, entry, text_area):
         return
     
     if message:
-        msg_dict = {
-            "SenderId": client_id,
-            "ReceiverId": receiver_id,
-            "Content": message,
-            "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
-            "ConversationId": conversation_id
-        }
-        json_message = json.dumps(msg_dict)
-        sock.send(json_message.encode('utf-8'))
-
-def send_heartbeat(sock, client_id):
-    while True:
-        time.sleep(3)
-        try:
-            msg_dict = {
-                "SenderId": client_id,
-                "ReceiverId": receiver_id,
-                "Content": "heartbeat",
-                "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
-                "ConversationId": conversation_id
-            }
-            json_message = json.dumps(msg_dict)
-            sock.send(json_message.encode('utf-8'))
-        except:
-            break
+        # Só enfileira: quem escreve no socket é a thread do SocketWriter
+        if not writer.send(encoder.message(receiver_id, message, conversation_id)):
+            show("[Sistema] Fila de saída cheia; mensagem não enviada.")
 
-def acknoledgment(sock, data, client_id):
+def acknoledgment(sock, data, encoder):
     global conversation_id
     global receiver_id
     
     if data['SenderId'] != conversation_id:
         conversation_id = data['SenderId']
         receiver_id = data["SenderId"]
-        msg_dict = {
-            "SenderId": client_id,
-            "ReceiverId": receiver_id,
-            "Content": "/acknoledgment",
-            "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
-            "ConversationId": conversation_id
-        }
-        json_message = json.dumps(msg_dict)
-        sock.send(json_message.encode('utf-8'))
-    else:
-        msg_dict = {
-            "SenderId": client_id,
-            "ReceiverId": receiver_id,
-            "Content": "/acknoledgment",
-            "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
-            "ConversationId": conversation_id
-        }
-        json_message = json.dumps(msg_dict)
-        sock.send(json_message.encode('utf-8'))
+    writer.send(encoder.ack(receiver_id), priority=True)
 
 def start_chat():
     global client_socket
+    global client_id
+    global encoder
+    global writer
     server_ip = "127.0.0.1"
     server_port = 8888 
     
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     client_socket.connect((server_ip, server_port))
+    if TCP_KEEPALIVE:
+        enable_tcp_keepalive(client_socket)
+    
+    decoder = FrameDecoder()
     
     # Receber o ID do cliente
-    while True:
-        message = client_socket.recv(1024).decode('utf-8')
-        if message:
-            data = json.loads(message)
-            if 'Content' in data and 'Your assigned client ID is' in data['Content']:
+    client_id = None
+    while client_id is None:
+        if decoder.recv_into(client_socket) == 0:
+            return
+        for data in decoder.messages():
+            if 'Content' in data and ASSIGNED_ID_PREFIX in data['Content']:
                 client_id = data['ReceiverId']
                 client_id_label.config(text=f"Meu ID: {client_id}")
                 break
     
+    encoder = MessageEncoder(client_id)
+    # A interface nunca espera o socket: com a fila cheia o envio é recusado.
+    # O heartbeat sai do próprio writer, só depois de um intervalo sem envios.
+    writer = SocketWriter(client_socket, policy=REJECT)
+    writer.set_keepalive(encoder.heartbeat, interval_for(DEFAULT_IDLE_TIMEOUT))
+    writer.start()
+    
     # Iniciar threads
-    threading.Thread(target=receive_messages, args=(client_socket, client_id, text_area), daemon=True).start()
-    # threading.Thread(target=send_heartbeat, args=(client_socket, client_id), daemon=True).start()
+    threading.Thread(target=receive_messages, args=(client_socket, encoder, decoder), daemon=True).start()
 
 # Configurar a janela principal
 window = tk.Tk()
@@ -136,7 +156,7 @@ client_id_label.pack(pady=5)
 text_area = scrolledtext.ScrolledText(frame, wrap=tk.WORD, state='disabled')
 text_area.pack(fill=tk.BOTH, expand=True)
 
-text_area.insert(tk.END, "Enter command ('/list' to see clients, '/connect <client_id>' to start conversation, '/exit' to leave conversation, 'exit' to quit): \n")
+show("Enter command ('/list' to see clients, '/connect <client_id>' to start conversation, '/exit' to leave conversation, '/group create <name> [ids]' or '/group join <name>' for groups, '/multicast <id>,<id> <text>' to send to many, 'exit' to quit): ")
 
 # Área de entrada de mensagem
 entry_frame = tk.Frame(window)
@@ -145,13 +165,14 @@ entry_frame.pack(fill=tk.X, side=tk.BOTTOM)
 entry = tk.Entry(entry_frame)
 entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
-send_button = tk.Button(entry_frame, text="Enviar", command=lambda: send_message(client_socket, client_id, entry, text_area))
+send_button = tk.Button(entry_frame, text="Enviar", command=lambda: send_message(client_socket, entry))
 send_button.pack(side=tk.RIGHT)
 
 # Iniciar o chat quando a janela for aberta
 window.after(100, start_chat)
+window.after(DRAIN_MS, drain_inbox)
 
 # Bind para enviar mensagem com Enter
-entry.bind('<Return>', lambda event: send_message(client_socket, client_id, entry, text_area))
+entry.bind('<Return>', lambda event: send_message(client_socket, entry))
 
 window.mainloop()
\ No newline at end of file
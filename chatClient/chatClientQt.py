@@ -1,39 +1,66 @@
 import sys
-import socket
-import threading
-import json
+import asyncio
+import os
 import re
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QTextEdit, QLineEdit,
-    QPushButton, QLabel, QScrollArea, QFrame
+    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton,
+    QLabel, QFileDialog, QStackedWidget
 )
-from PyQt5.QtCore import pyqtSignal, QObject, QTimer
-import time
+from PyQt5.QtCore import QTimer
+import qasync
 
-# Classe para sinais customizados (para thread-safe UI updates)
-class Communicator(QObject):
-    message_received = pyqtSignal(str)
-    client_id_received = pyqtSignal(str)
-    clients_list_received = pyqtSignal(list)
+from chatcore import (
+    CLIENT_LIST_PREFIX, DELIVERED, FILE_COMPLETE, FILE_FAILED, FILE_OFFERED, FILE_RECEIVING,
+    GROUP_ID_BASE, MSG_DELIVERED, MSG_FAILED, MSG_PENDING, MSG_REACHED, REACHED, SERVER_ID,
+    ChatEngine, HistoryEntry, HistoryStore, MessageStore, is_group, timestamp
+)
+from chatui import (
+    SCOPE_CURRENT, SEARCH_LIMIT, ClientListPanel, ConversationSwitcher, MessageListModel,
+    MessageView, SearchPanel, UiBatcher
+)
+
+HOST = '127.0.0.1'
+PORT = 8888
+GENERAL = "geral"
+HISTORY_CAP = 2000  # mensagens em memória por conversa; o resto vai para o disco
+HISTORY_PAGE = 200  # mensagens de execuções anteriores carregadas ao abrir uma conversa
+STORE_PATH = os.path.join(os.path.expanduser("~"), ".chattcp", "mensagens.db")
+DOWNLOAD_DIR = os.path.join(os.path.expanduser("~"), "Downloads", "ChatTCP")
+TRACKED_MAX = 2048  # mensagens enviadas aguardando confirmação do par
+STATE_MARKS = {
+    MSG_PENDING: " (pendente)",
+    MSG_DELIVERED: " ✓",
+    MSG_REACHED: " ✓✓",
+    MSG_FAILED: " (não entregue)",
+}
 
 class ChatClient(QWidget):
     def __init__(self):
         super().__init__()
-        self.comm = Communicator()
-        self.comm.message_received.connect(self.append_message)
-        self.comm.client_id_received.connect(self.set_client_id)
-        self.comm.clients_list_received.connect(self.update_clients_list)
-
-        self.client_socket = None
+        # O engine roda no mesmo event loop do Qt (qasync): callbacks chegam
+        # na thread da interface e nenhum envio bloqueia
+        # reconnect=True: quedas e reinícios do servidor são retomados sozinhos
+        # Arquivos recebidos vão direto para DOWNLOAD_DIR
+        self.engine = ChatEngine(HOST, PORT, handler=self, reconnect=True, download_dir=DOWNLOAD_DIR)
         self.client_id = None
+        self.timer = None
 
         self.current_chat_id = None
-        self.chat_areas = {}  # id_cliente: QTextEdit
+        # Um histórico limitado por conversa; só a conversa ativa fica na view
+        self.history = HistoryStore(cap=HISTORY_CAP)
+        # Tudo o que é enviado/recebido também vai para o SQLite (em lotes,
+        # numa thread própria); ao abrir uma conversa a última página volta
+        self.store = MessageStore(STORE_PATH)
+        self.message_models = {}  # conversa: MessageListModel
+        self.message_views = {}   # conversa aberta: MessageView (guarda layout e rolagem)
+        self.sent_entries = {}    # msg_id: (conversa, HistoryEntry) até a confirmação final
+        # Mensagens recebidas são agrupadas e aplicadas no máximo uma vez por quadro
+        self.batcher = UiBatcher(self.flush_entries, parent=self)
 
         self.init_ui()
 
-        # Inicia a thread de conexão depois que a UI estiver pronta
-        threading.Thread(target=self.start_chat, daemon=True).start()
+        # Conecta depois que a UI estiver pronta
+        asyncio.ensure_future(self.start_chat())
 
     def init_ui(self):
         self.setWindowTitle('Bat Papo')
@@ -41,30 +68,36 @@ class ChatClient(QWidget):
 
         main_layout = QHBoxLayout(self)
 
-        # Barra lateral esquerda
-        self.sidebar = QVBoxLayout()
-        
-        # Título da barra lateral
-        self.sidebar_title = QLabel("Clientes Online")
-        self.sidebar_title.setStyleSheet("font-weight: bold; font-size: 14px;")
-        self.sidebar.addWidget(self.sidebar_title)
-        
-        self.sidebar_widget = QWidget()
-        self.sidebar_widget.setLayout(self.sidebar)
-        self.sidebar_scroll = QScrollArea()
-        self.sidebar_scroll.setWidgetResizable(True)
-        self.sidebar_scroll.setWidget(self.sidebar_widget)
-        main_layout.addWidget(self.sidebar_scroll, 1)
+        # Barra lateral esquerda (clientes online, conversas abertas e busca no histórico)
+        side_layout = QVBoxLayout()
+        self.sidebar = ClientListPanel(self.open_conversation)
+        side_layout.addWidget(self.sidebar, 1)
+        self.switcher = ConversationSwitcher(self.conversation_title, self.open_conversation)
+        side_layout.addWidget(self.switcher, 1)
+        self.search_panel = SearchPanel(self.search_history, self.open_search_hit)
+        side_layout.addWidget(self.search_panel, 1)
+        main_layout.addLayout(side_layout, 1)
 
         # Área central (mensagens)
         center_layout = QVBoxLayout()
         self.client_id_label = QLabel("Meu ID: ")
         center_layout.addWidget(self.client_id_label)
+        self.conversation_label = QLabel()
+        self.conversation_label.setStyleSheet("font-weight: bold;")
+        center_layout.addWidget(self.conversation_label)
 
-        # Área de mensagens
-        self.messages_area = QTextEdit()
-        self.messages_area.setReadOnly(True)
-        center_layout.addWidget(self.messages_area, 10)
+        # Uma view por conversa aberta, empilhadas: só a ativa é desenhada e
+        # trocar de conversa não refaz o layout do histórico
+        self.messages_stack = QStackedWidget()
+        center_layout.addWidget(self.messages_stack, 10)
+        self.notice_label = QLabel()
+        center_layout.addWidget(self.notice_label)
+        self.stats_label = QLabel()
+        self.stats_label.setStyleSheet("color: gray; font-size: 10px;")
+        center_layout.addWidget(self.stats_label)
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.update_stats)
+        self.stats_timer.start(1000)
 
         # Área de entrada
         entry_layout = QHBoxLayout()
@@ -74,6 +107,9 @@ class ChatClient(QWidget):
         self.send_button = QPushButton('Enviar')
         self.send_button.clicked.connect(self.send_message)
         entry_layout.addWidget(self.send_button)
+        self.file_button = QPushButton('Arquivo...')
+        self.file_button.clicked.connect(self.choose_file)
+        entry_layout.addWidget(self.file_button)
         center_layout.addLayout(entry_layout)
 
         main_layout.addLayout(center_layout, 4)
@@ -81,90 +117,145 @@ class ChatClient(QWidget):
 
         self.entry.returnPressed.connect(self.send_message)
 
-        # Adiciona a área geral ao dicionário
-        self.chat_areas["geral"] = self.messages_area
+        self.open_conversation(GENERAL)
+
+    def model_for(self, key):
+        model = self.message_models.get(key)
+        if model is None:
+            history = self.history.get(key)
+            history.extend(self.store.latest(self.store_peer(key), HISTORY_PAGE))
+            model = MessageListModel(history, self.format_entry, self)
+            self.message_models[key] = model
+        return model
+
+    def store_peer(self, key):
+        # A conversa geral fica no store com o ID do servidor
+        return SERVER_ID if key == GENERAL else key
+
+    def active_key(self):
+        return self.safe_int_conversion(self.current_chat_id) or GENERAL
+
+    def view_for(self, key):
+        view = self.message_views.get(key)
+        if view is None:
+            view = MessageView()
+            view.setModel(self.model_for(key))
+            self.messages_stack.addWidget(view)
+            self.message_views[key] = view
+        return view
+
+    def conversation_title(self, key):
+        if key == GENERAL:
+            return "Geral"
+        if is_group(key):
+            return f"Grupo {self.engine.groups.get(key, key)}"
+        return f"Cliente {key}"
+
+    def open_conversation(self, key):
+        # Só troca a conversa visível e o destino dos envios: o engine abre a
+        # conversa no servidor na hora de mandar a próxima mensagem
+        self.batcher.flush()  # o que chegou até aqui conta como não lido na conversa anterior
+        self.current_chat_id = None if key == GENERAL else key
+        self.show_conversation(key)
+
+    def show_conversation(self, key):
+        self.messages_stack.setCurrentWidget(self.view_for(key))
+        self.switcher.select(key)
+        if key == GENERAL:
+            self.conversation_label.setText("Conversa: Geral")
+        elif is_group(key):
+            self.conversation_label.setText(self.conversation_title(key))
+        else:
+            self.conversation_label.setText(f"Conversa com Cliente {key}")
+        self.notice_label.clear()
+
+    def close_conversation(self, key):
+        # Tira da lista e libera a view; o histórico continua no modelo
+        if key == self.active_key():
+            self.open_conversation(GENERAL)
+        self.switcher.model.close(key)
+        view = self.message_views.pop(key, None)
+        if view is not None:
+            self.messages_stack.removeWidget(view)
+            view.deleteLater()
+
+    def add_entry(self, key, entry):
+        self.batcher.add(key, entry)
+
+    def flush_entries(self, key, entries):
+        self.model_for(key).extend(entries)
+        if key != self.active_key():
+            self.switcher.model.add_unread(key, len(entries))
+
+    def update_stats(self):
+        text = f"{self.engine.delivery.summary()} | {self.batcher.stats.summary()} | formato: {self.engine.wire}"
+        transfers = self.engine.active_transfers()
+        if transfers:
+            text += " | " + ", ".join(t.summary() for t in transfers)
+        self.stats_label.setText(text)
+
+    def format_entry(self, entry):
+        if entry.sender is None:
+            return entry.text
+        if entry.sender == SERVER_ID:
+            return f"Servidor: {entry.text}"
+        if entry.sender == self.safe_int_conversion(self.client_id):
+            return f"Você: {entry.text}{STATE_MARKS.get(entry.state, '')}"
+        return f"Cliente {entry.sender}: {entry.text}"
+
+    def search_history(self, text, scope, since, until):
+        peer = self.store_peer(self.active_key()) if scope == SCOPE_CURRENT else None
+        return self.store.search(text, peer, since, until, SEARCH_LIMIT)
+
+    def open_search_hit(self, hit):
+        # Abre a conversa do resultado (conectando, como um clique na lista)
+        self.open_conversation(GENERAL if hit.peer == SERVER_ID else hit.peer)
 
     def request_clients_list(self):
-        if self.client_socket and self.client_id:
-            try:
-                message = {
-                    "SenderId": self.safe_int_conversion(self.client_id),
-                    "ReceiverId": 0,  # Servidor
-                    "Content": "/list",
-                    "Timestamp": None,  # O servidor vai ignorar este campo
-                    "ConversationId": 0
-                }
-                self.client_socket.send(json.dumps(message).encode())
-            except Exception as e:
-                self.messages_area.append(f"[Erro ao solicitar lista de clientes]: {e}")
+        # Diretório paginado, revalidado pela etag (quase sempre só um
+        # "notmodified"); o /list em texto fica para o servidor antigo
+        if not self.engine.refresh_directory():
+            self.engine.request_clients_list()
     
     def update_clients_list(self, clients):
-        # Remove todos os botões de cliente (mantendo o título)
-        for i in reversed(range(self.sidebar.count())):
-            widget = self.sidebar.itemAt(i).widget()
-            if widget and widget != self.sidebar_title:
-                widget.setParent(None)
-        
-        # Adiciona o título novamente se foi removido
-        if self.sidebar.indexOf(self.sidebar_title) == -1:
-            self.sidebar.addWidget(self.sidebar_title)
-        
-        # Adiciona botões para cada cliente
-        for client_id in clients:
-            if str(client_id) == str(self.client_id):
-                continue  # Não mostra a si mesmo
-            btn = QPushButton(f"Cliente {client_id}")
-            btn.clicked.connect(lambda _, cid=client_id: self.connect_to_client(cid))
-            self.sidebar.addWidget(btn)
+        # Só as linhas que mudaram são inseridas/removidas
+        self.sidebar.set_clients(clients, exclude=self.safe_int_conversion(self.client_id))
     
     def connect_to_client(self, client_id):
-        # Envia comando de conexão
-        if self.client_socket:
-            message = {
-                "SenderId": self.safe_int_conversion(self.client_id),
-                "ReceiverId": 0,  # Servidor
-                "Content": f"/connect {client_id}",
-                "Timestamp": None,
-                "ConversationId": 0
-            }
-            self.client_socket.send(json.dumps(message).encode())
-            self.messages_area.append(f"[Sistema] Conectando com Cliente {client_id}...")
-        
-        self.current_chat_id = client_id
+        # /connect explícito: abre a conversa e já confirma o par com o servidor
+        self.open_conversation(client_id)
+        if self.engine.connect_to(client_id):
+            self.append_message(f"[Sistema] Conectando com Cliente {client_id}...")
 
     def append_message(self, message):
-        self.messages_area.append(message)
+        # Avisos locais e respostas do servidor vão para a conversa ativa
+        self.add_entry(self.active_key(), HistoryEntry(None, message))
 
     def set_client_id(self, client_id):
         self.client_id = client_id
         self.client_id_label.setText(f"Meu ID: {client_id}")
         
-        # Configura o timer para atualizar a lista de clientes periodicamente
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.request_clients_list)
-        self.timer.start(5000)  # 5 segundos
+        # O heartbeat fica com o engine: só sai depois de um intervalo sem
+        # envios, ajustado ao limite de inatividade anunciado pelo servidor
+        if self.timer is None:
+            self.timer = QTimer()
+            self.timer.timeout.connect(self.request_clients_list)
         
-        # Configura o timer para enviar heartbeat periodicamente
-        self.heartbeat_timer = QTimer()
-        self.heartbeat_timer.timeout.connect(self.send_heartbeat)
-        self.heartbeat_timer.start(15000)  # 15 segundos
-        
-        # Solicita lista de clientes imediatamente
-        self.request_clients_list()
-
-    def send_heartbeat(self):
-        if self.client_socket and self.client_id:
-            try:
-                message = {
-                    "SenderId": self.safe_int_conversion(self.client_id),
-                    "ReceiverId": 0,  # Servidor
-                    "Content": "heartbeat",
-                    "Timestamp": None,
-                    "ConversationId": 0
-                }
-                self.client_socket.send(json.dumps(message).encode())
-            except Exception as e:
-                self.messages_area.append(f"[Erro ao enviar heartbeat]: {e}")
+        # Presença empurrada pelo servidor; o polling de /list a cada 5 s só
+        # é usado se o servidor não suportar a inscrição. Chamado de novo a
+        # cada reconexão, porque a inscrição vale por conexão.
+        self.timer.stop()
+        self.engine.subscribe_presence()
+        QTimer.singleShot(3000, self.check_presence)
+
+    def check_presence(self):
+        if not self.engine.presence_synced:
+            self.start_polling()
+
+    def start_polling(self):
+        if not self.timer.isActive():
+            self.timer.start(5000)  # 5 segundos
+            self.request_clients_list()
 
     def send_message(self):
         message_text = self.entry.text().strip()
@@ -178,112 +269,244 @@ class ChatClient(QWidget):
         elif message_text.startswith("/connect"):
             parts = message_text.split()
             if len(parts) == 2 and parts[1].isdigit():
-                self.connect_to_client(parts[1])
+                self.connect_to_client(int(parts[1]))
             else:
-                self.messages_area.append("[Sistema] Uso: /connect <id_cliente>")
+                self.append_message("[Sistema] Uso: /connect <id_cliente>")
             self.entry.clear()
             return
         elif message_text == "/exit":
+            old_chat = self.active_key()
+            if old_chat != GENERAL:
+                self.close_conversation(old_chat)
+                if is_group(old_chat):
+                    self.append_message(f"[Sistema] Saiu da conversa do grupo {self.engine.groups.get(old_chat, old_chat)}")
+                else:
+                    if self.engine.conversation == old_chat:
+                        self.engine.exit_conversation()
+                    self.append_message(f"[Sistema] Saiu da conversa com Cliente {old_chat}")
+            self.entry.clear()
+            return
+        elif message_text.startswith("/group"):
+            self.group_command(message_text.split())
+            self.entry.clear()
+            return
+        elif message_text.startswith("/file"):
+            parts = message_text.split(" ", 1)
+            if len(parts) == 2:
+                self.send_file(os.path.expanduser(parts[1].strip()))
+            else:
+                self.append_message("[Sistema] Uso: /file <caminho>")
+            self.entry.clear()
+            return
+        elif message_text.startswith("/multicast"):
+            parts = message_text.split(" ", 2)
+            targets = [int(t) for t in parts[1].split(",") if t.isdigit()] if len(parts) == 3 else []
+            if not targets:
+                self.append_message("[Sistema] Uso: /multicast <id>,<id>,... <mensagem>")
+            elif self.engine.send_multicast(targets, parts[2]) is None:
+                self.append_message("[Sistema] Envio para vários destinos não disponível neste servidor.")
+            else:
+                self.append_message(f"[Sistema] Enviado para {len(targets)} destinos: {parts[2]}")
+            self.entry.clear()
+            return
+        else:
+            # Cada conversa envia para o seu par; o engine troca a conversa no
+            # servidor quando o destino muda. Sem conexão a mensagem espera no
+            # outbox do engine até reconectar.
             if self.current_chat_id:
-                message = {
-                    "SenderId": self.safe_int_conversion(self.client_id),
-                    "ReceiverId": 0,  # Servidor
-                    "Content": "/exit",
-                    "Timestamp": None,
-                    "ConversationId": 0
-                }
-                self.client_socket.send(json.dumps(message).encode())
-                old_chat = self.current_chat_id
-                self.current_chat_id = None
-                self.messages_area.append(f"[Sistema] Saiu da conversa com Cliente {old_chat}")
+                peer_id = self.safe_int_conversion(self.current_chat_id)
+                sent = self.engine.send_message(peer_id, message_text)
+                if sent is None:
+                    # Não entra no histórico
+                    self.append_message("[Sistema] Mensagem não enviada (sem conexão ou fila de saída cheia).")
+                    return
+                my_id = self.safe_int_conversion(self.client_id)
+                entry = HistoryEntry(my_id, message_text, timestamp(), sent.state)
+                self.store.add(peer_id, my_id, message_text, peer_id, entry.timestamp)
+                self.track_sent(sent.msg_id, peer_id, entry)
+                self.add_entry(peer_id, entry)
+            else:
+                self.append_message("[Sistema] Você precisa conectar com um cliente primeiro usando /connect <id_cliente>")
+            
             self.entry.clear()
+
+    def choose_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Enviar arquivo")
+        if path:
+            self.send_file(path)
+
+    def send_file(self, path):
+        peer_id = self.safe_int_conversion(self.current_chat_id)
+        if not peer_id or is_group(peer_id):
+            self.append_message("[Sistema] Abra uma conversa com um cliente para enviar arquivos.")
+        elif not os.path.isfile(path):
+            self.append_message(f"[Sistema] Arquivo não encontrado: {path}")
+        elif self.engine.send_file(peer_id, path) is None:
+            self.append_message("[Sistema] Envio de arquivos precisa do formato binário (servidor sem suporte).")
+
+    def group_command(self, parts):
+        action = parts[1] if len(parts) > 1 else None
+        key = self.active_key()
+        if not self.engine.groups_supported:
+            self.append_message("[Sistema] Este servidor não suporta grupos.")
+        elif action == "create" and len(parts) >= 3:
+            self.engine.create_group(parts[2], [p for p in parts[3:] if p.isdigit()])
+        elif action == "join" and len(parts) == 3:
+            self.engine.join_group(parts[2])
+        elif action == "leave" and is_group(key):
+            self.engine.leave_group(key)
+        else:
+            self.append_message("[Sistema] Uso: /group create <nome> [ids...] | /group join <nome> | "
+                                "/group leave (dentro do grupo)")
+
+    # Callbacks do ChatEngine (rodam na thread da interface)
+
+    def on_connected(self, engine):
+        self.append_message(f"[Sistema] Conectado ao servidor {engine.host}:{engine.port}")
+
+    def on_client_id(self, engine, client_id):
+        self.set_client_id(str(client_id))
+
+    def on_text(self, engine, text):
+        # Frame não é JSON válido (provavelmente texto puro do sistema)
+        self.append_message(text)
+
+    def on_disconnected(self, engine, exc):
+        if exc:
+            self.append_message(f"[Erro ao receber]: {exc}")
+        self.append_message("[Sistema] Desconectado do servidor.")
+
+    def on_reconnecting(self, engine, attempt, delay):
+        self.append_message(f"[Sistema] Reconectando em {delay:.1f} s (tentativa {attempt})...")
+
+    def on_resumed(self, engine, client_id, resumed):
+        if resumed:
+            self.append_message(f"[Sistema] Sessão retomada como Cliente {client_id}.")
+        else:
+            self.append_message(f"[Sistema] Sessão anterior perdida; novo ID {client_id}.")
+        self.set_client_id(str(client_id))
+
+    def track_sent(self, msg_id, key, entry):
+        if len(self.sent_entries) >= TRACKED_MAX:
+            # Par que não confirma: esquece a mais antiga
+            del self.sent_entries[next(iter(self.sent_entries))]
+        self.sent_entries[msg_id] = (key, entry)
+
+    def on_message_state(self, engine, message):
+        tracked = self.sent_entries.get(message.msg_id)
+        if tracked is None:
+            return
+        key, entry = tracked
+        entry.state = message.state
+        if message.state in (MSG_REACHED, MSG_FAILED):
+            del self.sent_entries[message.msg_id]
+        # Se ainda está no lote do batcher, já aparece com o estado novo
+        self.model_for(key).refresh(entry)
+
+    def on_presence(self, engine, added, removed):
+        my_id = self.safe_int_conversion(self.client_id)
+        if self.timer.isActive():
+            # Estava em polling: sincroniza com o conjunto completo uma vez
+            self.timer.stop()
+            self.sidebar.set_clients(engine.presence.ids, exclude=my_id)
+        else:
+            self.sidebar.apply_delta(added, removed, exclude=my_id)
+
+    def on_group(self, engine, event, group_id, name):
+        if event in ("created", "joined"):
+            self.open_conversation(group_id)
+            self.append_message(f"[Sistema] Você está no grupo {name} (ID {group_id}).")
+        elif event == "left":
+            self.close_conversation(group_id)
+            self.append_message(f"[Sistema] Saiu do grupo {name}.")
+        elif event == "error":
+            self.append_message(f"[Sistema] Grupo: {name}")
+
+    def on_file(self, engine, transfer):
+        # Progresso e taxa aparecem na linha de status (update_stats)
+        name = transfer.name
+        if transfer.state == FILE_OFFERED and transfer.outgoing:
+            notice = f"[Sistema] Oferecendo {name} ({transfer.size / 1e6:.1f} MB)..."
+        elif transfer.state == FILE_RECEIVING and transfer.offset:
+            notice = f"[Sistema] Retomando {name} de {transfer.progress:.0%}"
+        elif transfer.state == FILE_RECEIVING:
+            notice = f"[Sistema] Recebendo {name} ({transfer.size / 1e6:.1f} MB) de Cliente {transfer.peer}"
+        elif transfer.state == FILE_COMPLETE:
+            notice = (f"[Sistema] {name} enviado." if transfer.outgoing
+                      else f"[Sistema] {name} salvo em {transfer.path}")
+        elif transfer.state == FILE_FAILED:
+            notice = f"[Sistema] Transferência de {name} falhou: {transfer.error}"
+        else:
+            return
+        self.add_entry(transfer.peer, HistoryEntry(None, notice))
+
+    def on_presence_unsupported(self, engine):
+        self.start_polling()
+
+    def on_directory(self, engine, changed):
+        # Com presença sincronizada a barra lateral já está em dia
+        if changed and not engine.presence_synced:
+            self.update_clients_list(engine.directory.ids())
+
+    def on_directory_unsupported(self, engine):
+        self.engine.request_clients_list()
+
+    def on_message(self, engine, data):
+        # Resposta do /list do servidor antigo (sem /directory)
+        if data.get("SenderId") == SERVER_ID and CLIENT_LIST_PREFIX in data.get("Content", ""):
+            client_ids = []
+            for line in data["Content"].splitlines()[1:]:  # Pular a primeira linha (título)
+                match = re.match(r"ID:\s*(\d+)", line)
+                if match:
+                    client_ids.append(int(match.group(1)))
+            
+            self.update_clients_list(client_ids)
+            return
+        
+        if data.get("SenderId") == SERVER_ID and data.get("Content") in (DELIVERED, REACHED):
+            # Confirmações aparecem como estado da mensagem, não como linhas
             return
-        elif self.client_socket:
-            try:
-                data = {
-                    "SenderId": self.safe_int_conversion(self.client_id),
-                    "ReceiverId": self.safe_int_conversion(self.current_chat_id) if self.current_chat_id else 0,
-                    "Content": message_text,
-                    "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
-                    "ConversationId": self.safe_int_conversion(self.current_chat_id) if self.current_chat_id else 0
-                }
-                
-                if self.current_chat_id:
-                    self.client_socket.send(json.dumps(data).encode())
-                    self.messages_area.append(f"Você para Cliente {self.current_chat_id}: {message_text}")
-                else:
-                    self.messages_area.append("[Sistema] Você precisa conectar com um cliente primeiro usando /connect <id_cliente>")
-                
-                self.entry.clear()
-            except Exception as e:
-                self.messages_area.append(f"[Erro ao enviar]: {e}")
-
-    def receive_messages(self):
-        while True:
-            try:
-                message = self.client_socket.recv(4096).decode()
-                if not message:
-                    self.comm.message_received.emit("[Sistema] Desconectado do servidor.")
-                    break
-
-                # Tenta processar como JSON
-                try:
-                    data = json.loads(message)
-                    
-                    # Verifica se é a resposta do comando /list
-                    if data.get("SenderId") == 0 and "Active clients:" in data.get("Content", ""):
-                        client_ids = []
-                        for line in data["Content"].splitlines()[1:]:  # Pular a primeira linha (título)
-                            match = re.match(r"ID:\s*(\d+)", line)
-                            if match:
-                                client_ids.append(match.group(1))
-                        
-                        # Emitir sinal para atualizar lista de clientes
-                        self.comm.clients_list_received.emit(client_ids)
-                        continue
-                    
-                    # Verifica se é uma mensagem sobre ID do cliente
-                    if "Your assigned client ID is" in data.get("Content", ""):
-                        client_id = data.get("ReceiverId")
-                        if client_id:
-                            self.comm.client_id_received.emit(str(client_id))
-                        continue
-                    
-                    # Envia mensagem periódica para manter conexão ativa (heartbeat)
-                    if data.get("SenderId") == 0 and data.get("Content") == "Message delivered.":
-                        # Não mostra os confirmations de entrega
-                        continue
-                    
-                    # Mensagem normal de um cliente ou do servidor
-                    sender_id = data.get("SenderId", "Desconhecido")
-                    content = data.get("Content", "")
-                    sender_name = "Servidor" if sender_id == 0 else f"Cliente {sender_id}"
-                    
-                    # Mostrar mensagem na área principal
-                    self.comm.message_received.emit(f"{sender_name}: {content}")
-                    
-                except json.JSONDecodeError:
-                    # Mensagem não é JSON (provavelmente texto puro do sistema)
-                    self.comm.message_received.emit(message)
-                    
-            except Exception as e:
-                self.comm.message_received.emit(f"[Erro ao receber]: {e}")
-                break
-    
-    def start_chat(self):
-        HOST = '127.0.0.1'
-        PORT = 8888
         
+        # Mensagem normal de um cliente ou do servidor
+        sender_id = data.get("SenderId")
+        content = data.get("Content", "")
+        conversation_id = data.get("ConversationId")
+        entry = HistoryEntry(sender_id, content, data.get("Timestamp"))
+        peer = self.route(sender_id, conversation_id)
+        self.store.add(peer, sender_id, content, conversation_id, entry.timestamp)
+        if peer == SERVER_ID:
+            # Respostas do servidor aparecem na conversa ativa
+            self.add_entry(self.active_key(), entry)
+            return
+        # Conversas em segundo plano acumulam e ganham contador de não lidas
+        self.add_entry(peer, entry)
+        if not is_group(conversation_id):
+            # Confirma para o remetente medir a latência até o par. Grupo (ou
+            # lista avulsa) não confirma, senão o remetente receberia um
+            # "Message Reached!." por membro
+            engine.acknowledge(sender_id)
+
+    @staticmethod
+    def route(sender_id, conversation_id):
+        # Conversa dona de um frame: o grupo pelo ConversationId, a privada
+        # (e a lista avulsa) pelo remetente, o servidor em SERVER_ID
+        if sender_id == SERVER_ID or not isinstance(sender_id, int):
+            return SERVER_ID
+        if is_group(conversation_id) and conversation_id != GROUP_ID_BASE:
+            return conversation_id
+        return sender_id
+    
+    async def start_chat(self):
         try:
-            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.client_socket.connect((HOST, PORT))
-            self.comm.message_received.emit(f"[Sistema] Conectado ao servidor {HOST}:{PORT}")
-            
-            # Inicia thread para receber mensagens
-            threading.Thread(target=self.receive_messages, daemon=True).start()
-            
+            await self.engine.connect()
         except Exception as e:
-            self.comm.message_received.emit(f"[Erro ao conectar]: {e}")
+            self.append_message(f"[Erro ao conectar]: {e}")
+
+    def closeEvent(self, event):
+        self.engine.close()
+        self.history.close()
+        self.store.close()
+        super().closeEvent(event)
 
     def safe_int_conversion(self, value, default=0):
         try:
@@ -295,6 +518,9 @@ class ChatClient(QWidget):
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
+    loop = qasync.QEventLoop(app)
+    asyncio.set_event_loop(loop)
     window = ChatClient()
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    with loop:
+        loop.run_forever()
\ No newline at end of file
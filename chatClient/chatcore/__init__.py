@@ -0,0 +1,30 @@
+from .framing import (
+    MODE_AUTO, MODE_JSON, MODE_LENGTH, FrameDecoder, FrameError, decode_payload,
+    encode_frame
+)
+from .protocol import (
+    ASSIGNED_ID_PREFIX, CLIENT_LIST_PREFIX, CLIENT_NOT_FOUND, CMD_ACK, CMD_CONNECT, CMD_EXIT,
+    CMD_GROUP, CMD_KEEPALIVE, CMD_LIST, CMD_MULTICAST, CMD_SESSION, CMD_SUBSCRIBE,
+    CMD_UNSUBSCRIBE, CONNECTED_PREFIX, DELIVERED, EXITED, GROUP_CREATE, GROUP_ID_BASE, GROUP_JOIN, GROUP_LEAVE, GROUP_LIST, HEARTBEAT,
+    HELLO_BINARY, NOT_AVAILABLE, NOT_IN_CONVERSATION, REACHED, SERVER_ID, WIRE_BINARY,
+    WIRE_JSON, MessageEncoder, encode_for, encode_message, is_group,
+    timestamp
+)
+from .binary import BINARY_MAGIC, BinaryFormatError, decode_binary, encode_binary
+from .presence import PRESENCE_PREFIX, PresenceTracker, encode_presence, parse_presence
+from .directory import (
+    CMD_DIRECTORY, DIRECTORY_PAGE, DIRECTORY_PREFIX, DirectoryCache, encode_page, parse_directory
+)
+from .keepalive import DEFAULT_IDLE_TIMEOUT, KeepaliveTimer, enable_tcp_keepalive, interval_for
+from .transfer import (
+    FILE_COMPLETE, FILE_FAILED, FILE_OFFERED, FILE_PAUSED, FILE_RECEIVING, FILE_SENDING, Transfer
+)
+from .writer import BLOCK, DROP_OLDEST, REJECT, OutboundQueue, SocketWriter
+from .metrics import (
+    MSG_DELIVERED, MSG_FAILED, MSG_PENDING, MSG_REACHED, DeliveryTracker, LatencyHistogram,
+    WindowedLatency
+)
+from .recorder import TrafficRecorder, read_trace
+from .engine import DEFAULT_HOST, DEFAULT_PORT, ChatEngine, EngineHandler, OutboxEntry
+from .history import DEFAULT_CAP, ConversationHistory, HistoryEntry, HistoryStore
+from .store import MessageStore, SearchHit, match_query
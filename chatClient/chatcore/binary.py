@@ -0,0 +1,80 @@
+# Formato binário compacto, negociado com "/hello binary" após o ID:
+#
+#   magic   u8      0xC1
+#   sender  i32     big-endian
+#   receiver i32
+#   conversation i32
+#   timestamp u32   segundos desde a época (0 = sem timestamp)
+#   length  varint  tamanho do conteúdo UTF-8
+#   content bytes
+#
+# O frame segue com o prefixo de 4 bytes do MODE_LENGTH, então o decoder
+# separa frames binários e JSON no mesmo stream.
+import struct
+import time
+
+BINARY_MAGIC = 0xC1
+
+_HEADER = struct.Struct(">BiiiI")
+_MAX_VARINT_SHIFT = 28      # até 5 bytes de tamanho
+_iso_cache = (None, None)
+
+
+class BinaryFormatError(ValueError):
+    pass
+
+
+def _varint(n):
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def encode_binary(sender_id, receiver_id, content, conversation_id=0, stamp=0):
+    data = content.encode("utf-8")
+    size = len(data)
+    length = bytes((size,)) if size < 0x80 else _varint(size)
+    return _HEADER.pack(BINARY_MAGIC, sender_id, receiver_id, conversation_id, stamp) + length + data
+
+
+def _iso(second):
+    global _iso_cache
+    cached_second, value = _iso_cache
+    if cached_second != second:
+        value = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        _iso_cache = (second, value)
+    return value
+
+
+def decode_binary(payload):
+    if len(payload) < _HEADER.size + 1:
+        raise BinaryFormatError("truncated binary frame")
+    magic, sender, receiver, conversation, stamp = _HEADER.unpack_from(payload)
+    if magic != BINARY_MAGIC:
+        raise BinaryFormatError(f"unknown binary frame type: {magic:#x}")
+    pos = _HEADER.size
+    end = len(payload)
+    size = shift = 0
+    while True:
+        if pos >= end:
+            raise BinaryFormatError("truncated binary length")
+        byte = payload[pos]
+        pos += 1
+        size |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+        if shift > _MAX_VARINT_SHIFT:
+            raise BinaryFormatError("binary length too long")
+    if pos + size > end:
+        raise BinaryFormatError("truncated binary content")
+    return {
+        "SenderId": sender,
+        "ReceiverId": receiver,
+        "Content": payload[pos:pos + size].decode("utf-8"),
+        "Timestamp": _iso(stamp) if stamp else None,
+        "ConversationId": conversation,
+    }
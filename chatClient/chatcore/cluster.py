@@ -0,0 +1,540 @@
+# Modo com vários processos do servidor de referência
+#
+#   cd chatClient && python -m chatcore.server --port 8888 --workers 4
+#
+# Cada worker é um processo com o seu ChatServer e aceita na mesma porta
+# (SO_REUSEPORT: o kernel distribui as conexões novas entre eles). Os IDs
+# de cliente saem de um contador compartilhado, reservado em blocos. Os
+# workers se falam por pares de sockets Unix criados pelo processo pai, um
+# por par de workers, e cada um guarda onde está cada cliente dos outros
+# (worker e formato de fio), anunciado a cada entrada e saída. Assim:
+#
+#   - uma mensagem privada para um cliente de outro worker já sai codificada
+#     para ele; o worker de destino só a põe na fila da conexão e devolve se
+#     entregou, e aí o remetente recebe "Message delivered." (na ordem das
+#     outras respostas dele);
+#   - o /multicast manda um frame por worker e formato, com a lista de IDs;
+#   - grupos têm um dono só, o worker 0: os comandos /group dos outros vão
+#     para ele, que aplica, espalha cada mudança de membros para as cópias
+#     dos outros workers e responde ao cliente pelo worker dele;
+#   - sessões desconectadas são copiadas para todos, para serem retomadas em
+#     qualquer worker; presença, /list e /directory cobrem o cluster todo.
+#
+# Um ID que o cliente soube por outro caminho pode chegar antes do anúncio
+# (um /connect logo depois de o par receber o ID): o worker troca uma
+# rodada com os outros, que já têm na frente tudo o que mandaram antes, e
+# então responde. A retomada de uma sessão cuja conexão antiga ainda parece
+# aberta em outro worker não derruba essa conexão: o cliente recebe um ID
+# novo. Se um worker cai, o processo pai encerra os outros.
+import asyncio
+import json
+import logging
+import multiprocessing
+import multiprocessing.connection
+import signal
+import socket
+import struct
+import sys
+import time
+from bisect import insort
+
+from .protocol import DELIVERED, NOT_AVAILABLE, SERVER_ID, WIRE_BINARY, WIRE_JSON, encode_for
+from .presence import JOIN, LEAVE
+from .server import ChatServer, Group, Session
+from .transfer import CANCEL, DECLINE, HEADER_SIZE, decode_file_header, encode_file_frame, file_header
+
+log = logging.getLogger("chatcore.cluster")
+
+COORDINATOR = 0         # worker dono dos grupos
+ID_BLOCK = 64           # IDs reservados por vez no contador compartilhado
+
+# Mensagens entre workers: tamanho do corpo u32 | tipo u8 | corpo
+ATTACH = 1              # id i32, formato u8
+DETACH = 2              # id
+WIRE = 3                # id, formato
+DELIVER = 4             # destino i32, token u32, frame pronto; responde RESULT
+RESULT = 5              # token, entregue u8
+PUSH = 6                # destino, frame pronto
+MULTI = 7               # quantidade u32, destinos, frame pronto
+FILE = 8                # destino, frame de arquivo (recusa volta ao remetente)
+SYNC = 9                # token; responde SYNCED
+SYNCED = 10
+CONTROL = 11            # JSON, para o que é raro (sessões, grupos)
+
+_HEADER = struct.Struct("!IB")
+_ID = struct.Struct("!i")
+_ID_WIRE = struct.Struct("!iB")
+_DELIVER = struct.Struct("!iI")
+_RESULT = struct.Struct("!IB")
+_TOKEN = struct.Struct("!I")
+_COUNT = struct.Struct("!I")
+_LENGTH_PREFIX = 4      # frames de arquivo saem com o prefixo de tamanho
+
+WIRES = (WIRE_JSON, WIRE_BINARY)
+WIRE_CODES = {wire: code for code, wire in enumerate(WIRES)}
+
+
+class IdAllocator:
+    """IDs de cliente únicos no cluster.
+
+    Cada worker reserva ID_BLOCK IDs do contador compartilhado
+    (multiprocessing.Value) e os distribui sem voltar ao lock.
+    """
+
+    def __init__(self, counter, block=ID_BLOCK):
+        self.counter = counter
+        self.block = block
+        self._next = self._end = 0
+
+    def next(self):
+        if self._next == self._end:
+            with self.counter.get_lock():
+                start = self.counter.value
+                self.counter.value = start + self.block
+            self._next, self._end = start + 1, start + 1 + self.block
+        client_id = self._next
+        self._next += 1
+        return client_id
+
+
+class Link(asyncio.Protocol):
+    # Ligação com outro worker; as mensagens de uma iteração do loop saem
+    # juntas, como na fila de ClientConnection
+
+    def __init__(self, server, peer):
+        self.server = server
+        self.peer = peer
+        self.transport = None
+        self._buffer = bytearray()
+        self._queue = []
+        self._flush_scheduled = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.transport = None
+        self.server.link_lost(self.peer, exc)
+
+    def data_received(self, data):
+        buffer = self._buffer
+        buffer += data
+        received = self.server.link_received
+        pos = 0
+        end = len(buffer)
+        with memoryview(buffer) as view:
+            while end - pos >= _HEADER.size:
+                size, kind = _HEADER.unpack_from(view, pos)
+                start = pos + _HEADER.size
+                if end - start < size:
+                    break
+                pos = start + size
+                received(self.peer, kind, view[start:pos].tobytes())
+        del buffer[:pos]
+
+    def send(self, kind, *parts):
+        if self.transport is None:
+            return
+        self._queue.append(_HEADER.pack(sum(len(p) for p in parts), kind))
+        self._queue.extend(parts)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+    def send_control(self, **fields):
+        self.send(CONTROL, json.dumps(fields).encode())
+
+    def _flush(self):
+        self._flush_scheduled = False
+        if self.transport is not None and self._queue:
+            self.transport.writelines(self._queue)
+        self._queue.clear()
+
+
+class RemoteClient:
+    # Cliente de outro worker visto pelo coordenador ao tratar um /group
+    __slots__ = ("server", "client_id")
+
+    def __init__(self, server, client_id):
+        self.server = server
+        self.client_id = client_id
+
+    def send_server_message(self, content, conversation_id=0):
+        self.server.send_to(self.client_id, content, conversation_id)
+
+
+class ShardedServer(ChatServer):
+    """Um worker do cluster: ChatServer com os clientes dos outros workers
+    conhecidos por `remote` e alcançados pelas ligações em `links`."""
+
+    def __init__(self, index, allocator, host="0.0.0.0", port=8888, **options):
+        super().__init__(host, port, reuse_port=True, **options)
+        self.index = index
+        self.allocator = allocator
+        self.links = {}             # índice do worker -> Link
+        self.remote = {}            # id -> (worker, formato) dos outros workers
+        self._deliveries = {}       # token -> (conexão, resposta adiada, par)
+        self._syncs = {}            # token -> [ligações que faltam, callback]
+        self._next_token = 0
+        self.stopped = None
+
+    async def serve(self, sockets):
+        loop = asyncio.get_running_loop()
+        self.stopped = loop.create_future()
+        for peer, sock in sockets.items():
+            _, link = await loop.connect_accepted_socket(lambda peer=peer: Link(self, peer), sock)
+            self.links[peer] = link
+        await self.start()
+        try:
+            await self.stopped
+        finally:
+            self.close()
+
+    def link_lost(self, peer, exc):
+        # A causa (worker que caiu ou encerramento) aparece no processo pai
+        log.info("Lost the link to worker %s (%s); stopping.", peer, exc or "closed")
+        if self.stopped is not None and not self.stopped.done():
+            self.stopped.set_result(None)
+
+    def broadcast(self, kind, *parts):
+        for link in self.links.values():
+            link.send(kind, *parts)
+
+    def broadcast_control(self, **fields):
+        data = json.dumps(fields).encode()
+        self.broadcast(CONTROL, data)
+
+    def _token(self):
+        self._next_token = (self._next_token + 1) & 0xFFFFFFFF
+        return self._next_token
+
+    def sync(self, callback):
+        # callback roda depois que cada worker respondeu: o que eles tinham
+        # mandado antes (anúncios de clientes, sessões) já foi aplicado aqui
+        if not self.links:
+            callback()
+            return
+        token = self._token()
+        self._syncs[token] = [len(self.links), callback]
+        self.broadcast(SYNC, _TOKEN.pack(token))
+
+    # Clientes
+
+    def allocate_id(self):
+        return self.allocator.next()
+
+    def attach(self, conn):
+        super().attach(conn)
+        self.broadcast(ATTACH, _ID_WIRE.pack(conn.client_id, WIRE_CODES[conn.wire]))
+
+    def detach(self, client_id):
+        super().detach(client_id)
+        self.broadcast(DETACH, _ID.pack(client_id))
+
+    def set_wire(self, conn, wire):
+        super().set_wire(conn, wire)
+        self.broadcast(WIRE, _ID_WIRE.pack(conn.client_id, WIRE_CODES[wire]))
+
+    def is_online(self, client_id):
+        return client_id in self.clients or client_id in self.remote
+
+    def park_session(self, client_id, session):
+        super().park_session(client_id, session)
+        self.broadcast_control(op="park", id=client_id, token=session.token, seq=session.message_seq,
+                               conversation=session.conversation_with,
+                               ttl=session.expires - time.monotonic())
+
+    def claim_session(self, client_id):
+        super().claim_session(client_id)
+        self.broadcast_control(op="claim", id=client_id)
+
+    def handle_connect(self, conn, content):
+        parts = content.split(" ", 1)
+        if len(parts) == 2 and parts[1].strip().isdigit() and not self.is_online(int(parts[1])):
+            def retry():
+                if self.clients.get(conn.client_id) is conn:
+                    ChatServer.handle_connect(self, conn, content)
+            self.sync(retry)
+            return
+        super().handle_connect(conn, content)
+
+    def handle_session(self, conn, content):
+        parts = content.split()
+        if len(parts) == 3 and parts[2].isdigit() and int(parts[2]) not in self.sessions:
+            def retry():
+                if self.clients.get(conn.client_id) is conn:
+                    ChatServer.handle_session(self, conn, content)
+            self.sync(retry)
+            return
+        super().handle_session(conn, content)
+
+    # Roteamento
+
+    def send_to(self, client_id, content, conversation_id=0):
+        location = self.remote.get(client_id)
+        if location is None:
+            return super().send_to(client_id, content, conversation_id)
+        worker, wire = location
+        self.links[worker].send(PUSH, _ID.pack(client_id),
+                                encode_for(wire, SERVER_ID, client_id, content, conversation_id))
+        return True
+
+    def send_private_message(self, conn, content):
+        peer_id = conn.conversation_with
+        location = self.remote.get(peer_id)
+        if location is None:
+            super().send_private_message(conn, content)
+            return
+        worker, wire = location
+        token = self._token()
+        self._deliveries[token] = (conn, conn.defer_reply(), peer_id)
+        self.links[worker].send(DELIVER, _DELIVER.pack(peer_id, token),
+                                encode_for(wire, conn.client_id, peer_id, content, peer_id))
+
+    def fan_out(self, sender_id, conversation, text, recipients):
+        remote = self.remote
+        local = []
+        elsewhere = {}              # (worker, formato) -> ids
+        for client_id in recipients:
+            location = remote.get(client_id)
+            if location is None:
+                local.append(client_id)
+            else:
+                elsewhere.setdefault(location, []).append(client_id)
+        delivered = super().fan_out(sender_id, conversation, text, local)
+        for (worker, wire), ids in elsewhere.items():
+            self.links[worker].send(MULTI, _COUNT.pack(len(ids)), struct.pack(f"!{len(ids)}i", *ids),
+                                    encode_for(wire, sender_id, conversation, text, conversation))
+            delivered += len(ids)
+        return delivered
+
+    def relay_file(self, conn, frame):
+        kind, sender_id, receiver_id, transfer_id, offset = decode_file_header(frame)
+        location = self.remote.get(receiver_id)
+        if location is None:
+            super().relay_file(conn, frame)
+            return
+        if not self.accept_file_frame(conn, sender_id):
+            return
+        worker, wire = location
+        if wire != WIRE_BINARY:
+            if kind not in (CANCEL, DECLINE):
+                conn.send(encode_file_frame(DECLINE, receiver_id, conn.client_id, transfer_id, 0,
+                                            b"peer not available"))
+            return
+        payload = memoryview(frame)[HEADER_SIZE:]
+        self.links[worker].send(FILE, _ID.pack(receiver_id),
+                                file_header(kind, conn.client_id, receiver_id, transfer_id, offset, len(payload)),
+                                payload)
+
+    def _push_frame(self, client_id, frame):
+        conn = self.clients.get(client_id)
+        if conn is not None:
+            conn.send(frame)
+            return
+        location = self.remote.get(client_id)
+        if location is not None:
+            self.links[location[0]].send(PUSH, _ID.pack(client_id), frame)
+
+    # Grupos: o coordenador aplica e replica; os outros encaminham
+
+    def handle_group(self, conn, content):
+        if self.index == COORDINATOR:
+            super().handle_group(conn, content)
+        else:
+            self.links[COORDINATOR].send_control(op="group", client=conn.client_id, content=content)
+
+    def create_group(self, conn, name, member_ids):
+        if any(v.isdigit() and not self.is_online(int(v)) for v in member_ids):
+            self.sync(lambda: ChatServer.create_group(self, conn, name, member_ids))
+            return
+        super().create_group(conn, name, member_ids)
+
+    def add_member(self, group, client_id):
+        super().add_member(group, client_id)
+        if self.index == COORDINATOR:
+            self.broadcast_control(op="member", group=group.id, name=group.name, client=client_id, add=True)
+
+    def remove_member(self, group, client_id):
+        super().remove_member(group, client_id)
+        if self.index == COORDINATOR:
+            self.broadcast_control(op="member", group=group.id, name=group.name, client=client_id, add=False)
+
+    def leave_groups(self, client_id):
+        if self.index == COORDINATOR:
+            super().leave_groups(client_id)
+        else:
+            self.links[COORDINATOR].send_control(op="leave", client=client_id)
+
+    # Mensagens dos outros workers
+
+    def link_received(self, peer, kind, body):
+        if kind == DELIVER:
+            target, token = _DELIVER.unpack_from(body)
+            conn = self.clients.get(target)
+            if conn is not None:
+                conn.send(memoryview(body)[_DELIVER.size:])
+            self.links[peer].send(RESULT, _RESULT.pack(token, conn is not None))
+        elif kind == RESULT:
+            token, ok = _RESULT.unpack(body)
+            self._delivered(token, ok)
+        elif kind == MULTI:
+            (count,) = _COUNT.unpack_from(body)
+            ids = struct.unpack_from(f"!{count}i", body, _COUNT.size)
+            frame = memoryview(body)[_COUNT.size + 4 * count:]
+            clients = self.clients
+            for client_id in ids:
+                conn = clients.get(client_id)
+                if conn is not None:
+                    conn.send(frame)
+        elif kind == PUSH:
+            (target,) = _ID.unpack_from(body)
+            conn = self.clients.get(target)
+            if conn is not None:
+                conn.send(memoryview(body)[_ID.size:])
+        elif kind == FILE:
+            self._file_received(body)
+        elif kind == ATTACH:
+            client_id, wire = _ID_WIRE.unpack(body)
+            self.remote[client_id] = (peer, WIRES[wire])
+            insort(self.directory_ids, client_id)
+            self.publish_presence(JOIN, client_id)
+        elif kind == DETACH:
+            (client_id,) = _ID.unpack(body)
+            if self.remote.pop(client_id, None) is not None:
+                self.directory_remove(client_id)
+                self.publish_presence(LEAVE, client_id)
+        elif kind == WIRE:
+            client_id, wire = _ID_WIRE.unpack(body)
+            if client_id in self.remote:
+                self.remote[client_id] = (peer, WIRES[wire])
+        elif kind == SYNC:
+            self.links[peer].send(SYNCED, body)
+        elif kind == SYNCED:
+            (token,) = _TOKEN.unpack(body)
+            waiting = self._syncs.get(token)
+            if waiting is not None:
+                waiting[0] -= 1
+                if not waiting[0]:
+                    del self._syncs[token]
+                    waiting[1]()
+        elif kind == CONTROL:
+            self._control(json.loads(body))
+        else:
+            log.warning("Worker %s sent an unknown message type %s.", peer, kind)
+
+    def _delivered(self, token, ok):
+        conn, slot, peer_id = self._deliveries.pop(token)
+        if ok:
+            conn.resolve_reply(slot, peer_id, DELIVERED, peer_id)
+            return
+        if conn.conversation_with == peer_id:
+            conn.conversation_with = None
+        conn.resolve_reply(slot, conn.client_id, NOT_AVAILABLE)
+
+    def _file_received(self, body):
+        (target,) = _ID.unpack_from(body)
+        frame = memoryview(body)[_ID.size:]
+        conn = self.clients.get(target)
+        if conn is not None and conn.wire == WIRE_BINARY:
+            conn.send(frame)
+            return
+        kind, sender_id, receiver_id, transfer_id, _ = decode_file_header(frame[_LENGTH_PREFIX:])
+        if kind not in (CANCEL, DECLINE):
+            self._push_frame(sender_id, encode_file_frame(DECLINE, receiver_id, sender_id, transfer_id, 0,
+                                                          b"peer not available"))
+
+    def _control(self, fields):
+        op = fields["op"]
+        if op == "group":
+            client_id = fields["client"]
+            if self.is_online(client_id):
+                ChatServer.handle_group(self, RemoteClient(self, client_id), fields["content"])
+        elif op == "leave":
+            ChatServer.leave_groups(self, fields["client"])
+        elif op == "member":
+            group = self.groups.get(fields["group"])
+            if group is None:
+                group = self.groups[fields["group"]] = Group(fields["group"], fields["name"])
+                self.group_names[group.name] = group.id
+            if fields["add"]:
+                self.add_member(group, fields["client"])
+            elif fields["client"] in group.members:
+                self.remove_member(group, fields["client"])
+        elif op == "park":
+            self.sessions[fields["id"]] = Session(fields["token"], fields["seq"], fields["conversation"],
+                                                  time.monotonic() + fields["ttl"])
+        elif op == "claim":
+            self.sessions.pop(fields["id"], None)
+
+
+def run_worker(index, pairs, counter, host, port, options):
+    # Processo filho: fica só com as pontas dos pares de sockets que são dele
+    sockets = {}
+    for (a, b), (sock_a, sock_b) in pairs.items():
+        if a == index:
+            sockets[b] = sock_a
+            sock_b.close()
+        elif b == index:
+            sockets[a] = sock_b
+            sock_a.close()
+        else:
+            sock_a.close()
+            sock_b.close()
+    server = ShardedServer(index, IdAllocator(counter), host, port, **options)
+    try:
+        asyncio.run(server.serve(sockets))
+    except KeyboardInterrupt:
+        pass
+
+
+def free_port(host):
+    # Porta 0 não serve para SO_REUSEPORT: cada worker ganharia uma diferente
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def serve_cluster(host, port, workers, **options):
+    """Sobe `workers` processos na mesma porta e espera.
+
+    Devolve o código de saída: 0 se interrompido, 1 se um worker caiu.
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise OSError("SO_REUSEPORT is not available on this platform")
+    if port == 0:
+        port = free_port(host)
+    context = multiprocessing.get_context("fork")
+    counter = context.Value("q", 0)
+    pairs = {(a, b): socket.socketpair() for a in range(workers) for b in range(a + 1, workers)}
+    processes = [context.Process(target=run_worker, name=f"worker-{index}",
+                                 args=(index, pairs, counter, host, port, options))
+                 for index in range(workers)]
+    for process in processes:
+        process.start()
+    for sock_a, sock_b in pairs.values():
+        sock_a.close()
+        sock_b.close()
+    log.info("Cluster of %d workers on %s:%s.", workers, host, port)
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    status = 0
+    try:
+        ended = multiprocessing.connection.wait([p.sentinel for p in processes])
+        for process in processes:
+            if process.sentinel not in ended:
+                continue
+            process.join()          # o sentinel fecha um pouco antes de o filho ser colhido
+            if process.exitcode:
+                log.error("Worker %s exited with code %s; stopping the cluster.",
+                          process.name, process.exitcode)
+                status = 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+    return status
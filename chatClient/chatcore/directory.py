@@ -0,0 +1,143 @@
+# Diretório de clientes paginado, no lugar do texto livre do /list. O
+# conteúdo segue o campo Content do protocolo:
+#
+#   /directory <etag|-> [cursor] [limite]                       pedido
+#   /directory page <etag> <total> <próximo|-> <id>:<nome>,...  uma página
+#   /directory notmodified <etag>                               nada mudou
+#   /directory error <motivo>
+#
+# As entradas vêm em ordem de ID e o cursor é o último ID da página anterior
+# (paginação por chave): entradas ou saídas no meio da leitura não deslocam
+# as páginas seguintes. A etag muda a cada entrada ou saída de cliente; um
+# pedido da primeira página com a etag atual recebe só "notmodified". Nomes
+# vão com escape de URL, então podem ter espaço, vírgula ou dois-pontos.
+from urllib.parse import quote, unquote
+
+CMD_DIRECTORY = "/directory"
+DIRECTORY_PREFIX = CMD_DIRECTORY + " "
+
+PAGE = "page"
+NOT_MODIFIED = "notmodified"
+ERROR = "error"
+
+DIRECTORY_PAGE = 1000       # entradas por página quando o pedido não diz
+DIRECTORY_MAX_PAGE = 5000
+
+
+def encode_directory_request(etag=None, cursor=0, limit=DIRECTORY_PAGE):
+    return f"{CMD_DIRECTORY} {etag or '-'} {cursor} {limit}"
+
+
+def parse_directory_request(content):
+    # (etag ou None, cursor, limite); ValueError se malformado
+    parts = content.split()
+    if not 1 <= len(parts) <= 4 or parts[0] != CMD_DIRECTORY:
+        raise ValueError(content)
+    etag = parts[1] if len(parts) > 1 and parts[1] != "-" else None
+    cursor = int(parts[2]) if len(parts) > 2 else 0
+    limit = int(parts[3]) if len(parts) > 3 else DIRECTORY_PAGE
+    if cursor < 0 or limit < 1:
+        raise ValueError(content)
+    return etag, cursor, min(limit, DIRECTORY_MAX_PAGE)
+
+
+def encode_page(etag, total, next_cursor, entries):
+    items = ",".join(f"{client_id}:{quote(name, safe='')}" for client_id, name in entries)
+    following = "-" if next_cursor is None else next_cursor
+    return f"{DIRECTORY_PREFIX}{PAGE} {etag} {total} {following} {items}"
+
+
+def encode_not_modified(etag):
+    return f"{DIRECTORY_PREFIX}{NOT_MODIFIED} {etag}"
+
+
+def parse_directory(content):
+    """(tipo, etag, total, próximo cursor, [(id, nome), ...]).
+
+    Em "notmodified" total e cursor são None; em "error" a etag é o motivo.
+    """
+    parts = content.split(" ", 5)
+    kind = parts[1] if len(parts) > 1 else ERROR
+    if kind == NOT_MODIFIED and len(parts) == 3:
+        return kind, parts[2], None, None, []
+    if kind != PAGE or len(parts) < 5:
+        return ERROR, content.split(" ", 2)[-1], None, None, []
+    entries = []
+    for item in parts[5].split(",") if len(parts) == 6 else ():
+        client_id, _, name = item.partition(":")
+        if client_id.isdigit():
+            entries.append((int(client_id), unquote(name)))
+    following = None if parts[4] == "-" else int(parts[4])
+    return kind, parts[2], int(parts[3]), following, entries
+
+
+class DirectoryCache:
+    """Cópia local do diretório, revalidada pela etag.
+
+    Uma leitura nova (várias páginas) é montada à parte e só substitui as
+    entradas quando chega a última página. Se o diretório mudou no meio da
+    leitura, a cópia fica com a etag da primeira página: a próxima
+    revalidação percebe a diferença e lê de novo.
+    """
+
+    def __init__(self):
+        self.etag = None
+        self.entries = {}           # id -> nome
+        self._pending = None        # entradas da leitura em andamento
+        self._pending_etag = None
+        self.cursor = 0             # próxima página da leitura em andamento
+
+    @property
+    def synced(self):
+        return self.etag is not None
+
+    @property
+    def fetching(self):
+        return self._pending is not None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, client_id):
+        return client_id in self.entries
+
+    def ids(self):
+        return self.entries.keys()
+
+    def name(self, client_id):
+        return self.entries.get(client_id)
+
+    def begin(self):
+        # Primeiro pedido de uma leitura: (etag a revalidar, cursor)
+        self._pending = {}
+        self._pending_etag = None
+        self.cursor = 0
+        return self.etag, 0
+
+    def abort(self):
+        self._pending = None
+        self._pending_etag = None
+
+    def apply(self, kind, etag, next_cursor, entries):
+        """Aplica uma resposta.
+
+        Devolve None se falta pedir a página seguinte (a partir de
+        `cursor`), True se a leitura terminou e o diretório mudou, ou False
+        se nada mudou (ou se não havia leitura em andamento).
+        """
+        if self._pending is None:
+            return False
+        if kind == NOT_MODIFIED:
+            self.abort()
+            return False
+        if self._pending_etag is None:
+            self._pending_etag = etag
+        self._pending.update(entries)
+        if next_cursor is not None:
+            self.cursor = next_cursor
+            return None
+        changed = self._pending != self.entries
+        self.entries = self._pending
+        self.etag = self._pending_etag
+        self.abort()
+        return changed
@@ -0,0 +1,1006 @@
+import asyncio
+import os
+import random
+import secrets
+from collections import deque
+
+from .directory import (
+    CMD_DIRECTORY, DIRECTORY_PAGE, DIRECTORY_PREFIX, ERROR, DirectoryCache, parse_directory
+)
+from .framing import MODE_AUTO, FrameDecoder, decode_payload
+from .keepalive import DEFAULT_IDLE_TIMEOUT, KeepaliveTimer, enable_tcp_keepalive, interval_for
+from .metrics import DeliveryTracker
+from .presence import PRESENCE_PREFIX, SNAPSHOT, PresenceTracker, parse_presence
+from .protocol import (
+    ASSIGNED_ID_PREFIX, CLIENT_NOT_FOUND, CMD_CONNECT, CMD_EXIT, CMD_GROUP, CMD_KEEPALIVE,
+    CMD_SESSION, CMD_SUBSCRIBE, CONNECTED_PREFIX, DELIVERED, EXITED, GROUP_CREATE, GROUP_ID_BASE,
+    GROUP_JOIN, GROUP_LEAVE, GROUP_LIST, HELLO_BINARY, NOT_AVAILABLE, NOT_IN_CONVERSATION, REACHED,
+    SERVER_ID, WIRE_BINARY, WIRE_JSON, MessageEncoder, is_group
+)
+from .transfer import (
+    ACCEPT, ACK, ACK_EVERY, CANCEL, DATA, DECLINE, FILE_COMPLETE, FILE_FAILED, FILE_OFFERED,
+    FILE_PAUSED, FILE_RECEIVING, FILE_SENDING, HEADER_SIZE, OFFER, Transfer, UploadScheduler,
+    decode_file_header,
+    encode_file_frame, file_token, is_file_frame, offer_payload, parse_offer
+)
+from .writer import DEFAULT_MAX_BYTES, REJECT, OutboundQueue
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8888
+
+# Reconexão: espera aleatória em [0, min(MAX, BASE * 2^tentativa)] segundos
+RECONNECT_BASE = 0.5
+RECONNECT_MAX = 30.0
+
+# Respostas do servidor a uma mensagem de conversa, na ordem do envio
+_MESSAGE_REPLIES = (DELIVERED, NOT_AVAILABLE, NOT_IN_CONVERSATION)
+
+# Trocas de conversa passam pela fila de pedidos (qualquer servidor responde
+# a elas). As implícitas, feitas por send_message, não aparecem no handler;
+# as pedidas com connect_to/exit_conversation sim.
+_EXIT_SHOWN = CMD_EXIT + " (explícito)"
+_CONNECT_SHOWN = CMD_CONNECT + " (explícito)"
+# /exit mandado só pela resposta: a de uma mensagem que ficou sem casar
+# chegaria antes dela (ver _ack_failed)
+_EXIT_FENCE = CMD_EXIT + " (barreira)"
+_SWITCH_PROBES = (CMD_EXIT, CMD_CONNECT, _EXIT_SHOWN, _CONNECT_SHOWN, _EXIT_FENCE)
+
+# Buffer inicial de recepção: o engine só usa feed(), que aumenta o buffer
+# sob demanda, então não precisa reservar os 64 KB do recv_into por conexão
+RECV_BUFSIZE = 2048
+
+# Pedaços de arquivo escritos por iteração do loop, depois das mensagens
+CHUNKS_PER_FLUSH = 4
+
+
+def backoff_delay(attempt, base=RECONNECT_BASE, cap=RECONNECT_MAX):
+    return random.uniform(0, min(cap, base * 2 ** min(attempt, 16)))
+
+
+class EngineHandler:
+    # Callbacks do ChatEngine; todos rodam na thread do event loop
+    def on_connected(self, engine):
+        pass
+
+    def on_client_id(self, engine, client_id):
+        pass
+
+    def on_message(self, engine, data):
+        pass
+
+    def on_text(self, engine, text):
+        pass
+
+    def on_disconnected(self, engine, exc):
+        pass
+
+    def on_presence(self, engine, added, removed):
+        pass
+
+    def on_presence_unsupported(self, engine):
+        pass
+
+    def on_directory(self, engine, changed):
+        # Fim de refresh_directory; engine.directory tem a cópia atual.
+        # changed=False: o servidor respondeu "notmodified" (ou nada mudou)
+        pass
+
+    def on_directory_unsupported(self, engine):
+        pass
+
+    def on_reconnecting(self, engine, attempt, delay):
+        pass
+
+    def on_resumed(self, engine, client_id, resumed):
+        # resumed=False: o servidor não conhecia a sessão e deu um ID novo
+        pass
+
+    def on_message_state(self, engine, message):
+        # message.state mudou (ver chatcore.metrics: MSG_*)
+        pass
+
+    def on_group(self, engine, event, group_id, name):
+        # event: "created"/"joined"/"left" (engine.groups já atualizado),
+        # "list" (ids None), "error" (name = motivo) ou "unsupported"
+        pass
+
+    def on_file(self, engine, transfer):
+        # transfer.state mudou (ver chatcore.transfer); o progresso não
+        # gera callback, consulte engine.active_transfers()
+        pass
+
+
+class OutboxEntry:
+    __slots__ = ("msg_id", "seq", "peer", "content", "conversation_id", "targets", "sent_at", "state")
+
+    def __init__(self, peer, content, conversation_id=None, targets=None):
+        self.msg_id = None          # gerado pelo cliente, único no engine
+        self.seq = None             # posição na sessão; None = ainda não enviada
+        self.peer = peer            # par, ou a conversa de grupo quando há targets
+        self.content = content
+        self.conversation_id = conversation_id
+        self.targets = targets      # destinos de /multicast; None = mensagem privada
+        self.sent_at = None
+        self.state = None
+
+
+class ChatEngine(asyncio.Protocol):
+    """Conexão com o servidor de chat dirigida por um event loop asyncio.
+
+    Leituras chegam por data_received e escritas vão para o buffer do
+    transport, então nenhuma chamada bloqueia quem está no loop. Funciona
+    igual sem interface (asyncio.run) ou dentro do loop do Qt via qasync.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, handler=None, mode=MODE_AUTO,
+                 binary=True, max_queue_bytes=DEFAULT_MAX_BYTES, policy=REJECT,
+                 reconnect=False, keepalive=True, tcp_keepalive=False, groups=True,
+                 download_dir=None, delivery=None, recorder=None):
+        self.host = host
+        self.port = port
+        self.handler = handler or EngineHandler()
+        self.mode = mode
+        self.decoder = FrameDecoder(mode, RECV_BUFSIZE)
+        self.encoder = None
+        self.binary = binary        # pedir o formato binário assim que tiver ID
+        self.wire = WIRE_JSON
+        # Pedidos de recurso (nome, frame), um por vez: o servidor antigo lê um
+        # JSON por leitura e responde a cada pedido com NOT_IN_CONVERSATION.
+        # Pelo mesmo motivo, mensagens esperam em _held enquanto há pedido no ar
+        # e, no formato JSON, enquanto a anterior não teve resposta.
+        self._probes = deque()
+        self._held = deque()
+        self.client_id = None
+        self.transport = None
+        self.presence = None
+        self._presence_pending = False
+        # Diretório paginado: a cópia sobrevive a reconexões e é revalidada
+        # pela etag; None até o servidor responder se entende /directory
+        self.directory = DirectoryCache()
+        self.directory_supported = None
+        self._directory_limit = DIRECTORY_PAGE
+        self._directory_wanted = False  # leitura pedida antes de saber se há suporte
+        self._closed = None
+        # Saída: frames de uma mesma iteração do loop saem juntos; enquanto o
+        # transport pede pausa eles esperam aqui, sob a política escolhida
+        self.outbound = OutboundQueue(max_queue_bytes, policy)
+        self._flush_scheduled = False
+        self._paused = False
+        self._drain_waiters = []
+        # Sessão: sobrevive a quedas quando reconnect=True. O outbox guarda as
+        # mensagens ainda sem "Message delivered." para reenvio.
+        self.reconnect = reconnect
+        self.session_token = secrets.token_hex(8)
+        self.session_id = None
+        # Par da conversa aberta no servidor (uma por conexão). Cada
+        # send_message troca para o seu destino quando preciso; as respostas
+        # dessas trocas implícitas não chegam ao handler.
+        self.conversation = None
+        self._switching = None      # destino da troca implícita em andamento
+        self.outbox = deque()
+        self._sent_seq = 0
+        # None até o servidor responder ao /session (o antigo não entende)
+        self.session_supported = None
+        # Confirmações (/acknoledgment) só têm resposta se o par saiu, e no
+        # servidor antigo ela é igual à de uma mensagem. Lá elas são contadas
+        # como [última mensagem enviada antes, quantidade], na ordem de envio
+        self._acks = deque()
+        self._fence_seq = None
+        self._resuming = False
+        self._closing = False
+        self._reconnect_task = None
+        # Só volta a zero quando o servidor responde a uma mensagem: uma conexão
+        # que cai logo depois de aberta não reinicia o backoff
+        self._reconnect_attempt = 0
+        self.delivery = delivery or DeliveryTracker()
+        # Heartbeat só depois de um intervalo sem nenhum envio; o intervalo
+        # vem do limite de inatividade anunciado pelo servidor
+        self.keepalive = keepalive
+        self.tcp_keepalive = tcp_keepalive
+        self.idle_timeout = DEFAULT_IDLE_TIMEOUT
+        self._keepalive = None
+        # Grupos do servidor (id -> nome); None até o servidor responder se
+        # entende /group, que o servidor antigo trataria como texto da conversa
+        self.use_groups = groups
+        self.groups = {}
+        self.groups_supported = None
+        # Arquivos (só no formato binário). Ofertas recebidas são aceitas em
+        # download_dir; None recusa todas.
+        self.download_dir = download_dir
+        self.uploads = {}           # id da transferência -> Transfer
+        self.downloads = {}         # (remetente, id) -> Transfer
+        self.upload_queue = UploadScheduler()
+        self._next_transfer = 0
+        # Gravação opcional do tráfego (chatcore.recorder); um canal por engine
+        self.recorder = recorder
+        self._channel = recorder.channel() if recorder is not None else None
+
+    @property
+    def connected(self):
+        return self.transport is not None and not self.transport.is_closing()
+
+    @property
+    def presence_synced(self):
+        return self.presence is not None and self.presence.synced
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        self._closing = False
+        self._reconnect_attempt = 0
+        self._closed = loop.create_future()
+        await loop.create_connection(lambda: self, self.host, self.port)
+
+    async def wait_closed(self):
+        if self._closed is not None:
+            await self._closed
+
+    def close(self):
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self.transport is not None:
+            self.transport.close()
+        elif self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
+
+    async def _reconnect(self):
+        loop = asyncio.get_running_loop()
+        while not self._closing:
+            attempt = self._reconnect_attempt
+            delay = backoff_delay(attempt)
+            self.handler.on_reconnecting(self, attempt + 1, delay)
+            await asyncio.sleep(delay)
+            self._reset_connection()
+            self._reconnect_attempt = attempt + 1
+            try:
+                await loop.create_connection(lambda: self, self.host, self.port)
+            except OSError:
+                continue
+            self._reconnect_task = None
+            return
+
+    def _reset_connection(self):
+        # Estado que vale só para uma conexão; sessão e outbox continuam
+        self.decoder = FrameDecoder(self.mode, RECV_BUFSIZE)
+        self.encoder = None
+        self.wire = WIRE_JSON
+        self._probes.clear()
+        self.session_supported = None
+        self._acks.clear()
+        self._fence_seq = None
+        # Uma troca de conversa pode ter ficado pela metade: a próxima
+        # mensagem abre de novo a conversa dela
+        self.conversation = None
+        self.presence = None
+        self._presence_pending = False
+        self.directory.abort()
+        self.directory_supported = None
+        self._directory_wanted = False
+        self._paused = False
+        self._resuming = False
+        self.outbound.clear()
+        self.upload_queue.clear()
+        self.delivery.reset_peer()
+        self.idle_timeout = DEFAULT_IDLE_TIMEOUT
+
+    # asyncio.Protocol
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if self.tcp_keepalive:
+            sock = transport.get_extra_info("socket")
+            if sock is not None:
+                enable_tcp_keepalive(sock)
+        if self.recorder is not None:
+            self.recorder.opened(self._channel, self.host, self.port)
+        self.handler.on_connected(self)
+
+    def data_received(self, data):
+        self.decoder.feed(data)
+        recorder = self.recorder
+        for frame in self.decoder.frames():
+            if recorder is not None:
+                recorder.inbound(self._channel, frame)
+            if is_file_frame(frame):
+                self._handle_file_frame(frame)
+                continue
+            try:
+                message = decode_payload(frame)
+            except ValueError:
+                self.handler.on_text(self, frame.decode(errors="replace"))
+                continue
+            self._dispatch(message)
+            if self._held and not self._probes:
+                # Pedidos respondidos: libera as mensagens que esperavam
+                self._send_held()
+
+    def connection_lost(self, exc):
+        self.transport = None
+        if self.recorder is not None:
+            self.recorder.closed(self._channel)
+        if self._keepalive is not None:
+            self._keepalive.stop()
+            self._keepalive = None
+        self.outbound.clear()
+        self._wake_drain_waiters()
+        self._suspend_transfers()
+        self.handler.on_disconnected(self, exc)
+        if self.reconnect and not self._closing and self.session_id is not None:
+            self._reconnect_task = asyncio.ensure_future(self._reconnect())
+        elif self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
+
+    def _dispatch(self, data):
+        if data.get("SenderId") == SERVER_ID:
+            content = data.get("Content") or ""
+            if self.encoder is None and ASSIGNED_ID_PREFIX in content:
+                self.client_id = data.get("ReceiverId")
+                self.encoder = MessageEncoder(self.client_id)
+                # Depois de uma queda, pede o ID antigo de volta
+                self._resuming = self.session_id is not None
+                self._probe(CMD_SESSION, self.encoder.session(self.session_token, self.session_id))
+                if self.binary:
+                    self._probe(HELLO_BINARY, self.encoder.hello_binary)
+                if self.keepalive:
+                    self._probe(CMD_KEEPALIVE, self.encoder.keepalive_request)
+                    self._start_keepalive()
+                if self.use_groups:
+                    self._probe(CMD_GROUP, self.encoder.group_list_request)
+                # Uma página de uma entrada só para saber se há /directory,
+                # antes que alguma conversa seja aberta
+                self._probe(CMD_DIRECTORY, self.encoder.directory(None, 0, 1))
+                if not self._resuming:
+                    self.session_id = self.client_id
+                    self.handler.on_client_id(self, self.client_id)
+                return
+            if content.startswith(CMD_SESSION + " "):
+                self._handle_session(content)
+                return
+            if content.startswith(CMD_KEEPALIVE + " "):
+                self._handle_keepalive(content)
+                return
+            if content.startswith(CMD_GROUP + " "):
+                self._handle_group(content)
+                return
+            if content.startswith(PRESENCE_PREFIX):
+                self._handle_presence(content)
+                return
+            if content.startswith(DIRECTORY_PREFIX):
+                self._handle_directory(content)
+                return
+            if content == HELLO_BINARY:
+                # Servidor confirmou: daqui em diante os dois lados falam binário
+                self._resolve_probe(HELLO_BINARY)
+                self.wire = WIRE_BINARY
+                self.encoder = MessageEncoder(self.client_id, wire=WIRE_BINARY)
+                self._resume_transfers()
+                return
+            if self._probes and self._probes[0][0] in _SWITCH_PROBES:
+                if self._handle_switch_reply(content):
+                    return
+            elif self._probes and content == NOT_IN_CONVERSATION:
+                # Servidor antigo tratou o pedido como mensagem comum
+                probe = self._probes[0][0]
+                self._resolve_probe(probe)
+                if probe == CMD_SUBSCRIBE:
+                    self._presence_pending = False
+                    self.presence = None
+                    self.handler.on_presence_unsupported(self)
+                elif probe == CMD_SESSION:
+                    self.session_supported = False
+                    if self._resuming:
+                        self._finish_resume(None, 0)
+                elif probe == CMD_GROUP:
+                    self.groups_supported = False
+                    self.handler.on_group(self, "unsupported", None, None)
+                elif probe == CMD_DIRECTORY:
+                    self.directory_supported = False
+                    self._directory_wanted = False
+                    self.handler.on_directory_unsupported(self)
+                return
+            if content in (CLIENT_NOT_FOUND, NOT_AVAILABLE):
+                # O servidor fechou a conversa (ou não a abriu)
+                self.conversation = None
+            if content == NOT_AVAILABLE and self._ack_failed(data):
+                pass    # resposta de uma confirmação, não de mensagem
+            elif content in _MESSAGE_REPLIES and self.outbox and self.outbox[0].seq is not None:
+                # Uma resposta por mensagem enviada, na mesma ordem
+                entry = self.outbox.popleft()
+                self._reconnect_attempt = 0
+                acks = self._acks
+                while acks and acks[0][0] < entry.seq:
+                    acks.popleft()  # o servidor já passou por elas
+                if content == DELIVERED:
+                    self.delivery.delivered(entry, confirmed_by_peer=entry.targets is None)
+                else:
+                    self.delivery.failed(entry)
+                self.handler.on_message_state(self, entry)
+            elif content == REACHED:
+                # O servidor Python informa quem confirmou; o antigo manda o nosso ID
+                peer = data.get("ConversationId")
+                entry = self.delivery.reached(None if peer == self.client_id else peer)
+                if entry is not None:
+                    self.handler.on_message_state(self, entry)
+        self.handler.on_message(self, data)
+
+    def _start_keepalive(self):
+        loop = asyncio.get_running_loop()
+        self._keepalive = KeepaliveTimer(loop, self.send_heartbeat, interval_for(self.idle_timeout))
+        self._keepalive.start()
+
+    def _handle_keepalive(self, content):
+        self._resolve_probe(CMD_KEEPALIVE)
+        try:
+            self.idle_timeout = float(content.split()[1])
+        except (IndexError, ValueError):
+            return
+        if self._keepalive is not None:
+            self._keepalive.set_interval(interval_for(self.idle_timeout))
+
+    def _handle_group(self, content):
+        parts = content.split()
+        event = parts[1] if len(parts) > 1 else None
+        if event == GROUP_LIST:
+            self._resolve_probe(CMD_GROUP)
+            self.groups_supported = True
+            self.groups = {}
+            for item in parts[2:]:
+                group_id, _, name = item.partition(":")
+                if group_id.isdigit():
+                    self.groups[int(group_id)] = name
+            self.handler.on_group(self, event, None, None)
+        elif event in ("created", "joined", "left") and len(parts) >= 4 and parts[2].isdigit():
+            group_id, name = int(parts[2]), parts[3]
+            if event == "left":
+                self.groups.pop(group_id, None)
+            else:
+                self.groups[group_id] = name
+            self.handler.on_group(self, event, group_id, name)
+        else:
+            self.handler.on_group(self, "error", None, content.split(" ", 2)[-1])
+
+    def _ack_failed(self, data):
+        # True se o NOT_AVAILABLE responde a uma confirmação
+        conversation = data.get("ConversationId") or 0
+        if conversation and not is_group(conversation):
+            return True     # servidor Python: traz o par da confirmação
+        acks = self._acks
+        if not acks or (self.outbox and acks[0][0] >= self.outbox[0].seq):
+            return False
+        acks[0][1] -= 1
+        if not acks[0][1]:
+            acks.popleft()
+        if self.outbox and self._fence_seq is None:
+            # Ou a confirmação falhou e a mensagem ainda recebe o seu
+            # NOT_IN_CONVERSATION, ou a resposta era da mensagem: o /exit
+            # desempata, porque a resposta dele vem depois
+            self._fence_seq = self.outbox[-1].seq
+            self._probe(_EXIT_FENCE, self.encoder.exit_request)
+        return True
+
+    def _handle_session(self, content):
+        self._resolve_probe(CMD_SESSION)
+        self.session_supported = True
+        if not self._resuming:
+            return
+        try:
+            _, client_id, processed, state = content.split()
+            client_id, processed = int(client_id), int(processed)
+        except ValueError:
+            self._finish_resume(None, 0)
+            return
+        resumed = state == "resumed" and client_id == self.session_id
+        self._finish_resume(client_id if resumed else None, processed)
+
+    def _finish_resume(self, client_id, processed):
+        self._resuming = False
+        resumed = client_id is not None
+        if resumed:
+            # O servidor já processou as mensagens até `processed`: não reenviar
+            self.client_id = client_id
+            self.encoder = MessageEncoder(client_id, wire=self.wire)
+            while self.outbox and self.outbox[0].seq is not None and self.outbox[0].seq <= processed:
+                entry = self.outbox.popleft()
+                self.delivery.delivered(entry, measured=False, confirmed_by_peer=entry.targets is None)
+                self.handler.on_message_state(self, entry)
+            self._sent_seq = processed
+        else:
+            self.session_id = self.client_id
+            self._sent_seq = 0
+        self.handler.on_resumed(self, self.client_id, resumed)
+        self._replay()
+
+    def _replay(self):
+        # O que ficou sem resposta volta para a frente da fila de espera e sai
+        # no ritmo dela: em JSON, uma mensagem por resposta, como as novas
+        if not self.outbox and not self._held:
+            self._reconnect_attempt = 0
+        self._held.extendleft(reversed(self.outbox))
+        self.outbox.clear()
+
+    def _switch_to(self, peer_id):
+        # /exit antes do /connect: se o par já saiu, a mensagem falha com
+        # NOT_IN_CONVERSATION em vez de ir para a conversa anterior
+        self._probe(CMD_EXIT, self.encoder.exit_request)
+        self._probe(CMD_CONNECT, self.encoder.connect(peer_id))
+        self.conversation = self._switching = peer_id
+
+    def _handle_switch_reply(self, content):
+        # True se a resposta era de uma troca implícita (e não vai ao handler)
+        probe = self._probes[0][0]
+        if probe in (CMD_EXIT, _EXIT_SHOWN, _EXIT_FENCE) and content == EXITED:
+            if probe == _EXIT_FENCE:
+                self._fail_unanswered()
+            self._resolve_probe(probe)
+            return probe != _EXIT_SHOWN
+        if probe in (CMD_CONNECT, _CONNECT_SHOWN) and (
+                content.startswith(CONNECTED_PREFIX) or content == CLIENT_NOT_FOUND):
+            if content == CLIENT_NOT_FOUND:
+                self.conversation = None
+                if probe == CMD_CONNECT:
+                    # Par offline ou desconhecido: o que esperava por ele falha
+                    # em vez de pedir a troca de novo
+                    self._fail_held(self._switching)
+            self._resolve_probe(probe)
+            return probe == CMD_CONNECT
+        return False
+
+    def _fail_unanswered(self):
+        # Mensagens de antes da barreira sem resposta: o NOT_AVAILABLE era delas
+        fence, self._fence_seq = self._fence_seq, None
+        while self.outbox and self.outbox[0].seq <= fence:
+            entry = self.outbox.popleft()
+            self.delivery.failed(entry)
+            self.handler.on_message_state(self, entry)
+
+    def _fail_held(self, peer_id):
+        failed, kept = [], deque()
+        for entry in self._held:
+            (failed if entry.targets is None and entry.peer == peer_id else kept).append(entry)
+        self._held = kept
+        for entry in failed:
+            self.delivery.failed(entry)
+            self.handler.on_message_state(self, entry)
+
+    def _send_held(self):
+        # Uma troca de conversa por vez: o resto espera as respostas dela
+        held = self._held
+        while held and not self._probes and self._ready() and not self._awaiting_reply():
+            entry = held[0]
+            if entry.targets is None and entry.peer != self.conversation:
+                self._switch_to(entry.peer)
+                return
+            held.popleft()
+            if not self._send_entry(entry):
+                self.delivery.failed(entry)
+                self.handler.on_message_state(self, entry)
+
+    def _probe(self, name, frame):
+        self._probes.append((name, frame))
+        if len(self._probes) == 1:
+            return self.send(frame)
+        return True
+
+    def _resolve_probe(self, name):
+        if not self._probes or self._probes[0][0] != name:
+            return
+        self._probes.popleft()
+        if self._probes:
+            self.send(self._probes[0][1])
+
+    def _handle_directory(self, content):
+        self._resolve_probe(CMD_DIRECTORY)
+        if self.directory_supported is None:
+            # Resposta da sondagem da conexão
+            self.directory_supported = True
+            if self._directory_wanted:
+                self._directory_wanted = False
+                self.refresh_directory(self._directory_limit)
+            return
+        kind, etag, _, next_cursor, entries = parse_directory(content)
+        if kind == ERROR:
+            self.directory.abort()
+            return
+        changed = self.directory.apply(kind, etag, next_cursor, entries)
+        if changed is None:
+            # Próxima página; a etag só importa no primeiro pedido
+            frame = self.encoder.directory(None, self.directory.cursor, self._directory_limit)
+            if not self.send(frame):
+                self.directory.abort()
+            return
+        self.handler.on_directory(self, changed)
+
+    def _handle_presence(self, content):
+        if self.presence is None:
+            return
+        kind, seq, ids = parse_presence(content)
+        if self._presence_pending and kind != SNAPSHOT:
+            return  # o snapshot pedido ainda vai chegar e já inclui este evento
+        delta = self.presence.apply(kind, seq, ids)
+        if delta is None:
+            # Buraco na sequência: pede um snapshot novo
+            self._presence_pending = True
+            self.send(self.encoder.subscribe_request)
+            return
+        self._presence_pending = False
+        if kind == SNAPSHOT:
+            self._resolve_probe(CMD_SUBSCRIBE)
+        added, removed = delta
+        if added or removed or kind == SNAPSHOT:
+            self.handler.on_presence(self, added, removed)
+
+    def pause_writing(self):
+        self._paused = True
+
+    def resume_writing(self):
+        self._paused = False
+        if self.outbound:
+            self._schedule_flush()
+        else:
+            self._wake_drain_waiters()
+
+    def _schedule_flush(self):
+        if not self._flush_scheduled and not self._paused and (self.outbound or self.upload_queue):
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        if self.transport is None or self._paused:
+            return
+        if self.outbound:
+            batch = self.outbound.pop_batch()
+            if self.recorder is not None:
+                for frame in batch:
+                    self.recorder.outbound(self._channel, frame)
+            if self.wire == WIRE_BINARY:
+                self.transport.writelines(batch)
+            else:
+                # Um write por frame; não impede que o servidor antigo leia dois
+                # de uma vez, por isso mensagens e pedidos saem um por resposta
+                for frame in batch:
+                    self.transport.write(frame)
+        elif self.upload_queue:
+            # Arquivos só usam a conexão quando não há mensagem esperando, e
+            # poucos pedaços por vez: o que chegar no meio sai na próxima volta
+            self._send_chunks()
+        if self._keepalive is not None:
+            self._keepalive.touch()     # qualquer frame conta como atividade
+        if self.outbound or self.upload_queue:
+            self._schedule_flush()
+        if not self.outbound:
+            self._wake_drain_waiters()
+
+    def _send_chunks(self):
+        for _ in range(CHUNKS_PER_FLUSH):
+            if self._paused or self.outbound:
+                return
+            item = self.upload_queue.next_frames(self.client_id)
+            if item is None:
+                return
+            transfer, frames = item
+            if frames is None:
+                # Arquivo sumiu ou encolheu: cancela só esta transferência
+                self._fail_transfer(transfer, transfer.error, notify_peer=True)
+                continue
+            if self.recorder is not None:
+                self.recorder.outbound_file(self._channel, frames)
+            self.transport.writelines(frames)
+
+    def _wake_drain_waiters(self):
+        waiters, self._drain_waiters = self._drain_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def drain(self):
+        # Espera a fila de saída esvaziar (a forma "bloqueante" para corrotinas)
+        while self.connected and (self.outbound or self._paused):
+            waiter = asyncio.get_running_loop().create_future()
+            self._drain_waiters.append(waiter)
+            await waiter
+
+    # Envio (nunca bloqueia; retorna False se não há conexão/ID ainda ou se a
+    # fila de saída recusou o frame)
+
+    def send(self, frame, priority=False):
+        if not self.connected:
+            return False
+        if not self.outbound.push(frame, priority):
+            return False
+        self._schedule_flush()
+        return True
+
+    async def send_blocking(self, frame):
+        # Política BLOCK: espera espaço na fila em vez de recusar
+        while not self.send(frame):
+            if not self.connected:
+                return False
+            await self.drain()
+        return True
+
+    def send_message(self, peer_id, content, conversation_id=None):
+        # Retorna a OutboxEntry (msg_id/state) ou None se não foi aceita.
+        # Para um ID de grupo a mensagem sai como /multicast para o grupo.
+        if is_group(peer_id):
+            return self.send_multicast((peer_id,), content)
+        return self._submit(OutboxEntry(peer_id, content, conversation_id))
+
+    def send_multicast(self, targets, content):
+        # Um frame para vários destinos (IDs de cliente e/ou de grupo); o
+        # servidor replica e responde uma vez, como a uma mensagem privada
+        if not self.groups_supported:
+            return None
+        targets = tuple(targets)
+        groups = [t for t in targets if is_group(t)]
+        peer = groups[0] if len(groups) == 1 else GROUP_ID_BASE
+        return self._submit(OutboxEntry(peer, content, peer, targets))
+
+    def _ready(self):
+        return self.encoder is not None and not self._resuming and self.connected
+
+    def _awaiting_reply(self):
+        # Writes separados não garantem leituras separadas no servidor: em
+        # JSON, uma mensagem só sai depois da resposta da anterior
+        return self.wire == WIRE_JSON and bool(self.outbox)
+
+    def _submit(self, entry):
+        if not self._ready():
+            if not self.reconnect or self.session_id is None or self._closing:
+                return None
+            self.delivery.sent(entry)
+            self._held.append(entry)    # sai quando a sessão voltar
+            return entry
+        if (self._probes or self._held or self._awaiting_reply()
+                or (entry.targets is None and entry.peer != self.conversation)):
+            # Espera a troca de conversa, outro pedido ou a resposta da
+            # anterior, para não chegar na mesma leitura do servidor antigo
+            self.delivery.sent(entry)
+            self._held.append(entry)
+            self._send_held()
+            return entry
+        return entry if self._send_entry(entry) else None
+
+    def _send_entry(self, entry):
+        if entry.targets is not None:
+            frame = self.encoder.multicast(entry.targets, entry.content)
+        else:
+            frame = self.encoder.message(entry.peer, entry.content, entry.conversation_id)
+        if not self.send(frame):
+            return False
+        self._sent_seq += 1
+        entry.seq = self._sent_seq
+        self.delivery.sent(entry)
+        self.outbox.append(entry)
+        return True
+
+    def send_heartbeat(self):
+        return self.encoder is not None and self.send(self.encoder.heartbeat, priority=True)
+
+    def request_clients_list(self):
+        return self.encoder is not None and self.send(self.encoder.list_request)
+
+    def connect_to(self, peer_id):
+        if self.encoder is None:
+            return False
+        self.conversation = peer_id
+        return self._probe(_CONNECT_SHOWN, self.encoder.connect(peer_id))
+
+    def exit_conversation(self):
+        if self.encoder is None:
+            return False
+        self.conversation = None
+        return self._probe(_EXIT_SHOWN, self.encoder.exit_request)
+
+    # Arquivos
+
+    def send_file(self, peer_id, path):
+        # Oferece o arquivo ao par; os dados só saem depois do ACCEPT
+        if self.encoder is None or self.wire != WIRE_BINARY or not self.connected:
+            return None
+        self._next_transfer += 1
+        transfer = Transfer(self._next_transfer, peer_id, os.path.basename(path),
+                            os.path.getsize(path), file_token(path), True, path)
+        self.uploads[transfer.transfer_id] = transfer
+        self._send_file_frame(OFFER, transfer, payload=offer_payload(transfer))
+        self.handler.on_file(self, transfer)
+        return transfer
+
+    def cancel_transfer(self, transfer, reason="cancelled"):
+        self._fail_transfer(transfer, reason, notify_peer=True)
+
+    def active_transfers(self):
+        return [t for t in list(self.uploads.values()) + list(self.downloads.values())
+                if t.state in (FILE_SENDING, FILE_RECEIVING, FILE_OFFERED)]
+
+    def _send_file_frame(self, kind, transfer, offset=0, payload=b"", priority=False):
+        frame = encode_file_frame(kind, self.client_id, transfer.peer, transfer.transfer_id,
+                                  offset, payload)
+        return self.send(frame, priority)
+
+    def _handle_file_frame(self, frame):
+        try:
+            kind, sender, _, transfer_id, offset = decode_file_header(frame)
+        except ValueError:
+            return
+        if kind == OFFER:
+            self._accept_offer(sender, transfer_id, memoryview(frame)[HEADER_SIZE:])
+            return
+        if kind in (ACCEPT, ACK, DECLINE):
+            transfer = self.uploads.get(transfer_id)
+        else:
+            transfer = self.downloads.get((sender, transfer_id))
+        if transfer is None or transfer.peer != sender:
+            return
+        if kind in (CANCEL, DECLINE):
+            reason = bytes(frame[HEADER_SIZE:]).decode(errors="replace")
+            self._fail_transfer(transfer, reason or "cancelled")
+        elif kind == ACCEPT:
+            if transfer.state != FILE_OFFERED:
+                return
+            if offset > transfer.size:
+                self._fail_transfer(transfer, "invalid resume offset", notify_peer=True)
+                return
+            transfer.open(offset)
+            transfer.state = FILE_SENDING
+            self.handler.on_file(self, transfer)
+            self._on_acked(transfer)
+        elif kind == ACK and transfer.state == FILE_SENDING:
+            transfer.acked = max(transfer.acked, min(offset, transfer.offset))
+            self._on_acked(transfer)
+        elif kind == DATA:
+            self._receive_chunk(transfer, offset, memoryview(frame)[HEADER_SIZE:])
+
+    def _on_acked(self, transfer):
+        if transfer.acked >= transfer.size:
+            transfer.close()
+            transfer.state = FILE_COMPLETE
+            del self.uploads[transfer.transfer_id]
+            self.handler.on_file(self, transfer)
+        elif transfer.window_open() and transfer.offset < transfer.size:
+            self.upload_queue.add(transfer)
+            self._schedule_flush()
+
+    def _accept_offer(self, sender, transfer_id, payload):
+        try:
+            name, size, token = parse_offer(payload)
+        except (ValueError, KeyError, TypeError):
+            return
+        if self.download_dir is None or not token:
+            self.send(encode_file_frame(DECLINE, self.client_id, sender, transfer_id, 0, b"declined"), True)
+            return
+        for key, old in list(self.downloads.items()):
+            if old.token == token:
+                # Oferta repetida depois de uma queda: recomeça do .part
+                old.close()
+                del self.downloads[key]
+        os.makedirs(self.download_dir, exist_ok=True)
+        part = os.path.join(self.download_dir, f".{token}.part")
+        resume = os.path.getsize(part) if os.path.exists(part) else 0
+        if resume > size:
+            os.remove(part)
+            resume = 0
+        transfer = Transfer(transfer_id, sender, name, size, token, False, part)
+        transfer.open(resume)
+        transfer.acked = resume
+        transfer.state = FILE_RECEIVING
+        self.downloads[(sender, transfer_id)] = transfer
+        self._send_file_frame(ACCEPT, transfer, resume, priority=True)
+        self.handler.on_file(self, transfer)
+        if resume == size:
+            self._finish_download(transfer)
+
+    def _receive_chunk(self, transfer, offset, data):
+        if offset < transfer.offset:
+            # Repetição de algo já gravado (retomada): descarta o começo
+            data = data[transfer.offset - offset:]
+            if not data:
+                return
+        elif offset > transfer.offset:
+            self._fail_transfer(transfer, "missing data", notify_peer=True)
+            return
+        transfer.write(data)
+        if transfer.offset >= transfer.size or transfer.offset - transfer.acked >= ACK_EVERY:
+            transfer.checkpoint()
+            # ACK é crédito da janela do remetente: vai na frente de tudo
+            self._send_file_frame(ACK, transfer, transfer.offset, priority=True)
+            if transfer.offset >= transfer.size:
+                self._finish_download(transfer)
+
+    def _finish_download(self, transfer):
+        del self.downloads[(transfer.peer, transfer.transfer_id)]
+        try:
+            transfer.finish(self.download_dir)
+        except OSError as e:
+            transfer.state = FILE_FAILED
+            transfer.error = str(e)
+        self.handler.on_file(self, transfer)
+
+    def _fail_transfer(self, transfer, reason, notify_peer=False):
+        if transfer.state in (FILE_COMPLETE, FILE_FAILED):
+            return
+        if notify_peer and self.connected and self.encoder is not None:
+            kind = CANCEL if transfer.outgoing else DECLINE
+            self._send_file_frame(kind, transfer, payload=reason.encode(), priority=True)
+        transfer.close()
+        transfer.state = FILE_FAILED
+        transfer.error = reason
+        self.upload_queue.discard(transfer)
+        if transfer.outgoing:
+            self.uploads.pop(transfer.transfer_id, None)
+        else:
+            self.downloads.pop((transfer.peer, transfer.transfer_id), None)
+        self.handler.on_file(self, transfer)
+
+    def _suspend_transfers(self):
+        # Envios esperam a reconexão; recepções fecham e o .part fica para a
+        # nova oferta do remetente
+        self.upload_queue.clear()
+        keep = self.reconnect and not self._closing
+        for transfer in list(self.uploads.values()):
+            if keep:
+                transfer.state = FILE_PAUSED
+                self.handler.on_file(self, transfer)
+            else:
+                self._fail_transfer(transfer, "disconnected")
+        for transfer in list(self.downloads.values()):
+            self._fail_transfer(transfer, "disconnected")
+
+    def _resume_transfers(self):
+        for transfer in self.uploads.values():
+            if transfer.state == FILE_PAUSED:
+                transfer.state = FILE_OFFERED
+                self._send_file_frame(OFFER, transfer, payload=offer_payload(transfer))
+                self.handler.on_file(self, transfer)
+
+    def create_group(self, name, members=()):
+        return self._group_command(GROUP_CREATE, name, *members)
+
+    def join_group(self, name_or_id):
+        return self._group_command(GROUP_JOIN, name_or_id)
+
+    def leave_group(self, group_id):
+        return self._group_command(GROUP_LEAVE, group_id)
+
+    def _group_command(self, action, *args):
+        return self.groups_supported is True and self.send(self.encoder.group(action, *args))
+
+    def refresh_directory(self, limit=DIRECTORY_PAGE):
+        # Revalida engine.directory: uma resposta "notmodified" se nada mudou,
+        # senão as páginas em sequência; on_directory é chamado no fim
+        if self.encoder is None or self.directory_supported is False:
+            return False
+        if self.directory.fetching:
+            return True
+        self._directory_limit = limit
+        if self.directory_supported is None:
+            # A sondagem da conexão ainda não voltou: a leitura sai depois dela
+            self._directory_wanted = True
+            return True
+        etag, cursor = self.directory.begin()
+        sent = self.send(self.encoder.directory(etag, cursor, limit))
+        if not sent:
+            self.directory.abort()
+        return sent
+
+    def subscribe_presence(self):
+        if self.encoder is None:
+            return False
+        self.presence = PresenceTracker()
+        self._presence_pending = True
+        return self._probe(CMD_SUBSCRIBE, self.encoder.subscribe_request)
+
+    def acknowledge(self, peer_id):
+        if self.encoder is None:
+            return False
+        # Em JSON a confirmação não passa à frente: a ordem casa a resposta
+        if not self.send(self.encoder.ack(peer_id), priority=self.wire == WIRE_BINARY):
+            return False
+        if self.session_supported is False:
+            acks = self._acks
+            if acks and acks[-1][0] == self._sent_seq:
+                acks[-1][1] += 1
+            else:
+                acks.append([self._sent_seq, 1])
+        return True
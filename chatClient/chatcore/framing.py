@@ -0,0 +1,205 @@
+import json
+import re
+import struct
+
+from .binary import BINARY_MAGIC, decode_binary
+
+# Modos de enquadramento do stream TCP
+MODE_JSON = "json"        # objetos JSON concatenados (protocolo atual do servidor)
+MODE_LENGTH = "length"    # prefixo de 4 bytes big-endian + payload
+MODE_AUTO = "auto"        # decide por frame: byte 0x00 inicial => prefixo de tamanho
+
+DEFAULT_BUFSIZE = 64 * 1024
+MAX_FRAME = (1 << 24) - 1
+
+_HEADER = struct.Struct(">I")
+_NOT_SPACE = re.compile(rb"[^ \t\r\n]")
+_START = re.compile(rb"[{\[]")
+_STRUCTURAL = re.compile(rb'[{}\[\]"]')
+_IN_STRING = re.compile(rb'["\\]')
+
+
+class FrameError(ValueError):
+    pass
+
+
+def encode_frame(payload, mode=MODE_JSON):
+    if mode == MODE_LENGTH:
+        if len(payload) > MAX_FRAME:
+            raise FrameError(f"frame too large: {len(payload)} bytes")
+        return _HEADER.pack(len(payload)) + payload
+    return payload
+
+
+def decode_payload(frame):
+    # O primeiro byte distingue o formato binário negociado de um objeto JSON
+    if frame and frame[0] == BINARY_MAGIC:
+        return decode_binary(frame)
+    return json.loads(frame)
+
+
+class FrameDecoder:
+    """Decodificador incremental sobre um buffer de recepção reutilizável.
+
+    Cada leitura vai direto para o fim livre do buffer (recv_into) e todos os
+    frames completos são extraídos; um frame parcial fica no lugar e a análise
+    continua de onde parou, sem reler bytes já examinados.
+    """
+
+    def __init__(self, mode=MODE_AUTO, bufsize=DEFAULT_BUFSIZE, max_frame=MAX_FRAME):
+        if mode not in (MODE_JSON, MODE_LENGTH, MODE_AUTO):
+            raise ValueError(f"unknown framing mode: {mode!r}")
+        self.mode = mode
+        self.max_frame = max_frame
+        self._buf = bytearray(bufsize)
+        self._view = memoryview(self._buf)
+        self._head = 0      # início do frame ainda não consumido
+        self._tail = 0      # fim dos dados válidos
+        self._scan = 0      # até onde o frame atual já foi analisado
+        # Estado do scanner JSON preservado entre leituras
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def pending(self):
+        return self._tail - self._head
+
+    def recv_into(self, sock, min_free=4096):
+        self._reserve(min_free)
+        n = sock.recv_into(self._view[self._tail:])
+        self._tail += n
+        return n
+
+    def feed(self, data):
+        n = len(data)
+        self._reserve(n)
+        self._view[self._tail:self._tail + n] = data
+        self._tail += n
+
+    def frames(self):
+        while True:
+            frame = self._next_frame()
+            if frame is None:
+                return
+            yield frame
+
+    def messages(self):
+        for frame in self.frames():
+            yield decode_payload(frame)
+
+    def _next_frame(self):
+        if self._head >= self._tail:
+            self._head = self._scan = self._tail = 0
+            return None
+        if self.mode == MODE_LENGTH:
+            return self._next_length()
+        if self.mode == MODE_AUTO and self._depth == 0:
+            m = _NOT_SPACE.search(self._buf, self._head, self._tail)
+            if m is None:
+                self._head = self._scan = self._tail
+                return None
+            self._head = self._scan = m.start()
+            if self._buf[self._head] == 0:
+                return self._next_length()
+        return self._next_json()
+
+    def _next_length(self):
+        head = self._head
+        if self._tail - head < _HEADER.size:
+            return None
+        (size,) = _HEADER.unpack_from(self._buf, head)
+        if size > self.max_frame:
+            raise FrameError(f"frame too large: {size} bytes")
+        start = head + _HEADER.size
+        end = start + size
+        if end > self._tail:
+            self._reserve(end - self._tail)
+            return None
+        self._head = self._scan = end
+        return bytes(self._view[start:end])
+
+    def _next_json(self):
+        buf = self._buf
+        end = self._tail
+        pos = self._scan
+        depth = self._depth
+        in_string = self._in_string
+
+        if depth == 0:
+            # Descarta espaços/lixo entre objetos até o início do próximo valor
+            m = _START.search(buf, pos, end)
+            if m is None:
+                self._head = self._scan = end
+                return None
+            pos = self._head = m.start()
+        elif self._escape:
+            if pos >= end:
+                return None
+            pos += 1
+            self._escape = False
+
+        while pos < end:
+            if in_string:
+                m = _IN_STRING.search(buf, pos, end)
+                if m is None:
+                    pos = end
+                    break
+                pos = m.end()
+                if buf[m.start()] == 0x5C:  # barra invertida: pula o próximo byte
+                    if pos >= end:
+                        self._escape = True
+                        break
+                    pos += 1
+                else:
+                    in_string = False
+            else:
+                m = _STRUCTURAL.search(buf, pos, end)
+                if m is None:
+                    pos = end
+                    break
+                pos = m.end()
+                c = buf[m.start()]
+                if c == 0x22:
+                    in_string = True
+                elif c == 0x7B or c == 0x5B:
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        frame = bytes(self._view[self._head:pos])
+                        self._head = self._scan = pos
+                        self._depth = 0
+                        self._in_string = False
+                        return frame
+
+        if pos - self._head > self.max_frame:
+            raise FrameError(f"frame too large: more than {self.max_frame} bytes")
+        self._scan = pos
+        self._depth = depth
+        self._in_string = in_string
+        return None
+
+    def _reserve(self, min_free):
+        if len(self._buf) - self._tail >= min_free:
+            return
+        head = self._head
+        live = self._tail - head
+        if head:
+            # Move o frame parcial para o início; os offsets do scanner acompanham
+            self._view[:live] = self._view[head:self._tail]
+            self._scan -= head
+            self._head = 0
+            self._tail = live
+        if len(self._buf) - self._tail >= min_free:
+            return
+        size = len(self._buf)
+        while size - live < min_free:
+            size *= 2
+        if size > self.max_frame + DEFAULT_BUFSIZE:
+            size = max(self.max_frame + DEFAULT_BUFSIZE, live + min_free)
+        buf = bytearray(size)
+        buf[:live] = self._view[:live]
+        self._view.release()
+        self._buf = buf
+        self._view = memoryview(buf)
@@ -0,0 +1,375 @@
+# Gateway de bots: centenas ou milhares de identidades de chat num único
+# event loop, sem threads por conexão.
+#
+# Cada identidade é um ChatEngine (uma conexão TCP com o servidor); o gateway
+# guarda todas num dict por nome e expõe uma API local para enviar e assinar
+# eventos por identidade: em Python (BotGateway) ou por um socket Unix com
+# um objeto JSON por linha (GatewayServer).
+#
+#   cd chatClient && python -m chatcore.gateway --identities 300 \
+#       --socket /tmp/chattcp-gateway.sock
+#
+# Pedidos pelo socket ("id" é opcional e volta na resposta):
+#   {"op": "add", "identity": "alertas"}                          -> {"ok": true, "client_id": 7}
+#   {"op": "send", "identity": "alertas", "to": 3, "content": "oi"} -> {"ok": true, "msg_id": 1}
+#   {"op": "multicast", "identity": "alertas", "to": [3, 4], "content": "oi"}
+#   {"op": "subscribe", "identity": "alertas"}      (sem "identity": todas)
+#   {"op": "unsubscribe", "identity": "alertas"}
+#   {"op": "list"}                                                -> {"ok": true, "identities": {...}}
+#   {"op": "remove", "identity": "alertas"}
+# Eventos para quem assinou:
+#   {"event": "message", "identity": ..., "sender": 3, "content": ..., "conversation": 3, "timestamp": ...}
+#   {"event": "state", "identity": ..., "msg_id": 1, "to": 3, "state": "delivered"}
+#   {"event": "ready" | "disconnected", "identity": ..., "client_id": 7}
+#   {"event": "server", "identity": ..., "content": "..."}   (demais avisos do servidor)
+import argparse
+import asyncio
+import json
+import logging
+import os
+
+from .engine import DEFAULT_HOST, DEFAULT_PORT, ChatEngine, EngineHandler
+from .metrics import DeliveryTracker, WindowedLatency
+from .protocol import (
+    DELIVERED, NOT_AVAILABLE, NOT_IN_CONVERSATION, REACHED, SERVER_ID, is_group
+)
+from .recorder import TrafficRecorder
+
+log = logging.getLogger("chatcore.gateway")
+
+DEFAULT_SOCKET = "/tmp/chattcp-gateway.sock"
+CONNECT_CONCURRENCY = 100
+CONNECT_TIMEOUT = 10.0
+# Assinante do socket que não lê os eventos é desconectado, não acumula
+MAX_SUBSCRIBER_BYTES = 4 * 1024 * 1024
+
+# Respostas do servidor que já viram evento "state"
+_STATE_REPLIES = (DELIVERED, REACHED, NOT_AVAILABLE, NOT_IN_CONVERSATION)
+
+
+class GatewayError(Exception):
+    pass
+
+
+class BotIdentity(EngineHandler):
+    # Uma identidade: o engine e os callbacks que viram eventos do gateway
+    def __init__(self, gateway, name, engine_options):
+        self.gateway = gateway
+        self.name = name
+        self.ready = asyncio.get_running_loop().create_future()
+        self.engine = ChatEngine(gateway.host, gateway.port, handler=self,
+                                 delivery=DeliveryTracker(server_latency=gateway.server_latency,
+                                                          peer_latency=gateway.peer_latency),
+                                 **engine_options)
+
+    @property
+    def client_id(self):
+        return self.engine.client_id
+
+    def on_client_id(self, engine, client_id):
+        if not self.ready.done():
+            self.ready.set_result(client_id)
+        self.gateway.publish(self.name, "ready", client_id=client_id)
+
+    def on_resumed(self, engine, client_id, resumed):
+        self.gateway.publish(self.name, "ready", client_id=client_id, resumed=resumed)
+
+    def on_disconnected(self, engine, exc):
+        if not self.ready.done():
+            self.ready.set_result(None)
+        self.gateway.publish(self.name, "disconnected", client_id=engine.client_id)
+
+    def on_message(self, engine, data):
+        sender = data.get("SenderId")
+        if sender == SERVER_ID:
+            content = data.get("Content") or ""
+            if content not in _STATE_REPLIES:
+                self.gateway.publish(self.name, "server", content=content)
+            return
+        conversation = data.get("ConversationId")
+        if self.gateway.ack and isinstance(sender, int) and not is_group(conversation):
+            # Como o testetcp01: confirma cada mensagem privada recebida
+            engine.acknowledge(sender)
+        self.gateway.publish(self.name, "message", sender=sender, content=data.get("Content"),
+                             conversation=conversation, timestamp=data.get("Timestamp"))
+
+    def on_message_state(self, engine, message):
+        self.gateway.publish(self.name, "state", msg_id=message.msg_id, to=message.peer,
+                             state=message.state)
+
+
+class BotGateway:
+    """Identidades de chat num único event loop, endereçadas por nome.
+
+    `subscribe(callback, identity=None)` registra callback(event) para os
+    eventos de uma identidade (ou de todas); os eventos são dicts no mesmo
+    formato das linhas do socket Unix. Os eventos só são montados quando há
+    alguém assinando a identidade.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ack=True,
+                 connect_concurrency=CONNECT_CONCURRENCY, **engine_options):
+        self.host = host
+        self.port = port
+        self.ack = ack
+        # reconnect=True: bots voltam sozinhos (e com o mesmo ID) depois de quedas
+        engine_options.setdefault("reconnect", True)
+        self.engine_options = engine_options
+        self.identities = {}
+        self._subscribers = {}      # nome: [callback]
+        self._subscribers_all = []
+        self._connect_limit = asyncio.Semaphore(connect_concurrency)
+        # Latências agregadas de todas as identidades
+        self.server_latency = WindowedLatency()
+        self.peer_latency = WindowedLatency()
+
+    def __len__(self):
+        return len(self.identities)
+
+    def __contains__(self, name):
+        return name in self.identities
+
+    async def add(self, name, timeout=CONNECT_TIMEOUT):
+        # Conecta a identidade e espera o ID atribuído pelo servidor
+        if name in self.identities:
+            raise GatewayError(f"identity already exists: {name}")
+        identity = BotIdentity(self, name, self.engine_options)
+        self.identities[name] = identity
+        async with self._connect_limit:
+            try:
+                await identity.engine.connect()
+                client_id = await asyncio.wait_for(asyncio.shield(identity.ready), timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                client_id = None
+                log.debug("Identity %s failed to connect: %s", name, e)
+        if client_id is None:
+            self.remove(name)
+            raise GatewayError(f"could not connect identity {name}")
+        return identity
+
+    async def add_many(self, names, timeout=CONNECT_TIMEOUT):
+        # Conecta em paralelo (até connect_concurrency por vez); devolve os
+        # nomes que falharam
+        results = await asyncio.gather(*(self.add(name, timeout) for name in names),
+                                       return_exceptions=True)
+        return [name for name, result in zip(names, results) if isinstance(result, Exception)]
+
+    def remove(self, name):
+        identity = self.identities.pop(name, None)
+        if identity is None:
+            return False
+        self._subscribers.pop(name, None)
+        identity.engine.close()
+        return True
+
+    def get(self, name):
+        identity = self.identities.get(name)
+        if identity is None:
+            raise GatewayError(f"unknown identity: {name}")
+        return identity
+
+    def send(self, name, peer_id, content):
+        # OutboxEntry (msg_id/state) ou None se o engine não aceitou
+        return self.get(name).engine.send_message(peer_id, content)
+
+    def multicast(self, name, targets, content):
+        return self.get(name).engine.send_multicast(targets, content)
+
+    def subscribe(self, callback, identity=None):
+        if identity is None:
+            self._subscribers_all.append(callback)
+        else:
+            self.get(identity)
+            self._subscribers.setdefault(identity, []).append(callback)
+
+    def unsubscribe(self, callback, identity=None):
+        callbacks = self._subscribers_all if identity is None else self._subscribers.get(identity, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if identity is not None and not callbacks:
+            self._subscribers.pop(identity, None)
+
+    def publish(self, name, event, **fields):
+        callbacks = self._subscribers.get(name)
+        if not callbacks and not self._subscribers_all:
+            return
+        data = {"event": event, "identity": name}
+        data.update(fields)
+        for callback in (callbacks or ()):
+            callback(data)
+        for callback in self._subscribers_all:
+            callback(data)
+
+    def describe(self):
+        return {name: identity.client_id for name, identity in self.identities.items()}
+
+    def stats(self):
+        server, peer = self.server_latency.recent(), self.peer_latency.recent()
+        connected = sum(1 for identity in self.identities.values() if identity.engine.connected)
+
+        def ms(hist, p):
+            value = hist.percentile(p)
+            return None if value is None else value / 1000
+        return {"identities": len(self.identities), "connected": connected,
+                "delivered_p50_ms": ms(server, 50), "delivered_p99_ms": ms(server, 99),
+                "reached_p50_ms": ms(peer, 50), "reached_p99_ms": ms(peer, 99)}
+
+    async def close(self):
+        identities = list(self.identities.values())
+        self.identities.clear()
+        self._subscribers.clear()
+        self._subscribers_all.clear()
+        for identity in identities:
+            identity.engine.close()
+        await asyncio.gather(*(identity.engine.wait_closed() for identity in identities),
+                             return_exceptions=True)
+
+
+class GatewayServer:
+    """API do gateway num socket Unix: uma linha JSON por pedido e por evento."""
+
+    def __init__(self, gateway, path=DEFAULT_SOCKET):
+        self.gateway = gateway
+        self.path = path
+        self._server = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)    # socket de uma execução anterior
+        self._server = await asyncio.start_unix_server(self._serve, self.path)
+        os.chmod(self.path, 0o600)  # só o dono do processo fala com os bots
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _serve(self, reader, writer):
+        subscriptions = []
+
+        def push(event):
+            if writer.is_closing():
+                return
+            if writer.transport.get_write_buffer_size() > MAX_SUBSCRIBER_BYTES:
+                log.warning("Gateway subscriber too slow, disconnecting")
+                writer.close()
+                return
+            writer.write(json.dumps(event).encode() + b"\n")
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = await self._handle(line, push, subscriptions)
+                if not writer.is_closing():
+                    writer.write(json.dumps(reply).encode() + b"\n")
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            for callback, identity in subscriptions:
+                if identity is None or identity in self.gateway:
+                    self.gateway.unsubscribe(callback, identity)
+            writer.close()
+
+    async def _handle(self, line, push, subscriptions):
+        try:
+            request = json.loads(line)
+            reply = await self._dispatch(request, push, subscriptions)
+            reply["ok"] = True
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            request, reply = None, {"ok": False, "error": f"bad request: {e}"}
+        except GatewayError as e:
+            reply = {"ok": False, "error": str(e)}
+        if isinstance(request, dict) and "id" in request:
+            reply["id"] = request["id"]
+        return reply
+
+    async def _dispatch(self, request, push, subscriptions):
+        gateway = self.gateway
+        op = request["op"]
+        name = request.get("identity")
+        if op == "send":
+            entry = gateway.send(name, int(request["to"]), str(request["content"]))
+            if entry is None:
+                raise GatewayError("not sent (disconnected or queue full)")
+            return {"msg_id": entry.msg_id}
+        if op == "multicast":
+            entry = gateway.multicast(name, [int(t) for t in request["to"]], str(request["content"]))
+            if entry is None:
+                raise GatewayError("multicast not supported by the server")
+            return {"msg_id": entry.msg_id}
+        if op == "subscribe":
+            gateway.subscribe(push, name)
+            subscriptions.append((push, name))
+            return {}
+        if op == "unsubscribe":
+            gateway.unsubscribe(push, name)
+            if (push, name) in subscriptions:
+                subscriptions.remove((push, name))
+            return {}
+        if op == "add":
+            identity = await gateway.add(str(name))
+            return {"client_id": identity.client_id}
+        if op == "remove":
+            if not gateway.remove(name):
+                raise GatewayError(f"unknown identity: {name}")
+            return {}
+        if op == "list":
+            return {"identities": gateway.describe()}
+        if op == "stats":
+            return gateway.stats()
+        raise GatewayError(f"unknown op: {op}")
+
+
+async def run(args):
+    # --record grava o tráfego de todas as identidades (um canal cada)
+    recorder = TrafficRecorder(args.record) if args.record else None
+    gateway = BotGateway(args.host, args.port, ack=not args.no_ack,
+                         connect_concurrency=args.connect_concurrency, recorder=recorder)
+    names = [f"{args.prefix}{i}" for i in range(1, args.identities + 1)]
+    failed = await gateway.add_many(names)
+    log.info("Gateway: %d identities connected to %s:%d (%d failed)",
+             len(gateway), args.host, args.port, len(failed))
+    server = GatewayServer(gateway, args.socket)
+    log.info("API on %s", args.socket)
+    try:
+        await server.serve_forever()
+    finally:
+        server.close()
+        await gateway.close()
+        if recorder is not None:
+            recorder.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gateway de bots do chat TCP")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--identities", type=int, default=0,
+                        help="identidades criadas na partida (as demais via op add)")
+    parser.add_argument("--prefix", default="bot-")
+    parser.add_argument("--connect-concurrency", type=int, default=CONNECT_CONCURRENCY)
+    parser.add_argument("--no-ack", action="store_true",
+                        help="não confirmar as mensagens recebidas")
+    parser.add_argument("--record", metavar="ARQUIVO",
+                        help="grava o tráfego para reproduzir com chatcore.replay")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+import tempfile
+from collections import deque
+
+DEFAULT_CAP = 2000
+# Um offset de arquivo a cada SPILL_PAGE mensagens despejadas: o índice em
+# memória cresce 8 bytes a cada 256 mensagens, não por mensagem
+SPILL_PAGE = 256
+
+
+class HistoryEntry:
+    __slots__ = ("sender", "text", "timestamp", "state")
+
+    def __init__(self, sender, text, timestamp=None, state=None):
+        self.sender = sender        # None = aviso local do sistema
+        self.text = text
+        self.timestamp = timestamp
+        self.state = state          # estado de entrega das mensagens enviadas (só em memória)
+
+    def to_json(self):
+        return json.dumps([self.sender, self.text, self.timestamp]).encode() + b"\n"
+
+    @classmethod
+    def from_json(cls, line):
+        return cls(*json.loads(line))
+
+
+class ConversationHistory:
+    """Histórico de uma conversa com as últimas `cap` mensagens em memória.
+
+    Quando o buffer enche, a mensagem mais antiga vai para um arquivo de
+    despejo (uma linha JSON por mensagem) e pode ser relida por páginas.
+    """
+
+    def __init__(self, key, cap, spill_path):
+        self.key = key
+        self.cap = cap
+        self.messages = deque()
+        self.spill_path = spill_path
+        self.spilled = 0
+        self._spill_file = None
+        self._spill_pos = 0
+        self._page_offsets = []
+
+    def __len__(self):
+        return self.spilled + len(self.messages)
+
+    @property
+    def full(self):
+        return len(self.messages) >= self.cap
+
+    def append(self, entry):
+        # Devolve a mensagem despejada para o disco, se houve
+        evicted = self.evict_oldest() if self.full else None
+        self.messages.append(entry)
+        return evicted
+
+    def extend(self, entries):
+        evicted = []
+        for entry in entries:
+            old = self.append(entry)
+            if old is not None:
+                evicted.append(old)
+        return evicted
+
+    def evict_oldest(self):
+        evicted = self.messages.popleft()
+        self._spill(evicted)
+        return evicted
+
+    def _spill(self, entry):
+        if self._spill_file is None:
+            self._spill_file = open(self.spill_path, "wb+")
+        if self.spilled % SPILL_PAGE == 0:
+            self._page_offsets.append(self._spill_pos)
+        line = entry.to_json()
+        self._spill_file.seek(0, os.SEEK_END)
+        self._spill_file.write(line)
+        self._spill_pos += len(line)
+        self.spilled += 1
+
+    def read_spilled(self, start, stop):
+        # Mensagens despejadas no intervalo [start, stop)
+        start = max(0, start)
+        stop = min(stop, self.spilled)
+        if start >= stop:
+            return []
+        page = start // SPILL_PAGE
+        f = self._spill_file
+        f.flush()
+        f.seek(self._page_offsets[page])
+        for _ in range(start - page * SPILL_PAGE):
+            f.readline()
+        return [HistoryEntry.from_json(f.readline()) for _ in range(stop - start)]
+
+    def close(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+
+class HistoryStore:
+    def __init__(self, cap=DEFAULT_CAP, spill_dir=None):
+        self.cap = cap
+        self._own_dir = spill_dir is None
+        self.spill_dir = spill_dir or tempfile.mkdtemp(prefix="chattcp-history-")
+        self.conversations = {}
+
+    def get(self, key):
+        history = self.conversations.get(key)
+        if history is None:
+            path = os.path.join(self.spill_dir, f"{key}.jsonl")
+            history = self.conversations[key] = ConversationHistory(key, self.cap, path)
+        return history
+
+    def close(self):
+        for history in self.conversations.values():
+            history.close()
+        if self._own_dir:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
@@ -0,0 +1,76 @@
+# Keepalive ciente de tráfego: o heartbeat só sai depois de `interval`
+# segundos sem nenhum frame enviado. O intervalo segue o tempo de
+# inatividade anunciado pelo servidor ("/keepalive <segundos>").
+import socket
+
+# MonitoringService.MonitorClients do servidor .NET desconecta após 60 s
+DEFAULT_IDLE_TIMEOUT = 60.0
+# Heartbeat a cada 1/3 do limite: ainda sobra margem se um se atrasar
+IDLE_FRACTION = 3
+MIN_INTERVAL = 1.0
+
+
+def interval_for(idle_timeout):
+    return max(MIN_INTERVAL, idle_timeout / IDLE_FRACTION)
+
+
+def enable_tcp_keepalive(sock, idle=30, interval=10, count=3):
+    """Liga o keepalive do TCP no socket (detecta servidor morto ou rede caída).
+
+    Não substitui o heartbeat: as sondas do kernel não carregam dados, então
+    o servidor continua contando a conexão como inativa.
+    """
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # Opções por plataforma; onde não existem vale o padrão do sistema
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle)
+    elif hasattr(socket, "TCP_KEEPALIVE"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, idle)
+    if hasattr(socket, "TCP_KEEPINTVL"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, interval)
+    if hasattr(socket, "TCP_KEEPCNT"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, count)
+
+
+class KeepaliveTimer:
+    """Timer de heartbeat para um event loop asyncio.
+
+    `touch()` é chamado a cada escrita e só guarda o instante; o timer não é
+    reagendado por frame. Quando dispara antes da hora, apenas se reagenda
+    para `last_sent + interval`.
+    """
+
+    def __init__(self, loop, callback, interval):
+        self.loop = loop
+        self.callback = callback
+        self.interval = interval
+        self.last_sent = loop.time()
+        self.sent = 0
+        self._handle = None
+
+    def start(self):
+        self.stop()
+        self._handle = self.loop.call_at(self.last_sent + self.interval, self._fire)
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def touch(self):
+        self.last_sent = self.loop.time()
+
+    def set_interval(self, interval):
+        self.interval = interval
+        if self._handle is not None:
+            self.start()
+
+    def _fire(self):
+        now = self.loop.time()
+        due = self.last_sent + self.interval
+        if now >= due:
+            self.callback()
+            self.sent += 1
+            self.last_sent = now
+            due = now + self.interval
+        self._handle = self.loop.call_at(due, self._fire)
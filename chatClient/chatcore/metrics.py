@@ -0,0 +1,173 @@
+# Latências de entrega: histograma log-linear (no estilo HDR) e o rastreio de
+# cada mensagem enviada até "Message delivered." e "Message Reached!."
+import time
+from collections import deque
+
+# Estados de uma mensagem enviada
+MSG_PENDING = "pending"         # enviada (ou no outbox), sem resposta do servidor
+MSG_DELIVERED = "delivered"     # servidor entregou ao par ("Message delivered.")
+MSG_REACHED = "reached"         # o par confirmou com /acknoledgment
+MSG_FAILED = "failed"           # servidor recusou (par saiu / sem conversa)
+
+SUB_BUCKET_BITS = 7         # 64 sub-faixas por potência de 2: erro < 1,6%
+MAX_LATENCY_US = 3600 * 1_000_000
+RECENT_WINDOW = 60.0        # o status mostra os últimos 60-120 s
+
+
+class LatencyHistogram:
+    """Histograma de latências em microssegundos com precisão relativa fixa.
+
+    Cada potência de 2 é dividida em sub-faixas lineares, então gravar é
+    O(1), a memória é fixa (~1700 contadores até 1 h) e os percentis saem
+    com erro relativo limitado, como no HdrHistogram.
+    """
+
+    def __init__(self, max_value=MAX_LATENCY_US, sub_bucket_bits=SUB_BUCKET_BITS):
+        self.max_value = max_value
+        self.sub_bits = sub_bucket_bits
+        self.half = 1 << (sub_bucket_bits - 1)
+        self.counts = [0] * (self._index(max_value) + 1)
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value):
+        magnitude = max(0, value.bit_length() - self.sub_bits)
+        return magnitude * self.half + (value >> magnitude)
+
+    def _highest_equivalent(self, index):
+        magnitude = max(0, index // self.half - 1)
+        lower = (index - magnitude * self.half) << magnitude
+        return lower + (1 << magnitude) - 1
+
+    def record(self, value):
+        value = min(max(0, int(value)), self.max_value)
+        self.counts[self._index(value)] += 1
+        self.total += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        if not self.total:
+            return None
+        target = max(1, -(-self.total * p // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._highest_equivalent(index), self.max)
+        return self.max
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+
+class WindowedLatency:
+    # Histograma total mais dois recentes que se alternam a cada `window` s
+    def __init__(self, window=RECENT_WINDOW):
+        self.window = window
+        self.total = LatencyHistogram()
+        self.current = LatencyHistogram()
+        self.previous = LatencyHistogram()
+        self._rotated = time.monotonic()
+
+    def record(self, value):
+        self._rotate()
+        self.total.record(value)
+        self.current.record(value)
+
+    def _rotate(self):
+        now = time.monotonic()
+        if now - self._rotated < self.window:
+            return
+        self.previous, self.current = self.current, self.previous
+        self.current.reset()
+        if now - self._rotated >= 2 * self.window:
+            self.previous.reset()
+        self._rotated = now
+
+    def recent(self):
+        self._rotate()
+        merged = LatencyHistogram()
+        merged.merge(self.previous)
+        merged.merge(self.current)
+        return merged
+
+
+class DeliveryTracker:
+    """Liga as respostas do servidor às mensagens que as causaram.
+
+    O servidor responde às mensagens de uma conexão na ordem em que chegam
+    e o par confirma as que recebeu também em ordem, então as duas filas
+    casam por FIFO sem precisar de id no fio.
+    """
+
+    def __init__(self, peer_window=1024, server_latency=None, peer_latency=None):
+        # Os histogramas podem ser compartilhados entre conexões (ex.: todas
+        # as identidades de um gateway): ~80 KB a menos por conexão
+        self.server_latency = server_latency or WindowedLatency()
+        self.peer_latency = peer_latency or WindowedLatency()
+        # Pares que nunca confirmam não fazem a fila crescer sem limite
+        self.awaiting_peer = deque(maxlen=peer_window)
+        self._next_id = 0
+
+    def sent(self, message):
+        if message.msg_id is None:
+            self._next_id += 1
+            message.msg_id = self._next_id
+        message.sent_at = time.perf_counter_ns()
+        message.state = MSG_PENDING
+
+    def delivered(self, message, measured=True, confirmed_by_peer=True):
+        # confirmed_by_peer=False: ninguém vai mandar /acknoledgment (ex.: grupos)
+        if measured:
+            self.server_latency.record((time.perf_counter_ns() - message.sent_at) // 1000)
+        message.state = MSG_DELIVERED
+        if confirmed_by_peer:
+            self.awaiting_peer.append(message)
+
+    def failed(self, message):
+        message.state = MSG_FAILED
+
+    def reached(self, peer=None):
+        # Com várias conversas as confirmações de pares diferentes se
+        # intercalam: se o servidor diz quem confirmou, casa a mais antiga
+        # daquele par; senão, FIFO puro
+        awaiting = self.awaiting_peer
+        if not awaiting:
+            return None
+        if peer is None or awaiting[0].peer == peer:
+            message = awaiting.popleft()
+        else:
+            message = next((m for m in awaiting if m.peer == peer), None)
+            if message is None:
+                return None
+            awaiting.remove(message)
+        self.peer_latency.record((time.perf_counter_ns() - message.sent_at) // 1000)
+        message.state = MSG_REACHED
+        return message
+
+    def reset_peer(self):
+        # Confirmações de antes de uma queda não chegam mais
+        self.awaiting_peer.clear()
+
+    def summary(self):
+        def ms(hist, p):
+            value = hist.percentile(p)
+            return "-" if value is None else f"{value / 1000:.1f}"
+        server, peer = self.server_latency.recent(), self.peer_latency.recent()
+        return (f"entrega p50/p99: {ms(server, 50)}/{ms(server, 99)} ms | "
+                f"par p50/p99: {ms(peer, 50)}/{ms(peer, 99)} ms")
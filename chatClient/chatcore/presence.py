@@ -0,0 +1,62 @@
+# Presença empurrada pelo servidor: um snapshot na inscrição e depois eventos
+# de entrada/saída numerados. O conteúdo segue o campo Content do protocolo:
+#
+#   /presence snapshot <seq> <id>,<id>,...
+#   /presence join <seq> <id>
+#   /presence leave <seq> <id>
+PRESENCE_PREFIX = "/presence "
+
+SNAPSHOT = "snapshot"
+JOIN = "join"
+LEAVE = "leave"
+
+
+def encode_presence(kind, seq, ids):
+    return f"{PRESENCE_PREFIX}{kind} {seq} {','.join(map(str, ids))}"
+
+
+def parse_presence(content):
+    try:
+        _, kind, seq, ids = content.split(" ", 3)
+    except ValueError:
+        _, kind, seq = content.split(" ", 2)
+        ids = ""
+    return kind, int(seq), [int(i) for i in ids.split(",") if i]
+
+
+class PresenceTracker:
+    def __init__(self):
+        self.seq = None
+        self.ids = set()
+
+    @property
+    def synced(self):
+        return self.seq is not None
+
+    def apply(self, kind, seq, ids):
+        """Aplica um evento e devolve (adicionados, removidos).
+
+        Devolve None quando falta um evento na sequência (ou ainda não houve
+        snapshot); quem chama deve pedir um novo snapshot.
+        """
+        if kind == SNAPSHOT:
+            new = set(ids)
+            added, removed = new - self.ids, self.ids - new
+            self.ids = new
+            self.seq = seq
+            return added, removed
+        if self.seq is None:
+            return None
+        if seq <= self.seq:
+            return set(), set()  # já incluído no snapshot atual
+        if seq != self.seq + 1:
+            self.seq = None
+            return None
+        self.seq = seq
+        if kind == JOIN:
+            added = set(ids) - self.ids
+            self.ids.update(added)
+            return added, set()
+        removed = set(ids) & self.ids
+        self.ids.difference_update(removed)
+        return set(), removed
@@ -0,0 +1,148 @@
+import json
+import time
+
+from .binary import encode_binary
+from .directory import DIRECTORY_PAGE, encode_directory_request
+from .framing import MODE_JSON, MODE_LENGTH, encode_frame
+
+SERVER_ID = 0
+
+# Conteúdos com significado especial para o servidor
+HEARTBEAT = "heartbeat"
+CMD_LIST = "/list"
+CMD_CONNECT = "/connect"
+CMD_EXIT = "/exit"
+CMD_ACK = "/acknoledgment"
+CMD_SUBSCRIBE = "/subscribe presence"
+CMD_UNSUBSCRIBE = "/unsubscribe presence"
+HELLO_BINARY = "/hello binary"   # pedido e confirmação do formato binário
+CMD_SESSION = "/session"         # "/session <token> [id antigo]" registra ou retoma a sessão
+CMD_KEEPALIVE = "/keepalive"     # pergunta; a resposta é "/keepalive <segundos de inatividade>"
+CMD_GROUP = "/group"             # "/group create|join|leave|list ..."; respostas também começam assim
+CMD_MULTICAST = "/multicast"     # "/multicast <id>,<id>,... <texto>": o servidor replica para cada destino
+
+# Ações de /group (também usadas nas respostas: "/group created <gid> <nome> <ids>")
+GROUP_CREATE = "create"
+GROUP_JOIN = "join"
+GROUP_LEAVE = "leave"
+GROUP_LIST = "list"
+
+# IDs de grupo ficam numa faixa própria, acima de qualquer ID de cliente, e
+# valem como destino de /multicast e como ConversationId das mensagens do grupo.
+# GROUP_ID_BASE sozinho é a conversa das listas avulsas de destinatários.
+GROUP_ID_BASE = 1 << 30
+
+# Formatos de fio
+WIRE_JSON = "json"
+WIRE_BINARY = "binary"
+
+# Respostas do servidor reconhecidas pelos clientes
+ASSIGNED_ID_PREFIX = "Your assigned client ID is"
+CLIENT_LIST_PREFIX = "Active clients:"
+DELIVERED = "Message delivered."
+REACHED = "Message Reached!."
+NOT_IN_CONVERSATION = "You must start a conversation with /connect <client_id> before sending messages."
+NOT_AVAILABLE = "The client you were connected to is no longer available."
+CONNECTED_PREFIX = "You are now connected to Client"
+CLIENT_NOT_FOUND = "Client not found."
+EXITED = "Exited conversation. You can start a new one with /connect <client_id>."
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# Mesmo escape de json.dumps (ensure_ascii), sem passar pelo encoder genérico
+_encode_str = json.encoder.encode_basestring_ascii
+_MESSAGE = '{"SenderId": %d, "ReceiverId": %d, "Content": %s, "Timestamp": %s, "ConversationId": %d}'
+
+_ts_cache = (None, None, None)
+
+
+def _timestamps():
+    # strftime só é chamado uma vez por segundo; a tupla é trocada de forma atômica
+    global _ts_cache
+    second = int(time.time())
+    cache = _ts_cache
+    if cache[0] != second:
+        value = time.strftime(TIMESTAMP_FORMAT, time.gmtime(second))
+        cache = _ts_cache = (second, value, '"' + value + '"')
+    return cache
+
+
+def timestamp():
+    return _timestamps()[1]
+
+
+def encode_message(sender_id, receiver_id, content, conversation_id=0, stamp=True):
+    ts = _timestamps()[2] if stamp else "null"
+    text = _MESSAGE % (sender_id, receiver_id, _encode_str(content), ts, conversation_id)
+    return text.encode("ascii")
+
+
+def is_group(conversation_id):
+    return isinstance(conversation_id, int) and conversation_id >= GROUP_ID_BASE
+
+
+def encode_for(wire, sender_id, receiver_id, content, conversation_id=0, stamp=True, mode=MODE_JSON):
+    # Frame pronto para o socket no formato negociado com o par
+    if wire == WIRE_BINARY:
+        payload = encode_binary(sender_id, receiver_id, content, conversation_id,
+                                int(time.time()) if stamp else 0)
+        return encode_frame(payload, MODE_LENGTH)
+    return encode_frame(encode_message(sender_id, receiver_id, content, conversation_id, stamp), mode)
+
+
+class MessageEncoder:
+    """Codifica os frames de um cliente direto em bytes para o socket.
+
+    Frames constantes (heartbeat, /list, /exit, inscrição de presença e acks
+    por interlocutor) são codificados uma única vez; o servidor ignora o
+    Timestamp deles.
+    """
+
+    def __init__(self, client_id, mode=MODE_JSON, wire=WIRE_JSON):
+        self.client_id = client_id
+        self.mode = mode
+        self.wire = wire
+        self.heartbeat = self._constant(SERVER_ID, HEARTBEAT)
+        self.list_request = self._constant(SERVER_ID, CMD_LIST)
+        self.exit_request = self._constant(SERVER_ID, CMD_EXIT)
+        self.subscribe_request = self._constant(SERVER_ID, CMD_SUBSCRIBE)
+        self.unsubscribe_request = self._constant(SERVER_ID, CMD_UNSUBSCRIBE)
+        self.hello_binary = self._constant(SERVER_ID, HELLO_BINARY)
+        self.keepalive_request = self._constant(SERVER_ID, CMD_KEEPALIVE)
+        self.group_list_request = self._constant(SERVER_ID, f"{CMD_GROUP} {GROUP_LIST}")
+        self._acks = {}
+
+    def _constant(self, receiver_id, content, conversation_id=0):
+        return encode_for(self.wire, self.client_id, receiver_id, content, conversation_id,
+                          stamp=False, mode=self.mode)
+
+    def ack(self, peer_id):
+        frame = self._acks.get(peer_id)
+        if frame is None:
+            frame = self._acks[peer_id] = self._constant(peer_id, CMD_ACK, peer_id)
+        return frame
+
+    def connect(self, peer_id):
+        return self._constant(SERVER_ID, f"{CMD_CONNECT} {peer_id}")
+
+    def session(self, token, resume_id=None):
+        if resume_id is None:
+            return self._constant(SERVER_ID, f"{CMD_SESSION} {token}")
+        return self._constant(SERVER_ID, f"{CMD_SESSION} {token} {resume_id}")
+
+    def directory(self, etag=None, cursor=0, limit=DIRECTORY_PAGE):
+        return self._constant(SERVER_ID, encode_directory_request(etag, cursor, limit))
+
+    def group(self, action, *args):
+        return self._constant(SERVER_ID, " ".join((CMD_GROUP, action) + tuple(str(a) for a in args)))
+
+    def multicast(self, targets, content):
+        # Um único frame; IDs de cliente e de grupo podem vir misturados
+        text = f"{CMD_MULTICAST} {','.join(str(t) for t in targets)} {content}"
+        return encode_for(self.wire, self.client_id, SERVER_ID, text, 0, mode=self.mode)
+
+    def message(self, receiver_id, content, conversation_id=None):
+        if conversation_id is None:
+            conversation_id = receiver_id
+        return encode_for(self.wire, self.client_id, receiver_id, content, conversation_id,
+                          mode=self.mode)
@@ -0,0 +1,183 @@
+# Gravação do tráfego de fio do cliente, para reproduzir depois com
+# chatcore.replay. Liga-se passando recorder=TrafficRecorder(caminho) ao
+# ChatEngine; vários engines podem dividir o mesmo gravador (cada um vira um
+# canal). O arquivo só recebe acréscimos:
+#
+#   "CHTR" u8 versão                         uma vez, no arquivo novo
+#   tipo u8 | canal varint | dt varint | tamanho varint | dados
+#
+# dt são microssegundos de relógio monotônico desde o registro anterior, então
+# um registro típico custa 4-5 bytes além do frame. Cada abertura do gravador
+# começa com um registro SESSION (dados = hora de parede em µs); os canais
+# valem dentro da sessão. Tipos:
+#
+#   OPEN      conexão aberta (dados = "host:porta")
+#   CLOSE     conexão fechada
+#   IN        frame recebido, sem o enquadramento
+#   OUT       frame enviado, exatamente como foi para o socket
+#   IN_FILE   cabeçalho de um DATA de arquivo recebido; tamanho = cabeçalho,
+#   OUT_FILE  seguido de um varint com os bytes de dados omitidos
+#
+# Os dados de arquivo só são gravados com file_data=True; sem isso a
+# reprodução manda zeros do mesmo tamanho.
+import os
+import time
+
+from .transfer import DATA, HEADER_SIZE, is_file_frame
+
+TRACE_MAGIC = b"CHTR"
+TRACE_VERSION = 1
+
+SESSION = 0
+OPEN = 1
+CLOSE = 2
+IN = 3
+OUT = 4
+IN_FILE = 5
+OUT_FILE = 6
+
+_LENGTH_PREFIX = 4
+
+
+def _varint(n):
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return out
+
+
+def _read_varint(data, pos):
+    shift = value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class TrafficRecorder:
+    """Grava frames de entrada e saída com o tempo de cada um.
+
+    A escrita é bufferizada; flush() e close() levam o que falta ao disco.
+    Roda na thread do event loop, como o engine que o usa.
+    """
+
+    def __init__(self, path, file_data=False, buffering=256 * 1024):
+        self.path = path
+        self.file_data = file_data
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "ab", buffering=buffering)
+        if new:
+            self._file.write(TRACE_MAGIC + bytes((TRACE_VERSION,)))
+        self._channels = 0
+        self._last = time.monotonic_ns() // 1000
+        self._write(SESSION, 0, _varint(time.time_ns() // 1000))
+
+    def channel(self):
+        self._channels += 1
+        return self._channels
+
+    def opened(self, channel, host, port):
+        self._write(OPEN, channel, f"{host}:{port}".encode())
+
+    def closed(self, channel):
+        self._write(CLOSE, channel, b"")
+
+    def inbound(self, channel, frame):
+        if not self.file_data and is_file_frame(frame) and frame[1] == DATA:
+            self._write(IN_FILE, channel, frame[:HEADER_SIZE], len(frame) - HEADER_SIZE)
+        else:
+            self._write(IN, channel, frame)
+
+    def outbound(self, channel, frame):
+        self._write(OUT, channel, frame)
+
+    def outbound_file(self, channel, frames):
+        # [prefixo + cabeçalho, dados] de um DATA, como sai em _send_chunks
+        header, data = frames
+        if self.file_data:
+            self._write(OUT, channel, bytes(header) + bytes(data))
+        else:
+            self._write(OUT_FILE, channel, header, len(data))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def _write(self, kind, channel, data, omitted=None):
+        now = time.monotonic_ns() // 1000
+        head = bytearray((kind,))
+        head += _varint(channel)
+        head += _varint(now - self._last)
+        head += _varint(len(data))
+        self._last = now
+        write = self._file.write
+        write(head)
+        write(data)
+        if omitted is not None:
+            write(_varint(omitted))
+
+
+class TraceRecord:
+    __slots__ = ("kind", "channel", "time", "data", "omitted")
+
+    def __init__(self, kind, channel, time_us, data, omitted):
+        self.kind = kind
+        self.channel = channel      # (sessão, canal)
+        self.time = time_us         # µs desde o início do arquivo
+        self.data = data
+        self.omitted = omitted      # bytes de arquivo não gravados (*_FILE)
+
+    def payload(self):
+        # Frame enviado sem o prefixo de tamanho (ver MODE_AUTO)
+        data = self.data
+        if self.kind in (OUT, OUT_FILE) and data[:1] == b"\x00":
+            return data[_LENGTH_PREFIX:]
+        return data
+
+
+def read_trace(path):
+    """Percorre os registros de um arquivo gravado, em ordem.
+
+    O tempo continua de uma sessão para a outra (o intervalo entre as
+    gravações não conta). Um registro cortado no fim do arquivo, de um
+    processo que caiu no meio da escrita, é ignorado.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:len(TRACE_MAGIC)] != TRACE_MAGIC:
+        raise ValueError(f"{path} is not a traffic trace")
+    if data[len(TRACE_MAGIC)] != TRACE_VERSION:
+        raise ValueError(f"unsupported trace version {data[len(TRACE_MAGIC)]}")
+    view = memoryview(data)
+    pos = len(TRACE_MAGIC) + 1
+    session = -1
+    clock = 0
+    end = len(data)
+    while pos < end:
+        try:
+            kind = data[pos]
+            channel, pos = _read_varint(data, pos + 1)
+            dt, pos = _read_varint(data, pos)
+            size, pos = _read_varint(data, pos)
+            if pos + size > end:
+                return
+            payload = view[pos:pos + size]
+            pos += size
+            omitted = 0
+            if kind in (IN_FILE, OUT_FILE):
+                omitted, pos = _read_varint(data, pos)
+        except IndexError:
+            return
+        if kind == SESSION:
+            session += 1
+            continue
+        clock += dt
+        yield TraceRecord(kind, (session, channel), clock, payload, omitted)
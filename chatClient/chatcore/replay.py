@@ -0,0 +1,477 @@
+# Reprodução de um tráfego gravado com chatcore.recorder contra um servidor
+#
+#   cd chatClient && python -m chatcore.replay trafego.chtr --port 8888 --speed 10
+#
+# Cada canal gravado vira uma conexão sintética que reenvia os seus frames de
+# saída nos mesmos instantes, com o tempo dividido por --speed ("max" manda
+# tudo sem esperar). --copies N roda N cópias independentes do tráfego ao
+# mesmo tempo. O servidor dá IDs novos, então os frames são reescritos: IDs de
+# cliente gravados viram os IDs que as conexões da mesma cópia receberam
+# (remetente, destinatário, conversa, /connect, /session, /multicast, /group
+# e cabeçalhos de arquivo) e grupos são casados pelo nome, com um sufixo
+# "~<execução><cópia>" (o grupo gravado pode ainda existir no servidor, já
+# que sessões e grupos sobrevivem à desconexão). O formato de cada frame
+# (JSON ou binário) é o gravado, então o servidor precisa aceitar o mesmo
+# formato. Antes de fechar uma conexão a reprodução espera as respostas que
+# faltam, como o cliente gravado, que fechou depois de recebê-las, e espera
+# os outros canais da cópia mandarem (e terem respondido) o que foi gravado
+# antes do fechamento: em "max" um canal que só recebe chegaria ao fim antes
+# de os pares mandarem as mensagens para ele.
+#
+# O relatório traz vazão e a latência mensagem -> resposta do servidor
+# ("Message delivered." e afins), ao lado da latência da gravação original;
+# com --max-p99-ms o processo sai com código 1 se o p99 passar do limite.
+import argparse
+import asyncio
+import math
+import secrets
+import sys
+import time
+from collections import deque
+
+from .framing import MODE_AUTO, MODE_JSON, MODE_LENGTH, FrameDecoder, decode_payload
+from .binary import BINARY_MAGIC
+from .metrics import LatencyHistogram
+from .protocol import (
+    ASSIGNED_ID_PREFIX, CMD_ACK, CMD_CONNECT, CMD_GROUP, CMD_MULTICAST, CMD_SESSION, DELIVERED,
+    GROUP_CREATE, GROUP_ID_BASE, GROUP_JOIN, GROUP_LEAVE, NOT_AVAILABLE, NOT_IN_CONVERSATION,
+    SERVER_ID, WIRE_BINARY, WIRE_JSON, encode_for, is_group
+)
+from .recorder import CLOSE, IN, OPEN, OUT, OUT_FILE, read_trace
+from .transfer import HEADER_SIZE, decode_file_header, encode_file_frame, file_header, is_file_frame
+
+_MESSAGE_REPLIES = (DELIVERED, NOT_AVAILABLE, NOT_IN_CONVERSATION)
+_GROUP_JOINED = (CMD_GROUP + " created ", CMD_GROUP + " joined ")
+
+MAP_TIMEOUT = 5.0       # espera pelo ID de um par que ainda não conectou
+DRAIN_TIMEOUT = 10.0    # espera pelas respostas que faltam no fim
+
+
+def _decode(payload):
+    # Mensagem do frame, ou None para frames de arquivo e lixo
+    if is_file_frame(payload):
+        return None
+    try:
+        return decode_payload(bytes(payload))
+    except ValueError:
+        return None
+
+
+def _is_message(message):
+    # O que o engine põe no outbox: recebe uma resposta do servidor
+    content = message.get("Content") or ""
+    if message.get("ReceiverId") == SERVER_ID:
+        return content.startswith(CMD_MULTICAST + " ")
+    return not content.startswith(CMD_ACK)
+
+
+class TraceChannel:
+    __slots__ = ("key", "events", "assigned")
+
+    def __init__(self, key):
+        self.key = key
+        self.events = []        # OPEN, CLOSE, OUT e OUT_FILE, em ordem
+        self.assigned = []      # ID dado pelo servidor a cada OPEN
+
+
+class Trace:
+    """Um arquivo gravado, separado por canal, com as métricas originais."""
+
+    def __init__(self, path):
+        self.path = path
+        self.channels = {}
+        self.client_ids = set()
+        self.group_names = {}       # id de grupo gravado -> nome
+        self.latency = LatencyHistogram()
+        self.frames = 0
+        self.bytes = 0
+        self.messages = 0
+        self.start = None
+        self.end = 0
+        pending = {}
+        for record in read_trace(path):
+            if self.start is None:
+                self.start = record.time
+            self.end = record.time
+            channel = self.channels.get(record.channel)
+            if channel is None:
+                channel = self.channels[record.channel] = TraceChannel(record.channel)
+            if record.kind in (OPEN, CLOSE):
+                channel.events.append(record)
+                pending[record.channel] = deque()
+            elif record.kind in (OUT, OUT_FILE):
+                channel.events.append(record)
+                self.frames += 1
+                self.bytes += len(record.data) + record.omitted
+                message = _decode(record.payload())
+                if message is not None and _is_message(message):
+                    self.messages += 1
+                    pending.setdefault(record.channel, deque()).append(record.time)
+            elif record.kind == IN:
+                message = _decode(record.data)
+                if message is None or message.get("SenderId") != SERVER_ID:
+                    continue
+                content = message.get("Content") or ""
+                if ASSIGNED_ID_PREFIX in content:
+                    channel.assigned.append(message.get("ReceiverId"))
+                    self.client_ids.add(message.get("ReceiverId"))
+                elif content in _MESSAGE_REPLIES and pending.get(record.channel):
+                    self.latency.record(record.time - pending[record.channel].popleft())
+                elif content.startswith(_GROUP_JOINED):
+                    parts = content.split()
+                    if len(parts) >= 4 and parts[2].isdigit():
+                        self.group_names[int(parts[2])] = parts[3]
+        if self.start is None:
+            self.start = 0
+
+    @property
+    def duration(self):
+        return (self.end - self.start) / 1e6
+
+
+class ReplayStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.frames = 0
+        self.bytes = 0
+        self.messages = 0
+        self.replies = 0
+        self.failed = 0         # respostas que não foram "Message delivered."
+        self.unmapped = 0       # IDs de par que não apareceram a tempo
+        self.max_lag = 0.0      # maior atraso em relação ao cronograma, s
+
+
+class ReplayCopy:
+    # Correspondência de IDs gravados -> IDs desta cópia, e o andamento das
+    # conexões dela para ordenar os fechamentos
+    def __init__(self, replay, index):
+        self.replay = replay
+        self.suffix = f"~{replay.tag}{index}"
+        self.connections = []
+        self._clients = {}
+        self._groups = {}
+        self._progress_waiters = []
+
+    def advanced(self):
+        waiters, self._progress_waiters = self._progress_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def reached(self, connection, trace_time):
+        # Espera as outras conexões passarem de trace_time e terem resposta
+        # do que mandaram
+        others = [c for c in self.connections if c is not connection]
+        while any(c.position < trace_time for c in others):
+            waiter = asyncio.get_running_loop().create_future()
+            self._progress_waiters.append(waiter)
+            await waiter
+        await asyncio.gather(*(c.settle() for c in others))
+
+    def _future(self, table, key):
+        future = table.get(key)
+        if future is None:
+            future = table[key] = asyncio.get_running_loop().create_future()
+        return future
+
+    def assigned(self, recorded_id, client_id):
+        future = self._future(self._clients, recorded_id)
+        if not future.done():
+            future.set_result(client_id)
+
+    def group_joined(self, name, group_id):
+        if name.endswith(self.suffix):
+            name = name[:-len(self.suffix)]
+        future = self._future(self._groups, name)
+        if not future.done():
+            future.set_result(group_id)
+
+    async def _lookup(self, table, key, default):
+        future = self._future(table, key)
+        if not future.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(future), MAP_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.replay.stats.unmapped += 1
+                return default
+        return future.result()
+
+    async def map_id(self, value):
+        if not isinstance(value, int) or value <= SERVER_ID or value == GROUP_ID_BASE:
+            return value
+        if is_group(value):
+            name = self.replay.trace.group_names.get(value)
+            return value if name is None else await self._lookup(self._groups, name, value)
+        if value not in self.replay.trace.client_ids:
+            return value
+        return await self._lookup(self._clients, value, value)
+
+    async def map_text(self, value):
+        return str(await self.map_id(int(value))) if value.isdigit() else value
+
+    async def rewrite_content(self, content):
+        if content.startswith(CMD_CONNECT + " ") or content.startswith(CMD_SESSION + " "):
+            parts = content.split(" ")
+            if len(parts) == (2 if content.startswith(CMD_CONNECT) else 3):
+                parts[-1] = await self.map_text(parts[-1])
+            return " ".join(parts)
+        if content.startswith(CMD_MULTICAST + " "):
+            parts = content.split(" ", 2)
+            targets = [await self.map_text(t) for t in parts[1].split(",")]
+            return " ".join([parts[0], ",".join(targets)] + parts[2:])
+        if content.startswith(CMD_GROUP + " "):
+            parts = content.split()
+            action = parts[1] if len(parts) > 1 else None
+            if action == GROUP_CREATE and len(parts) >= 3:
+                parts[2] += self.suffix
+                parts[3:] = [await self.map_text(p) for p in parts[3:]]
+            elif action in (GROUP_JOIN, GROUP_LEAVE) and len(parts) == 3:
+                parts[2] = await self.map_text(parts[2]) if parts[2].isdigit() else parts[2] + self.suffix
+            return " ".join(parts)
+        return content
+
+
+class ReplayConnection(asyncio.Protocol):
+    """Uma conexão sintética: reenvia os frames de um canal gravado."""
+
+    def __init__(self, replay, copy, channel):
+        self.replay = replay
+        self.copy = copy
+        self.channel = channel
+        self.transport = None
+        self.decoder = None
+        self.client_id = None
+        self.opens = 0
+        # Instante gravado do próximo registro: tudo antes dele já foi feito
+        self.position = -math.inf
+        self.pending = deque()      # instantes de envio sem resposta ainda
+        self._assigned = None
+        self._writable = None
+        self._settled = None
+
+    async def run(self):
+        try:
+            await self._run()
+        finally:
+            self._advance(math.inf)
+
+    async def _run(self):
+        replay = self.replay
+        for record in self.channel.events:
+            self._advance(record.time)
+            await replay.until(record.time)
+            if record.kind == OPEN:
+                await self.open()
+            elif record.kind == CLOSE:
+                await self.copy.reached(self, record.time)
+                await self.settle()
+                if self.transport is not None:
+                    self.transport.close()
+            elif self.transport is not None and self.client_id is not None:
+                frame, message = await self.rewrite(record)
+                if self._writable is not None:
+                    await self._writable
+                if self.transport is None:
+                    continue
+                self.transport.write(frame)
+                replay.stats.frames += 1
+                replay.stats.bytes += len(frame)
+                if message:
+                    replay.stats.messages += 1
+                    self.pending.append(time.perf_counter())
+
+    def _advance(self, trace_time):
+        self.position = trace_time
+        self.copy.advanced()
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        self.decoder = FrameDecoder(MODE_AUTO)
+        self.client_id = None
+        self.pending.clear()
+        self._assigned = loop.create_future()
+        try:
+            await loop.create_connection(lambda: self, self.replay.host, self.replay.port)
+            await asyncio.wait_for(self._assigned, MAP_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            if self.transport is not None:
+                self.transport.close()
+
+    async def settle(self, timeout=DRAIN_TIMEOUT):
+        # Espera a resposta de cada mensagem enviada por esta conexão; pode
+        # ser chamado por outras conexões da cópia ao mesmo tempo
+        if self.pending and self.transport is not None:
+            if self._settled is None or self._settled.done():
+                self._settled = asyncio.get_running_loop().create_future()
+            try:
+                await asyncio.wait_for(asyncio.shield(self._settled), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def rewrite(self, record):
+        # (frame para o socket, se espera resposta de mensagem)
+        copy = self.copy
+        payload = record.payload()
+        if is_file_frame(payload):
+            kind, _, receiver, transfer_id, offset = decode_file_header(payload)
+            receiver = await copy.map_id(receiver)
+            if record.kind == OUT_FILE:
+                size = record.omitted
+                return file_header(kind, self.client_id, receiver, transfer_id, offset, size) + bytes(size), False
+            return encode_file_frame(kind, self.client_id, receiver, transfer_id, offset,
+                                     bytes(payload[HEADER_SIZE:])), False
+        message = decode_payload(bytes(payload))
+        receiver = await copy.map_id(message.get("ReceiverId"))
+        conversation = await copy.map_id(message.get("ConversationId") or 0)
+        content = await copy.rewrite_content(message.get("Content") or "")
+        wire = WIRE_BINARY if payload[0] == BINARY_MAGIC else WIRE_JSON
+        mode = MODE_LENGTH if record.data[:1] == b"\x00" else MODE_JSON
+        frame = encode_for(wire, self.client_id, receiver, content, conversation, mode=mode)
+        return frame, _is_message(message)
+
+    # asyncio.Protocol
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.transport = None
+        self.pending.clear()
+        self.resume_writing()
+        self._wake_settle()
+
+    def _wake_settle(self):
+        if self._settled is not None and not self._settled.done():
+            self._settled.set_result(None)
+
+    def pause_writing(self):
+        self._writable = asyncio.get_running_loop().create_future()
+
+    def resume_writing(self):
+        if self._writable is not None and not self._writable.done():
+            self._writable.set_result(None)
+        self._writable = None
+
+    def data_received(self, data):
+        self.decoder.feed(data)
+        stats = self.replay.stats
+        for frame in self.decoder.frames():
+            message = _decode(frame)
+            if message is None or message.get("SenderId") != SERVER_ID:
+                continue
+            content = message.get("Content") or ""
+            if self.client_id is None and ASSIGNED_ID_PREFIX in content:
+                self.client_id = message.get("ReceiverId")
+                if self.opens < len(self.channel.assigned):
+                    self.copy.assigned(self.channel.assigned[self.opens], self.client_id)
+                self.opens += 1
+                if not self._assigned.done():
+                    self._assigned.set_result(None)
+            elif content in _MESSAGE_REPLIES and self.pending:
+                elapsed = time.perf_counter() - self.pending.popleft()
+                stats.latency.record(elapsed * 1e6)
+                stats.replies += 1
+                if content != DELIVERED:
+                    stats.failed += 1
+                if not self.pending:
+                    self._wake_settle()
+            elif content.startswith(_GROUP_JOINED):
+                parts = content.split()
+                if len(parts) >= 4 and parts[2].isdigit():
+                    self.copy.group_joined(parts[3], int(parts[2]))
+
+
+class Replay:
+    def __init__(self, trace, host, port, speed=1.0, copies=1):
+        self.trace = trace
+        self.host = host
+        self.port = port
+        self.speed = speed          # math.inf = o mais rápido possível
+        self.copies = copies
+        self.stats = ReplayStats()
+        self.tag = secrets.token_hex(2)
+        self._start = None
+
+    async def until(self, trace_time):
+        # Espera o instante do registro no cronograma acelerado
+        if math.isinf(self.speed):
+            await asyncio.sleep(0)
+            return
+        loop = asyncio.get_running_loop()
+        delay = self._start + (trace_time - self.trace.start) / 1e6 / self.speed - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            self.stats.max_lag = max(self.stats.max_lag, -delay)
+
+    async def run(self):
+        self._start = asyncio.get_running_loop().time()
+        connections = []
+        for index in range(self.copies):
+            copy = ReplayCopy(self, index + 1)
+            copy.connections = [ReplayConnection(self, copy, channel)
+                                for channel in self.trace.channels.values()]
+            connections.extend(copy.connections)
+        started = time.perf_counter()
+        await asyncio.gather(*(c.run() for c in connections))
+        sending = max(time.perf_counter() - started, 1e-6)
+        await asyncio.gather(*(c.settle() for c in connections))
+        elapsed = time.perf_counter() - started
+        for connection in connections:
+            if connection.transport is not None:
+                connection.transport.close()
+        return sending, elapsed
+
+
+def _latency_line(hist):
+    if not hist.total:
+        return "sem mensagens"
+    ms = [hist.percentile(p) / 1000 for p in (50, 90, 99)] + [hist.max / 1000]
+    return "p50 {:.2f} ms, p90 {:.2f} ms, p99 {:.2f} ms, máx {:.2f} ms".format(*ms)
+
+
+def _speed(value):
+    if value in ("max", "inf"):
+        return math.inf
+    speed = float(value.rstrip("x"))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive")
+    return speed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduz um tráfego gravado contra um servidor")
+    parser.add_argument("trace")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--speed", type=_speed, default=1.0,
+                        help="1, 10, ... vezes o ritmo gravado, ou max")
+    parser.add_argument("--copies", type=int, default=1)
+    parser.add_argument("--max-p99-ms", type=float,
+                        help="falha (código 1) se o p99 da reprodução passar disso")
+    args = parser.parse_args()
+
+    trace = Trace(args.trace)
+    print(f"gravação: {len(trace.channels)} canais, {trace.frames} frames "
+          f"({trace.messages} mensagens, {trace.bytes / 1e6:.2f} MB) em {trace.duration:.2f} s")
+    print(f"  latência gravada: {_latency_line(trace.latency)}")
+
+    replay = Replay(trace, args.host, args.port, args.speed, args.copies)
+    sending, elapsed = asyncio.run(replay.run())
+    stats = replay.stats
+    speed = "max" if math.isinf(args.speed) else f"{args.speed:g}x"
+    print(f"reprodução ({speed}, {args.copies} cópia(s)): {stats.frames} frames em {elapsed:.2f} s "
+          f"({stats.frames / sending:,.0f} frames/s, {stats.messages / sending:,.0f} msg/s, "
+          f"{stats.bytes / sending / 1e6:.2f} MB/s no envio)")
+    print(f"  latência: {_latency_line(stats.latency)}")
+    print(f"  respostas: {stats.replies}/{stats.messages} ({stats.failed} falhas), "
+          f"IDs não mapeados: {stats.unmapped}, atraso máximo: {stats.max_lag * 1000:.1f} ms")
+    if args.max_p99_ms is not None and stats.latency.total:
+        p99 = stats.latency.percentile(99) / 1000
+        if p99 > args.max_p99_ms:
+            print(f"p99 {p99:.2f} ms acima do limite de {args.max_p99_ms:g} ms")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
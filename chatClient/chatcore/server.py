@@ -0,0 +1,632 @@
+# Servidor de referência em asyncio com o mesmo protocolo do ConsoleAppTeste
+#
+#   cd chatClient && python -m chatcore.server --port 8888
+import argparse
+import asyncio
+import logging
+import secrets
+import sys
+import time
+from bisect import bisect_right, insort
+from collections import deque
+
+from .directory import (
+    CMD_DIRECTORY, DIRECTORY_PREFIX, encode_not_modified, encode_page, parse_directory_request
+)
+from .framing import MODE_AUTO, FrameDecoder, FrameError, decode_payload
+from .presence import JOIN, LEAVE, SNAPSHOT, encode_presence
+from .protocol import (
+    ASSIGNED_ID_PREFIX, CLIENT_LIST_PREFIX, CLIENT_NOT_FOUND, CMD_ACK, CMD_CONNECT, CMD_EXIT,
+    CMD_GROUP, CMD_KEEPALIVE, CMD_LIST, CMD_MULTICAST, CMD_SESSION, CMD_SUBSCRIBE,
+    CMD_UNSUBSCRIBE, CONNECTED_PREFIX, DELIVERED, EXITED, GROUP_CREATE, GROUP_ID_BASE, GROUP_JOIN, GROUP_LEAVE, GROUP_LIST, HEARTBEAT,
+    HELLO_BINARY, NOT_AVAILABLE, NOT_IN_CONVERSATION, REACHED, SERVER_ID,
+    WIRE_BINARY, WIRE_JSON, encode_for, is_group
+)
+from .transfer import (
+    CANCEL, DECLINE, HEADER_SIZE, decode_file_header, encode_file_frame, file_header, is_file_frame
+)
+
+log = logging.getLogger("chatcore.server")
+
+IDLE_TIMEOUT = 60.0
+MAX_QUEUE_BYTES = 4 * 1024 * 1024
+# Por quanto tempo uma sessão desconectada pode ser retomada
+SESSION_TTL = 300.0
+
+
+class ClientConnection(asyncio.Protocol):
+    def __init__(self, server):
+        self.server = server
+        self.client_id = None
+        self.client_name = None
+        self.conversation_with = None
+        self.wire = WIRE_JSON
+        self.session_token = None
+        self.message_seq = 0        # mensagens de conversa processadas na sessão
+        self.last_activity = time.monotonic()
+        self.transport = None
+        self.decoder = FrameDecoder(MODE_AUTO)
+        # Respostas a mensagens de conversa ainda presas atrás de uma que
+        # espera outro worker (ver chatcore.cluster): [destino, texto, conversa]
+        self.pending_replies = deque()
+        # Fila de saída própria: frames de uma mesma iteração do loop saem
+        # juntos em um único writelines
+        self._queue = deque()
+        self._queued_bytes = 0
+        self._flush_scheduled = False
+        self._paused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.register(self)
+
+    def connection_lost(self, exc):
+        self.transport = None
+        self._queue.clear()
+        self.server.unregister(self)
+
+    def data_received(self, data):
+        self.last_activity = time.monotonic()
+        self.decoder.feed(data)
+        try:
+            for frame in self.decoder.frames():
+                if is_file_frame(frame):
+                    self.server.relay_file(self, frame)
+                else:
+                    self.server.handle(self, decode_payload(frame))
+        except (ValueError, FrameError, AttributeError) as e:
+            # Mesmo comportamento do servidor .NET: frame inválido encerra a conexão
+            log.debug("Client %s sent an invalid frame: %s", self.client_id, e)
+            self.close()
+
+    def pause_writing(self):
+        self._paused = True
+
+    def resume_writing(self):
+        self._paused = False
+        self._schedule_flush()
+
+    def send(self, frame):
+        if self.transport is None:
+            return
+        self._queue.append(frame)
+        self._queued_bytes += len(frame)
+        if self._queued_bytes > self.server.max_queue_bytes:
+            log.warning("Client %s is not reading; dropping connection.", self.client_id)
+            self.transport.abort()
+            return
+        self._schedule_flush()
+
+    def send_message(self, sender_id, receiver_id, content, conversation_id=0):
+        self.send(encode_for(self.wire, sender_id, receiver_id, content, conversation_id))
+
+    def send_server_message(self, content, conversation_id=0):
+        self.send_message(SERVER_ID, self.client_id, content, conversation_id)
+
+    # As respostas a mensagens de conversa ("Message delivered." e afins) são
+    # casadas pelo cliente na ordem de envio, então uma resposta adiada
+    # segura as seguintes até ser resolvida
+
+    def send_reply(self, receiver_id, content, conversation_id=0):
+        if self.pending_replies:
+            self.pending_replies.append([receiver_id, content, conversation_id])
+        else:
+            self.send_message(SERVER_ID, receiver_id, content, conversation_id)
+
+    def defer_reply(self):
+        slot = [None, None, 0]
+        self.pending_replies.append(slot)
+        return slot
+
+    def resolve_reply(self, slot, receiver_id, content, conversation_id=0):
+        slot[:] = (receiver_id, content, conversation_id)
+        pending = self.pending_replies
+        while pending and pending[0][1] is not None:
+            receiver_id, content, conversation_id = pending.popleft()
+            self.send_message(SERVER_ID, receiver_id, content, conversation_id)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    def _schedule_flush(self):
+        if not self._flush_scheduled and not self._paused and self._queue:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        if self.transport is None or self._paused or not self._queue:
+            return
+        self.transport.writelines(self._queue)
+        self._queue.clear()
+        self._queued_bytes = 0
+
+
+class Session:
+    __slots__ = ("token", "message_seq", "conversation_with", "expires")
+
+    def __init__(self, token, message_seq, conversation_with, expires):
+        self.token = token
+        self.message_seq = message_seq
+        self.conversation_with = conversation_with
+        self.expires = expires
+
+
+class Group:
+    __slots__ = ("id", "name", "members")
+
+    def __init__(self, group_id, name):
+        self.id = group_id
+        self.name = name
+        self.members = set()
+
+    def describe(self):
+        members = ",".join(str(m) for m in sorted(self.members))
+        return f"{self.id} {self.name} {members}"
+
+
+class ChatServer:
+    """Roteia mensagens por um dicionário id -> conexão, sem lock global.
+
+    Todo o estado é tocado só pela thread do event loop; cada conexão tem a
+    sua fila de escrita.
+    """
+
+    def __init__(self, host="0.0.0.0", port=8888, idle_timeout=IDLE_TIMEOUT,
+                 max_queue_bytes=MAX_QUEUE_BYTES, session_ttl=SESSION_TTL, reuse_port=False):
+        self.host = host
+        self.port = port
+        self.reuse_port = reuse_port
+        self.idle_timeout = idle_timeout
+        self.max_queue_bytes = max_queue_bytes
+        self.session_ttl = session_ttl
+        self.clients = {}
+        self.sessions = {}          # id desconectado -> Session
+        self.groups = {}            # id do grupo -> Group
+        self.group_names = {}       # nome -> id do grupo
+        self.memberships = {}       # id do cliente -> ids dos grupos
+        self._next_group_id = GROUP_ID_BASE + 1
+        self.presence_subscribers = set()
+        self.presence_seq = 0
+        # IDs conectados em ordem, para as páginas do /directory; a etag é o
+        # presence_seq (muda a cada entrada/saída) prefixado por um valor
+        # desta execução, para não coincidir com a de um servidor reiniciado
+        self.directory_ids = []
+        self.directory_epoch = secrets.token_hex(4)
+        self._next_client_id = 1
+        self._server = None
+        self._monitor = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._server = await loop.create_server(
+            lambda: ClientConnection(self), self.host, self.port,
+            reuse_address=True, reuse_port=self.reuse_port or None, backlog=4096)
+        self._monitor = asyncio.ensure_future(self.monitor_clients())
+        log.info("Server started on %s:%s...", self.host, self.port)
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    def close(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+        if self._server is not None:
+            self._server.close()
+        for conn in list(self.clients.values()):
+            conn.close()
+
+    # Pontos de extensão do modo com vários workers (chatcore.cluster): aqui
+    # só existem os clientes deste processo
+
+    def allocate_id(self):
+        client_id = self._next_client_id
+        self._next_client_id += 1
+        return client_id
+
+    def attach(self, conn):
+        self.clients[conn.client_id] = conn
+        insort(self.directory_ids, conn.client_id)
+
+    def detach(self, client_id):
+        del self.clients[client_id]
+        self.directory_remove(client_id)
+
+    def is_online(self, client_id):
+        return client_id in self.clients
+
+    def client_name(self, client_id):
+        conn = self.clients.get(client_id)
+        return (conn.client_name if conn is not None else None) or "Anonymous"
+
+    def set_wire(self, conn, wire):
+        conn.wire = wire
+
+    def park_session(self, client_id, session):
+        self.sessions[client_id] = session
+
+    def claim_session(self, client_id):
+        del self.sessions[client_id]
+
+    def send_to(self, client_id, content, conversation_id=0):
+        # Mensagem do servidor para qualquer cliente; False se não está conectado
+        recipient = self.clients.get(client_id)
+        if recipient is None:
+            return False
+        recipient.send_server_message(content, conversation_id)
+        return True
+
+    def register(self, conn):
+        conn.client_id = self.allocate_id()
+        self.attach(conn)
+        log.info("Client %s connected.", conn.client_id)
+        conn.send_server_message(f"{ASSIGNED_ID_PREFIX} {conn.client_id}.", -1)
+        self.publish_presence(JOIN, conn.client_id)
+
+    def unregister(self, conn):
+        if self.clients.get(conn.client_id) is conn:
+            self.detach(conn.client_id)
+            self.presence_subscribers.discard(conn)
+            if conn.session_token is not None:
+                # Os grupos continuam valendo se a sessão for retomada
+                self.park_session(conn.client_id, Session(
+                    conn.session_token, conn.message_seq, conn.conversation_with,
+                    time.monotonic() + self.session_ttl))
+            else:
+                self.leave_groups(conn.client_id)
+            log.info("Client %s disconnected.", conn.client_id)
+            self.publish_presence(LEAVE, conn.client_id)
+
+    def publish_presence(self, kind, client_id):
+        self.presence_seq += 1
+        if not self.presence_subscribers:
+            return
+        # Um frame por formato para todos os inscritos (ReceiverId 0 = difusão)
+        content = encode_presence(kind, self.presence_seq, [client_id])
+        frames = {}
+        for subscriber in self.presence_subscribers:
+            frame = frames.get(subscriber.wire)
+            if frame is None:
+                frame = frames[subscriber.wire] = encode_for(subscriber.wire, SERVER_ID, SERVER_ID, content)
+            subscriber.send(frame)
+
+    async def monitor_clients(self):
+        while True:
+            await asyncio.sleep(1)
+            now = time.monotonic()
+            for client_id in [i for i, s in self.sessions.items() if s.expires < now]:
+                del self.sessions[client_id]
+                self.leave_groups(client_id)
+            limit = now - self.idle_timeout
+            for conn in [c for c in self.clients.values() if c.last_activity < limit]:
+                log.info("Client %s is offline (inactive for over %d seconds). Disconnecting...",
+                         conn.client_id, self.idle_timeout)
+                self.unregister(conn)
+                conn.close()
+
+    # Tratamento de mensagens (mesma semântica de ClientHandlerService)
+
+    def handle(self, conn, message):
+        content = message.get("Content") or ""
+        if content == HEARTBEAT:
+            return
+        if content == CMD_LIST:
+            self.send_client_list(conn)
+        elif content == CMD_DIRECTORY or content.startswith(DIRECTORY_PREFIX):
+            self.send_directory(conn, content)
+        elif content == CMD_SUBSCRIBE:
+            self.presence_subscribers.add(conn)
+            conn.send_server_message(encode_presence(SNAPSHOT, self.presence_seq, self.directory_ids))
+        elif content == CMD_UNSUBSCRIBE:
+            self.presence_subscribers.discard(conn)
+        elif content == HELLO_BINARY:
+            # A confirmação ainda sai em JSON; o resto da conexão é binário
+            conn.send_server_message(HELLO_BINARY)
+            self.set_wire(conn, WIRE_BINARY)
+        elif content == CMD_KEEPALIVE:
+            # Anuncia o limite de inatividade para o cliente ajustar o heartbeat
+            conn.send_server_message(f"{CMD_KEEPALIVE} {self.idle_timeout:g}")
+        elif content.startswith(CMD_SESSION):
+            self.handle_session(conn, content)
+        elif content.startswith(CMD_GROUP + " "):
+            self.handle_group(conn, content)
+        elif content.startswith(CMD_MULTICAST + " "):
+            # Conta como mensagem de conversa: uma resposta, na mesma ordem
+            conn.message_seq += 1
+            self.send_multicast(conn, content)
+        elif content.startswith(CMD_CONNECT):
+            self.handle_connect(conn, content)
+        elif content == CMD_EXIT:
+            conn.conversation_with = None
+            conn.send_server_message(EXITED)
+        elif content.startswith(CMD_ACK):
+            self.handle_acknowledgment(conn, message)
+        elif conn.conversation_with is not None:
+            conn.message_seq += 1
+            self.send_private_message(conn, content)
+        else:
+            conn.message_seq += 1
+            conn.send_reply(conn.client_id, NOT_IN_CONVERSATION)
+
+    def send_client_list(self, conn):
+        lines = [CLIENT_LIST_PREFIX]
+        for client_id in self.directory_ids:
+            if client_id != conn.client_id:
+                lines.append(f"ID: {client_id}, Name: {self.client_name(client_id)}")
+        conn.send_server_message("\n".join(lines) + "\n")
+
+    # Diretório paginado (ver chatcore.directory): a página sai de uma fatia
+    # da lista ordenada, sem percorrer os outros clientes
+
+    @property
+    def directory_etag(self):
+        return f"{self.directory_epoch}.{self.presence_seq}"
+
+    def directory_remove(self, client_id):
+        index = bisect_right(self.directory_ids, client_id) - 1
+        if index >= 0 and self.directory_ids[index] == client_id:
+            del self.directory_ids[index]
+
+    def send_directory(self, conn, content):
+        try:
+            etag, cursor, limit = parse_directory_request(content)
+        except ValueError:
+            conn.send_server_message(f"{DIRECTORY_PREFIX}error Usage: {CMD_DIRECTORY} <etag|-> [cursor] [limit]")
+            return
+        current = self.directory_etag
+        if cursor == 0 and etag == current:
+            conn.send_server_message(encode_not_modified(current))
+            return
+        ids = self.directory_ids
+        start = bisect_right(ids, cursor)
+        page = ids[start:start + limit]
+        next_cursor = page[-1] if start + limit < len(ids) else None
+        entries = [(client_id, self.client_name(client_id)) for client_id in page]
+        conn.send_server_message(encode_page(current, len(ids), next_cursor, entries))
+
+    def handle_connect(self, conn, content):
+        parts = content.split(" ", 1)
+        try:
+            recipient_id = int(parts[1])
+        except (IndexError, ValueError):
+            conn.send_server_message("Usage: /connect <client_id>")
+            return
+        if self.is_online(recipient_id):
+            conn.conversation_with = recipient_id
+            conn.send_server_message(f"{CONNECTED_PREFIX} {recipient_id}. Type your messages.")
+        else:
+            conn.send_server_message(CLIENT_NOT_FOUND)
+
+    def handle_session(self, conn, content):
+        # "/session <token>" registra; "/session <token> <id>" retoma o id antigo.
+        # A resposta "/session <id> <seq> resumed|new" diz quantas mensagens da
+        # sessão o servidor já processou, para o cliente reenviar só o resto.
+        parts = content.split()
+        if len(parts) not in (2, 3):
+            conn.send_server_message(f"Usage: {CMD_SESSION} <token> [client_id]")
+            return
+        token = parts[1]
+        resumed = False
+        if len(parts) == 3:
+            try:
+                old_id = int(parts[2])
+            except ValueError:
+                old_id = None
+            if old_id is not None and old_id != conn.client_id:
+                resumed = self.resume_session(conn, old_id, token)
+        conn.session_token = token
+        state = "resumed" if resumed else "new"
+        conn.send_server_message(f"{CMD_SESSION} {conn.client_id} {conn.message_seq} {state}")
+
+    def resume_session(self, conn, old_id, token):
+        stale = self.clients.get(old_id)
+        if stale is not None and stale.session_token == token:
+            # Conexão antiga meio aberta que o servidor ainda não percebeu
+            self.unregister(stale)
+            stale.close()
+        session = self.sessions.get(old_id)
+        if session is None or session.token != token or self.is_online(old_id):
+            return False
+        self.claim_session(old_id)
+        self.detach(conn.client_id)
+        self.publish_presence(LEAVE, conn.client_id)
+        log.info("Client %s resumed session %s.", conn.client_id, old_id)
+        conn.client_id = old_id
+        conn.message_seq = session.message_seq
+        if self.is_online(session.conversation_with):
+            conn.conversation_with = session.conversation_with
+        self.attach(conn)
+        self.publish_presence(JOIN, old_id)
+        return True
+
+    # Grupos: "/group create <nome> [id ...]", "/group join <nome|id>",
+    # "/group leave <id>" e "/group list". As respostas repetem a ação no
+    # passado: "/group created|joined <gid> <nome> <membros>", "/group left
+    # <gid> <nome>", "/group list <gid>:<nome> ..." ou "/group error <motivo>".
+
+    def handle_group(self, conn, content):
+        parts = content.split()
+        action = parts[1] if len(parts) > 1 else None
+        if action == GROUP_CREATE and len(parts) >= 3:
+            self.create_group(conn, parts[2], parts[3:])
+        elif action == GROUP_JOIN and len(parts) == 3:
+            group = self.find_group(parts[2])
+            if group is None:
+                conn.send_server_message(f"{CMD_GROUP} error Group not found.")
+                return
+            self.add_member(group, conn.client_id)
+            conn.send_server_message(f"{CMD_GROUP} joined {group.describe()}")
+        elif action == GROUP_LEAVE and len(parts) == 3:
+            group = self.find_group(parts[2])
+            if group is None or conn.client_id not in group.members:
+                conn.send_server_message(f"{CMD_GROUP} error You are not in this group.")
+                return
+            self.remove_member(group, conn.client_id)
+            conn.send_server_message(f"{CMD_GROUP} left {group.id} {group.name}")
+        elif action == GROUP_LIST:
+            groups = (self.groups[g] for g in sorted(self.memberships.get(conn.client_id, ())))
+            conn.send_server_message(" ".join([CMD_GROUP, GROUP_LIST] + [f"{g.id}:{g.name}" for g in groups]))
+        else:
+            conn.send_server_message(
+                f"{CMD_GROUP} error Usage: {CMD_GROUP} create <name> [client_id ...] | join <name> | leave <name> | list")
+
+    def create_group(self, conn, name, member_ids):
+        if name in self.group_names or name.isdigit():
+            conn.send_server_message(f"{CMD_GROUP} error Group name unavailable.")
+            return
+        group = Group(self._next_group_id, name)
+        self._next_group_id += 1
+        self.groups[group.id] = group
+        self.group_names[name] = group.id
+        self.add_member(group, conn.client_id)
+        added = []
+        for value in member_ids:
+            try:
+                member_id = int(value)
+            except ValueError:
+                continue
+            if self.is_online(member_id) and member_id not in group.members:
+                self.add_member(group, member_id)
+                added.append(member_id)
+        description = group.describe()
+        conn.send_server_message(f"{CMD_GROUP} created {description}")
+        for member_id in added:
+            self.send_to(member_id, f"{CMD_GROUP} joined {description}")
+
+    def find_group(self, key):
+        group_id = int(key) if key.isdigit() else self.group_names.get(key)
+        return self.groups.get(group_id)
+
+    def add_member(self, group, client_id):
+        group.members.add(client_id)
+        self.memberships.setdefault(client_id, set()).add(group.id)
+
+    def remove_member(self, group, client_id):
+        group.members.discard(client_id)
+        groups = self.memberships.get(client_id)
+        if groups is not None:
+            groups.discard(group.id)
+            if not groups:
+                del self.memberships[client_id]
+        if not group.members:
+            del self.groups[group.id]
+            del self.group_names[group.name]
+
+    def leave_groups(self, client_id):
+        for group_id in list(self.memberships.get(client_id, ())):
+            self.remove_member(self.groups[group_id], client_id)
+
+    def send_multicast(self, conn, content):
+        # "/multicast <destinos> <texto>": destinos são IDs de cliente e/ou de
+        # grupo separados por vírgula. O frame é codificado uma vez por formato
+        # de fio e o mesmo bytes vai para todos (ReceiverId = a conversa).
+        parts = content.split(" ", 2)
+        text = parts[2] if len(parts) == 3 else ""
+        recipients = set()
+        groups = []
+        for value in parts[1].split(","):
+            try:
+                target = int(value)
+            except ValueError:
+                continue
+            if is_group(target):
+                group = self.groups.get(target)
+                if group is not None and conn.client_id in group.members:
+                    recipients.update(group.members)
+                    groups.append(target)
+            else:
+                recipients.add(target)
+        recipients.discard(conn.client_id)
+        conversation = groups[0] if len(groups) == 1 else GROUP_ID_BASE
+        delivered = self.fan_out(conn.client_id, conversation, text, recipients)
+        conn.send_reply(conversation, DELIVERED if delivered else NOT_AVAILABLE, conversation)
+
+    def fan_out(self, sender_id, conversation, text, recipients):
+        # Quantos dos destinatários estavam conectados
+        frames = {}
+        delivered = 0
+        for client_id in recipients:
+            recipient = self.clients.get(client_id)
+            if recipient is None:
+                continue
+            frame = frames.get(recipient.wire)
+            if frame is None:
+                frame = frames[recipient.wire] = encode_for(
+                    recipient.wire, sender_id, conversation, text, conversation)
+            recipient.send(frame)
+            delivered += 1
+        return delivered
+
+    def accept_file_frame(self, conn, sender_id):
+        # Só quem negociou o formato binário manda arquivos, e em nome próprio;
+        # como um frame inválido, o resto encerra a conexão
+        if conn.wire == WIRE_BINARY and sender_id == conn.client_id:
+            return True
+        log.debug("Client %s sent a file frame as %s on the %s wire; closing.",
+                  conn.client_id, sender_id, conn.wire)
+        conn.close()
+        return False
+
+    def relay_file(self, conn, frame):
+        # Frames de arquivo vão direto ao destinatário: só o remetente do
+        # cabeçalho é reescrito e os dados seguem sem cópia nem decodificação
+        kind, sender_id, receiver_id, transfer_id, offset = decode_file_header(frame)
+        if not self.accept_file_frame(conn, sender_id):
+            return
+        recipient = self.clients.get(receiver_id)
+        if recipient is None or recipient.wire != WIRE_BINARY:
+            if kind not in (CANCEL, DECLINE):
+                conn.send(encode_file_frame(DECLINE, receiver_id, conn.client_id, transfer_id, 0,
+                                            b"peer not available"))
+            return
+        payload = memoryview(frame)[HEADER_SIZE:]
+        recipient.send(file_header(kind, conn.client_id, receiver_id, transfer_id, offset, len(payload)))
+        recipient.send(payload)
+
+    def handle_acknowledgment(self, conn, message):
+        # ConversationId = quem confirmou, para o remetente casar por conversa;
+        # na falha, o par que saiu, para não ser tomada pela resposta de uma
+        # mensagem (que leva 0 ou o grupo)
+        target = message.get("ReceiverId")
+        if not self.send_to(target, REACHED, conn.client_id):
+            conn.send_server_message(NOT_AVAILABLE, target)
+            conn.conversation_with = None
+
+    def send_private_message(self, conn, content):
+        peer_id = conn.conversation_with
+        recipient = self.clients.get(peer_id)
+        if recipient is None:
+            conn.send_reply(conn.client_id, NOT_AVAILABLE)
+            conn.conversation_with = None
+            return
+        recipient.send_message(conn.client_id, peer_id, content, peer_id)
+        conn.send_reply(peer_id, DELIVERED, peer_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de chat TCP (asyncio)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT)
+    parser.add_argument("--log-level", default="INFO")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processos aceitando na mesma porta (ver chatcore.cluster)")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        from .cluster import serve_cluster
+        logging.basicConfig(level=args.log_level.upper(), format="%(processName)s: %(message)s")
+        sys.exit(serve_cluster(args.host, args.port, args.workers, idle_timeout=args.idle_timeout))
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+    server = ChatServer(args.host, args.port, args.idle_timeout)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
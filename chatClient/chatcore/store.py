@@ -0,0 +1,252 @@
+# Armazenamento local das conversas em SQLite (modo WAL)
+#
+# Gravações vão para uma fila e são feitas em lotes por uma thread própria,
+# então quem recebe mensagens nunca espera o disco. Leituras usam outra
+# conexão (o WAL permite ler enquanto a thread grava).
+#
+# A busca usa um índice invertido FTS5 com conteúdo externo (o texto fica só
+# em `messages`). Um trigger atualiza o índice na mesma transação de cada
+# lote, então ele nunca precisa ser reconstruído.
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+from .history import HistoryEntry
+
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.05   # espera no máximo 50 ms para juntar um lote
+PAGE = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    peer INTEGER NOT NULL,          -- conversa: ID do par (0 = geral/servidor)
+    sender INTEGER,                 -- NULL = aviso local do sistema
+    conversation_id INTEGER,
+    received_at REAL NOT NULL,      -- relógio local, define a ordem
+    timestamp TEXT,                 -- Timestamp do frame, como veio
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_peer_time ON messages (peer, received_at);
+CREATE INDEX IF NOT EXISTS messages_conversation ON messages (conversation_id);
+"""
+
+# prefix='2 3': "ol*" e "tud*" saem de índices próprios em vez de varrer termos.
+# O par também é indexado (um termo por mensagem): filtrar por conversa vira
+# interseção de listas no índice em vez de conferir cada resultado.
+_SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE messages_fts USING fts5 (
+    content, peer, content='messages', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content, peer) VALUES (new.id, new.content, new.peer);
+END;
+CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content, peer)
+    VALUES ('delete', old.id, old.content, old.peer);
+END;
+"""
+
+# rowid DESC é a ordem nativa do FTS5: com LIMIT, para nas primeiras que casam
+_SEARCH = ("SELECT m.id, m.peer, m.sender, m.received_at, m.timestamp, m.content, "
+           "snippet(messages_fts, 0, '[', ']', '…', 12) "
+           "FROM messages_fts JOIN messages AS m ON m.id = messages_fts.rowid "
+           "WHERE messages_fts MATCH ?")
+
+_INSERT = ("INSERT INTO messages (peer, sender, conversation_id, received_at, timestamp, content) "
+           "VALUES (?, ?, ?, ?, ?, ?)")
+
+_STOP = object()
+
+_TERM = re.compile(r'"([^"]*)"?|(\S+)')
+
+
+def match_query(text):
+    """Converte o que foi digitado numa expressão MATCH do FTS5.
+
+    `"frase exata"` vira frase, `palav*` vira prefixo e o resto são termos
+    que precisam aparecer todos. Cada termo vai entre aspas, então
+    pontuação e palavras como AND/NEAR nunca viram sintaxe do FTS5.
+    Devolve None se não sobrar nenhum termo.
+    """
+    parts = []
+    for phrase, word in _TERM.findall(text):
+        if word:
+            prefix = word.endswith("*")
+            word = word.rstrip("*")
+            if word:
+                parts.append('"%s"%s' % (word.replace('"', '""'), "*" if prefix else ""))
+        elif phrase.strip():
+            parts.append('"%s"' % phrase)
+    if not parts:
+        return None
+    return "{content} : (%s)" % " ".join(parts)
+
+
+class SearchHit:
+    __slots__ = ("id", "peer", "sender", "received_at", "timestamp", "content", "snippet")
+
+    def __init__(self, id, peer, sender, received_at, timestamp, content, snippet):
+        self.id = id
+        self.peer = peer
+        self.sender = sender
+        self.received_at = received_at
+        self.timestamp = timestamp
+        self.content = content
+        self.snippet = snippet
+
+
+def _connect(path):
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    # Com WAL, NORMAL só perde as últimas transações numa queda de energia
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+class MessageStore:
+    def __init__(self, path, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.batches = 0
+        # Linhas desta execução já estão no histórico em memória
+        self.opened_at = time.time()
+        self._db = _connect(path)
+        self._db.executescript(_SCHEMA)
+        self._create_search_index()
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="chat-store", daemon=True)
+        self._thread.start()
+
+    # Escrita (qualquer thread; nunca bloqueia)
+
+    def add(self, peer, sender, content, conversation_id=None, timestamp=None, received_at=None):
+        self._queue.put((peer, sender, conversation_id, received_at or time.time(), timestamp, content))
+
+    def flush(self, timeout=None):
+        # Espera tudo o que já foi enfileirado chegar ao disco
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._db.close()
+
+    def _create_search_index(self):
+        exists = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'").fetchone()
+        if exists:
+            return
+        # Banco de uma versão sem busca: indexa o que já existe uma única vez
+        self._db.executescript("BEGIN;" + _SEARCH_SCHEMA +
+                               "INSERT INTO messages_fts (messages_fts) VALUES ('rebuild'); COMMIT;")
+
+    def _run(self):
+        db = _connect(self.path)
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            batch = []
+            waiters = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stop or waiters or len(batch) >= self.batch_size:
+                    break
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if batch:
+                with db:
+                    db.executemany(_INSERT, batch)
+                self.written += len(batch)
+                self.batches += 1
+            for waiter in waiters:
+                waiter.set()
+        db.close()
+
+    # Leitura (na thread que criou o store)
+
+    def latest(self, peer, limit=PAGE, before=None):
+        # Última página da conversa antes de `before` (padrão: execuções
+        # anteriores), da mais antiga para a mais nova
+        if before is None:
+            before = self.opened_at
+        rows = self._db.execute(
+            "SELECT sender, content, timestamp FROM messages WHERE peer = ? AND received_at < ? "
+            "ORDER BY received_at DESC, id DESC LIMIT ?", (peer, before, limit)).fetchall()
+        return [HistoryEntry(*row) for row in reversed(rows)]
+
+    def by_conversation(self, conversation_id, limit=PAGE):
+        rows = self._db.execute(
+            "SELECT sender, content, timestamp FROM messages WHERE conversation_id = ? "
+            "ORDER BY id DESC LIMIT ?", (conversation_id, limit)).fetchall()
+        return [HistoryEntry(*row) for row in reversed(rows)]
+
+    def search(self, text, peer=None, since=None, until=None, limit=PAGE):
+        # Mais recentes primeiro; `since`/`until` são epoch (received_at)
+        query = match_query(text)
+        if query is None:
+            return []
+        if peer is not None:
+            query += ' AND peer : "%d"' % peer
+        sql = [_SEARCH]
+        params = [query]
+        # O período também limita o rowid, para o FTS5 pular direto para ele
+        if since is not None:
+            sql.append("AND m.received_at >= ? AND messages_fts.rowid >= ?")
+            params += [since, self._first_id_at(since)]
+        if until is not None:
+            sql.append("AND m.received_at < ? AND messages_fts.rowid < ?")
+            params += [until, self._first_id_at(until)]
+        sql.append("ORDER BY messages_fts.rowid DESC LIMIT ?")
+        params.append(limit)
+        try:
+            rows = self._db.execute(" ".join(sql), params).fetchall()
+        except sqlite3.OperationalError:
+            # Ex.: aspas sem fechar no meio da digitação
+            return []
+        return [SearchHit(*row) for row in rows]
+
+    def _first_id_at(self, when):
+        # Busca binária pelo primeiro id com received_at >= when. Vale porque
+        # received_at é o relógio local na ordem de gravação (cresce com o id)
+        db = self._db
+        # MIN e MAX em consultas separadas: juntas, o SQLite varre a tabela
+        low = db.execute("SELECT IFNULL(MIN(id), 0) FROM messages").fetchone()[0]
+        high = db.execute("SELECT IFNULL(MAX(id), 0) + 1 FROM messages").fetchone()[0]
+        while low < high:
+            middle = (low + high) // 2
+            row = db.execute("SELECT id, received_at FROM messages WHERE id >= ? ORDER BY id LIMIT 1",
+                             (middle,)).fetchone()
+            if row[1] >= when:
+                high = middle
+            else:
+                low = row[0] + 1
+        return low
+
+    def count(self, peer=None):
+        if peer is None:
+            return self._db.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        return self._db.execute("SELECT COUNT(*) FROM messages WHERE peer = ?", (peer,)).fetchone()[0]
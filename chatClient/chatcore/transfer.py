@@ -0,0 +1,265 @@
+# Transferência de arquivos por frames próprios, ao lado das mensagens.
+#
+# Só existe no formato binário: o frame vai com o prefixo de 4 bytes do
+# MODE_LENGTH e começa com um magic diferente do das mensagens, então o
+# servidor apenas repassa ao destinatário (trocando o remetente) sem
+# decodificar nem responder "Message delivered.".
+#
+#   magic    u8   0xC2
+#   kind     u8   OFFER / ACCEPT / DATA / ACK / CANCEL / DECLINE
+#   sender   i32
+#   receiver i32
+#   transfer u32  número escolhido por quem envia o arquivo
+#   offset   u64  posição no arquivo (DATA), retomada (ACCEPT), bytes gravados (ACK)
+#   payload  ...  dados crus (DATA), JSON (OFFER) ou motivo em UTF-8 (CANCEL/DECLINE)
+#
+# Controle de fluxo por janela: quem envia só passa `WINDOW` bytes à frente
+# do último ACK, e o ACK só sai depois de o receptor gravar no disco. Isso
+# limita quanto arquivo pode estar na frente de uma mensagem de chat em
+# qualquer ponto do caminho. A transferência termina quando o ACK cobre o
+# arquivo inteiro. A retomada usa o arquivo .part do receptor, identificado
+# por um token derivado de caminho, tamanho e mtime.
+import hashlib
+import json
+import os
+import struct
+import time
+from collections import deque
+
+from .framing import MODE_LENGTH, encode_frame
+
+FILE_MAGIC = 0xC2
+
+OFFER = 1
+ACCEPT = 2
+DATA = 3
+ACK = 4
+CANCEL = 5      # quem envia desistiu
+DECLINE = 6     # quem recebe (ou o servidor, sem o par) recusou ou interrompeu
+
+CHUNK_SIZE = 64 * 1024
+WINDOW = 1024 * 1024        # bytes em voo por transferência
+ACK_EVERY = 256 * 1024      # o receptor confirma a cada 256 KB gravados
+
+# Estados de uma transferência
+FILE_OFFERED = "offered"
+FILE_SENDING = "sending"
+FILE_RECEIVING = "receiving"
+FILE_PAUSED = "paused"      # conexão caiu; retoma com uma nova oferta
+FILE_COMPLETE = "complete"
+FILE_FAILED = "failed"
+
+_HEADER = struct.Struct(">BBiiIQ")
+HEADER_SIZE = _HEADER.size
+_PREFIX = struct.Struct(">I")
+
+
+def file_header(kind, sender_id, receiver_id, transfer_id, offset=0, payload_size=0):
+    # Prefixo de tamanho + cabeçalho; o payload vai em seguida, sem cópia
+    return (_PREFIX.pack(HEADER_SIZE + payload_size) +
+            _HEADER.pack(FILE_MAGIC, kind, sender_id, receiver_id, transfer_id, offset))
+
+
+def encode_file_frame(kind, sender_id, receiver_id, transfer_id, offset=0, payload=b""):
+    return encode_frame(_HEADER.pack(FILE_MAGIC, kind, sender_id, receiver_id, transfer_id, offset)
+                        + payload, MODE_LENGTH)
+
+
+def decode_file_header(frame):
+    # (kind, sender, receiver, transfer, offset); o payload começa em HEADER_SIZE
+    if len(frame) < HEADER_SIZE:
+        raise ValueError("truncated file frame")
+    magic, kind, sender, receiver, transfer_id, offset = _HEADER.unpack_from(frame)
+    if magic != FILE_MAGIC:
+        raise ValueError(f"not a file frame: {magic:#x}")
+    return kind, sender, receiver, transfer_id, offset
+
+
+def is_file_frame(frame):
+    return bool(frame) and frame[0] == FILE_MAGIC
+
+
+def file_token(path):
+    # Mesmo arquivo, mesmo token: reenviar depois de uma falha retoma do .part
+    st = os.stat(path)
+    key = f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+class RateMeter:
+    # Bytes por segundo no último ~1 s (duas janelas que se alternam)
+    def __init__(self, window=1.0):
+        self.window = window
+        self.start = time.monotonic()
+        self.current = 0
+        self.previous = 0
+        self.previous_span = 0.0
+
+    def add(self, count):
+        self._rotate()
+        self.current += count
+
+    def rate(self):
+        self._rotate()
+        elapsed = time.monotonic() - self.start + self.previous_span
+        return (self.current + self.previous) / elapsed if elapsed > 0 else 0.0
+
+    def _rotate(self):
+        now = time.monotonic()
+        if now - self.start < self.window:
+            return
+        self.previous, self.previous_span = self.current, now - self.start
+        if now - self.start >= 2 * self.window:
+            self.previous, self.previous_span = 0, 0.0
+        self.current = 0
+        self.start = now
+
+
+class Transfer:
+    __slots__ = ("transfer_id", "peer", "name", "size", "token", "outgoing", "path", "state",
+                 "offset", "acked", "error", "meter", "_file")
+
+    def __init__(self, transfer_id, peer, name, size, token, outgoing, path):
+        self.transfer_id = transfer_id
+        self.peer = peer
+        self.name = name
+        self.size = size
+        self.token = token
+        self.outgoing = outgoing
+        self.path = path            # origem (envio) ou arquivo .part (recepção)
+        self.state = FILE_OFFERED
+        self.offset = 0             # próximo byte a enviar / já gravado
+        self.acked = 0              # confirmado pelo receptor / já confirmado ao remetente
+        self.error = None
+        self.meter = RateMeter()
+        self._file = None
+
+    @property
+    def progress(self):
+        done = self.acked if self.outgoing else self.offset
+        return done / self.size if self.size else 1.0
+
+    def summary(self):
+        arrow = "↑" if self.outgoing else "↓"
+        return f"{arrow} {self.name} {self.progress:.0%} {self.meter.rate() / 1e6:.1f} MB/s"
+
+    def open(self, offset):
+        if self._file is None:
+            self._file = open(self.path, "rb" if self.outgoing else "ab")
+        if self.outgoing:
+            self._file.seek(offset)
+            self.offset = self.acked = offset
+        else:
+            self.offset = offset
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # Envio
+
+    def window_open(self):
+        return self.offset - self.acked < WINDOW
+
+    def next_chunk(self):
+        # Lê direto num buffer novo (o transport pode guardar referência a ele
+        # até enviar) e devolve (offset, memoryview); None com a janela fechada
+        if self.offset >= self.size or not self.window_open():
+            return None
+        size = min(CHUNK_SIZE, self.size - self.offset, WINDOW - (self.offset - self.acked))
+        buffer = bytearray(size)
+        count = self._file.readinto(buffer)
+        if not count:
+            raise OSError(f"{self.path} shrank during transfer")
+        offset = self.offset
+        self.offset += count
+        self.meter.add(count)
+        return offset, memoryview(buffer)[:count]
+
+    # Recepção
+
+    def write(self, data):
+        self._file.write(data)
+        self.offset += len(data)
+        self.meter.add(len(data))
+
+    def checkpoint(self):
+        # Antes de cada ACK: o que foi confirmado está no .part para a retomada
+        self._file.flush()
+        self.acked = self.offset
+
+    def finish(self, directory):
+        # Fecha o .part e dá a ele o nome original (sem sobrescrever nada)
+        self.close()
+        base, ext = os.path.splitext(self.name)
+        target = os.path.join(directory, self.name)
+        counter = 1
+        while os.path.exists(target):
+            target = os.path.join(directory, f"{base} ({counter}){ext}")
+            counter += 1
+        os.replace(self.path, target)
+        self.path = target
+        self.state = FILE_COMPLETE
+
+
+class UploadScheduler:
+    """Revezamento entre as transferências que têm dados e janela livre.
+
+    Cada chamada de next_frames entrega um pedaço de uma transferência e a
+    põe no fim da fila, então vários envios dividem a conexão por igual.
+    """
+
+    def __init__(self):
+        self.ready = deque()
+
+    def __bool__(self):
+        return bool(self.ready)
+
+    def add(self, transfer):
+        if transfer not in self.ready:
+            self.ready.append(transfer)
+
+    def discard(self, transfer):
+        try:
+            self.ready.remove(transfer)
+        except ValueError:
+            pass
+
+    def clear(self):
+        self.ready.clear()
+
+    def next_frames(self, sender_id):
+        # (transfer, buffers para writelines), (transfer, None) se a leitura do
+        # arquivo falhou (o erro fica em transfer.error) ou None se ninguém
+        # pode enviar agora
+        while self.ready:
+            transfer = self.ready.popleft()
+            if transfer.state != FILE_SENDING:
+                continue
+            try:
+                chunk = transfer.next_chunk()
+            except OSError as e:
+                transfer.error = str(e)
+                return transfer, None
+            if chunk is None:
+                continue    # janela fechada ou tudo enviado: volta com o próximo ACK
+            offset, data = chunk
+            if transfer.offset < transfer.size and transfer.window_open():
+                self.ready.append(transfer)
+            return transfer, [file_header(DATA, sender_id, transfer.peer, transfer.transfer_id,
+                                          offset, len(data)), data]
+        return None
+
+
+def offer_payload(transfer):
+    return json.dumps({"name": transfer.name, "size": transfer.size,
+                       "token": transfer.token}).encode()
+
+
+def parse_offer(payload):
+    data = json.loads(bytes(payload))
+    # Só o nome do arquivo: o par não escolhe diretório no receptor
+    name = os.path.basename(str(data["name"]).replace("\\", "/")) or "arquivo"
+    token = "".join(c for c in str(data["token"]) if c.isalnum())[:32]
+    return name, int(data["size"]), token
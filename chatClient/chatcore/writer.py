@@ -0,0 +1,189 @@
+# Pipeline de saída por conexão: fila limitada e um único escritor que junta
+# os frames enfileirados em uma chamada (sendmsg = writev)
+import threading
+import time
+from collections import deque
+
+# Políticas quando a fila normal está cheia
+BLOCK = "block"                 # quem envia espera haver espaço
+DROP_OLDEST = "drop-oldest"     # descarta as mensagens mais antigas da fila
+REJECT = "reject"               # o envio falha e retorna False
+
+DEFAULT_MAX_BYTES = 1024 * 1024
+# Limite de buffers por sendmsg (IOV_MAX é 1024 no Linux)
+MAX_BATCH = 512
+
+
+class OutboundQueue:
+    """Fila de frames com limite em bytes e duas prioridades.
+
+    Heartbeats e acks vão para a fila urgente e saem antes de qualquer
+    mensagem comum já enfileirada; o limite vale só para a fila normal.
+    Sem threads nem locks: quem usa de várias threads protege por fora.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, policy=REJECT):
+        if policy not in (BLOCK, DROP_OLDEST, REJECT):
+            raise ValueError(f"unknown backpressure policy: {policy!r}")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.urgent = deque()
+        self.normal = deque()
+        self.queued_bytes = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self.urgent) + len(self.normal)
+
+    def has_room(self, size):
+        # Um frame maior que o limite ainda passa se a fila estiver vazia
+        return not self.normal or self.queued_bytes + size <= self.max_bytes
+
+    def push(self, frame, priority=False):
+        if priority:
+            self.urgent.append(frame)
+            return True
+        size = len(frame)
+        if not self.has_room(size):
+            if self.policy != DROP_OLDEST:
+                # BLOCK: a espera fica com quem chama (SocketWriter / ChatEngine.drain)
+                self.rejected += 1
+                return False
+            while not self.has_room(size):
+                self.queued_bytes -= len(self.normal.popleft())
+                self.dropped += 1
+        self.normal.append(frame)
+        self.queued_bytes += size
+        return True
+
+    def pop_batch(self, max_frames=MAX_BATCH):
+        batch = []
+        while self.urgent and len(batch) < max_frames:
+            batch.append(self.urgent.popleft())
+        while self.normal and len(batch) < max_frames:
+            frame = self.normal.popleft()
+            self.queued_bytes -= len(frame)
+            batch.append(frame)
+        return batch
+
+    def clear(self):
+        self.urgent.clear()
+        self.normal.clear()
+        self.queued_bytes = 0
+
+
+def send_batch(sock, batch):
+    # Escreve todos os frames até o fim, tratando envios parciais
+    if len(batch) == 1:
+        sock.sendall(batch[0])
+        return
+    if not hasattr(sock, "sendmsg"):
+        sock.sendall(b"".join(batch))
+        return
+    buffers = deque(memoryview(frame) for frame in batch)
+    while buffers:
+        sent = sock.sendmsg(buffers)
+        while sent:
+            head = buffers[0]
+            if sent >= len(head):
+                sent -= len(head)
+                buffers.popleft()
+            else:
+                buffers[0] = head[sent:]
+                sent = 0
+
+
+class SocketWriter:
+    """Único escritor de um socket bloqueante, em uma thread própria.
+
+    `send` pode ser chamado de qualquer thread e nunca escreve no socket:
+    só enfileira. Com coalesce=False cada frame sai em uma escrita separada,
+    para servidores que leem um JSON por recv (o ConsoleAppTeste). Com
+    set_keepalive a própria thread envia o heartbeat quando nada saiu por
+    `interval` segundos.
+    """
+
+    def __init__(self, sock, max_bytes=DEFAULT_MAX_BYTES, policy=BLOCK, coalesce=False):
+        self.sock = sock
+        self.queue = OutboundQueue(max_bytes, policy)
+        self.coalesce = coalesce
+        self.error = None
+        self.keepalive_frame = None
+        self.keepalive_interval = None
+        self.heartbeats = 0
+        self._last_sent = time.monotonic()
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def set_keepalive(self, frame, interval):
+        with self._cond:
+            self.keepalive_frame = frame
+            self.keepalive_interval = interval
+            self._cond.notify_all()
+
+    def _wait_for_work(self):
+        # Chamado com o lock: espera frames, fechamento ou a hora do heartbeat
+        while not (self._closed or self.queue):
+            timeout = None
+            if self.keepalive_frame is not None:
+                timeout = self._last_sent + self.keepalive_interval - time.monotonic()
+                if timeout <= 0:
+                    self.queue.push(self.keepalive_frame, priority=True)
+                    self.heartbeats += 1
+                    return
+            self._cond.wait(timeout)
+
+    def send(self, frame, priority=False, timeout=None):
+        with self._cond:
+            if self._closed:
+                return False
+            if self.queue.policy == BLOCK and not priority:
+                size = len(frame)
+                ready = self._cond.wait_for(
+                    lambda: self._closed or self.queue.has_room(size), timeout)
+                if self._closed:
+                    return False
+                if not ready:
+                    self.queue.rejected += 1
+                    return False
+            queued = self.queue.push(frame, priority)
+            self._cond.notify_all()
+            return queued
+
+    def close(self, timeout=1.0):
+        # Fecha depois de escrever o que já estava na fila
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _run(self):
+        max_frames = MAX_BATCH if self.coalesce else 1
+        while True:
+            with self._cond:
+                self._wait_for_work()
+                if not self.queue:
+                    return
+                batch = self.queue.pop_batch(max_frames)
+                self._cond.notify_all()     # acorda quem espera espaço (BLOCK)
+            try:
+                send_batch(self.sock, batch)
+                self._last_sent = time.monotonic()
+            except OSError as e:
+                with self._cond:
+                    self.error = e
+                    self._closed = True
+                    self.queue.clear()
+                    self._cond.notify_all()
+                return
@@ -0,0 +1,5 @@
+from .clientlist import ClientIdRole, ClientListModel, ClientListPanel
+from .conversations import ConversationKeyRole, ConversationListModel, ConversationSwitcher
+from .messages import MessageListModel, MessageView
+from .batching import BatchStats, UiBatcher
+from .search import SCOPE_ALL, SCOPE_CURRENT, SEARCH_LIMIT, SearchHitRole, SearchPanel, SearchResultsModel
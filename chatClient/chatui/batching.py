@@ -0,0 +1,80 @@
+import time
+
+from PyQt5.QtCore import QObject, QTimer
+
+FRAME_INTERVAL_MS = 16
+
+
+class BatchStats:
+    def __init__(self, budget_ms=FRAME_INTERVAL_MS):
+        self.budget_ms = budget_ms      # um flush acima disto perde um quadro
+        self.over_budget = 0
+        self.flushes = 0
+        self.events = 0
+        self.max_batch = 0
+        self.last_batch = 0
+        self.flush_ms_total = 0.0
+        self.max_flush_ms = 0.0
+        self.last_flush_ms = 0.0
+
+    def record(self, batch, flush_ms):
+        self.flushes += 1
+        self.events += batch
+        self.last_batch = batch
+        self.max_batch = max(self.max_batch, batch)
+        self.last_flush_ms = flush_ms
+        self.flush_ms_total += flush_ms
+        self.max_flush_ms = max(self.max_flush_ms, flush_ms)
+        if flush_ms > self.budget_ms:
+            self.over_budget += 1
+
+    @property
+    def mean_batch(self):
+        return self.events / self.flushes if self.flushes else 0.0
+
+    @property
+    def mean_flush_ms(self):
+        return self.flush_ms_total / self.flushes if self.flushes else 0.0
+
+    def summary(self):
+        return (f"Lotes: {self.flushes} | msgs/lote: média {self.mean_batch:.1f}, máx {self.max_batch}"
+                f" | flush: média {self.mean_flush_ms:.2f} ms, máx {self.max_flush_ms:.2f} ms"
+                f", {self.over_budget} acima de {self.budget_ms:g} ms")
+
+
+class UiBatcher(QObject):
+    """Acumula eventos por conversa e entrega no máximo um lote por quadro.
+
+    flush(key, entries) é chamado uma vez por conversa com tudo o que chegou
+    desde o último quadro, para virar uma única edição do modelo.
+    """
+
+    def __init__(self, flush, interval_ms=FRAME_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self._flush = flush
+        self._pending = {}
+        self._count = 0
+        self.stats = BatchStats(interval_ms)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.flush)
+
+    def add(self, key, entry):
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = []
+        pending.append(entry)
+        self._count += 1
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, count = self._pending, self._count
+        self._pending, self._count = {}, 0
+        started = time.perf_counter()
+        for key, entries in pending.items():
+            self._flush(key, entries)
+        self.stats.record(count, (time.perf_counter() - started) * 1000)
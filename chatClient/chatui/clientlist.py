@@ -0,0 +1,114 @@
+from bisect import bisect_left
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, QSortFilterProxyModel, Qt
+from PyQt5.QtWidgets import QLineEdit, QListView, QVBoxLayout, QWidget, QLabel
+
+ClientIdRole = Qt.UserRole + 1
+
+
+class ClientListModel(QAbstractListModel):
+    """Lista ordenada de IDs online, atualizada por diferença.
+
+    set_ids() compara o novo conjunto com o atual e só insere/remove as
+    linhas que mudaram, então o custo de cada atualização acompanha a
+    rotatividade e não o total de clientes.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._ids = []
+        self._present = set()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._ids)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        client_id = self._ids[index.row()]
+        if role == Qt.DisplayRole:
+            return f"Cliente {client_id}"
+        if role == ClientIdRole:
+            return client_id
+        return None
+
+    def client_ids(self):
+        return list(self._ids)
+
+    def set_ids(self, ids):
+        new = set(ids)
+        removed = self._present - new
+        added = new - self._present
+        for client_id in sorted(removed, reverse=True):
+            self.remove_id(client_id)
+        for client_id in sorted(added):
+            self.add_id(client_id)
+
+    def add_id(self, client_id):
+        if client_id in self._present:
+            return
+        row = bisect_left(self._ids, client_id)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._ids.insert(row, client_id)
+        self._present.add(client_id)
+        self.endInsertRows()
+
+    def remove_id(self, client_id):
+        if client_id not in self._present:
+            return
+        row = bisect_left(self._ids, client_id)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._ids[row]
+        self._present.discard(client_id)
+        self.endRemoveRows()
+
+
+class ClientListPanel(QWidget):
+    # Barra lateral: filtro por digitação + QListView (só desenha linhas visíveis)
+    def __init__(self, on_select, parent=None):
+        super().__init__(parent)
+        self.model = ClientListModel(self)
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.title = QLabel("Clientes Online")
+        self.title.setStyleSheet("font-weight: bold; font-size: 14px;")
+        layout.addWidget(self.title)
+
+        self.filter = QLineEdit()
+        self.filter.setPlaceholderText("Filtrar clientes...")
+        self.filter.setClearButtonEnabled(True)
+        self.filter.textChanged.connect(self.proxy.setFilterFixedString)
+        self.filter.returnPressed.connect(self._select_first)
+        layout.addWidget(self.filter)
+
+        self.view = QListView()
+        self.view.setModel(self.proxy)
+        self.view.setUniformItemSizes(True)
+        self.view.setEditTriggers(QListView.NoEditTriggers)
+        self.view.clicked.connect(lambda index: on_select(index.data(ClientIdRole)))
+        layout.addWidget(self.view)
+        self._on_select = on_select
+
+    def _select_first(self):
+        # Enter no filtro conecta com o primeiro cliente visível
+        if self.proxy.rowCount() > 0:
+            self._on_select(self.proxy.index(0, 0).data(ClientIdRole))
+
+    def set_clients(self, ids, exclude=None):
+        self.model.set_ids(i for i in ids if i != exclude)
+        self._update_title()
+
+    def apply_delta(self, added, removed, exclude=None):
+        for client_id in removed:
+            self.model.remove_id(client_id)
+        for client_id in added:
+            if client_id != exclude:
+                self.model.add_id(client_id)
+        self._update_title()
+
+    def _update_title(self):
+        self.title.setText(f"Clientes Online ({self.model.rowCount()})")
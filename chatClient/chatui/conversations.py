@@ -0,0 +1,151 @@
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt
+from PyQt5.QtGui import QFont, QKeySequence
+from PyQt5.QtWidgets import QLabel, QListView, QShortcut, QVBoxLayout, QWidget
+
+ConversationKeyRole = Qt.UserRole + 3
+
+
+class ConversationListModel(QAbstractListModel):
+    """Conversas abertas, na ordem em que foram abertas, com não lidas.
+
+    `_rows` leva da chave da conversa à linha, então marcar uma mensagem
+    nova não percorre a lista; só a linha afetada é redesenhada.
+    """
+
+    def __init__(self, title, parent=None):
+        super().__init__(parent)
+        self._title = title     # chave -> texto exibido
+        self._keys = []
+        self._rows = {}
+        self._unread = {}
+        self._total_unread = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._keys)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        key = self._keys[index.row()]
+        unread = self._unread.get(key, 0)
+        if role == Qt.DisplayRole:
+            title = self._title(key)
+            return f"{title} ({unread})" if unread else title
+        if role == Qt.FontRole and unread:
+            font = QFont()
+            font.setBold(True)
+            return font
+        if role == ConversationKeyRole:
+            return key
+        return None
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def row_of(self, key):
+        return self._rows.get(key)
+
+    def key_at(self, row):
+        return self._keys[row]
+
+    def unread(self, key):
+        return self._unread.get(key, 0)
+
+    def total_unread(self):
+        return self._total_unread
+
+    def open(self, key):
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self._keys)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._keys.append(key)
+            self._rows[key] = row
+            self.endInsertRows()
+        return row
+
+    def close(self, key):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._keys[row]
+        self._total_unread -= self._unread.pop(key, 0)
+        for moved in self._keys[row:]:
+            self._rows[moved] -= 1
+        self.endRemoveRows()
+
+    def add_unread(self, key, count=1):
+        row = self.open(key)
+        self._unread[key] = self._unread.get(key, 0) + count
+        self._total_unread += count
+        self._changed(row)
+
+    def clear_unread(self, key):
+        count = self._unread.pop(key, 0)
+        if count:
+            self._total_unread -= count
+            self._changed(self._rows[key])
+
+    def refresh(self, key):
+        row = self._rows.get(key)
+        if row is not None:
+            self._changed(row)
+
+    def _changed(self, row):
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.FontRole])
+
+
+class ConversationSwitcher(QWidget):
+    # Lista de conversas abertas; Ctrl+PgDown/PgUp alternam e Ctrl+J vai para
+    # a próxima com mensagens não lidas
+    def __init__(self, title, on_select, parent=None):
+        super().__init__(parent)
+        self.model = ConversationListModel(title, self)
+        self._on_select = on_select
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.title = QLabel("Conversas")
+        self.title.setStyleSheet("font-weight: bold; font-size: 14px;")
+        layout.addWidget(self.title)
+
+        self.view = QListView()
+        self.view.setModel(self.model)
+        self.view.setUniformItemSizes(True)
+        self.view.setEditTriggers(QListView.NoEditTriggers)
+        self.view.clicked.connect(lambda index: on_select(index.data(ConversationKeyRole)))
+        layout.addWidget(self.view)
+
+        # Atalhos valem na janela inteira (contexto padrão do QShortcut)
+        QShortcut(QKeySequence("Ctrl+PgDown"), self, lambda: self.step(1))
+        QShortcut(QKeySequence("Ctrl+PgUp"), self, lambda: self.step(-1))
+        QShortcut(QKeySequence("Ctrl+J"), self, self.next_unread)
+        self.model.dataChanged.connect(self._update_title)
+        self.model.rowsRemoved.connect(self._update_title)
+
+    def select(self, key):
+        # Marca a conversa ativa (sem chamar on_select de novo)
+        row = self.model.open(key)
+        self.model.clear_unread(key)
+        self.view.setCurrentIndex(self.model.index(row))
+
+    def step(self, delta):
+        count = self.model.rowCount()
+        if count:
+            row = (self.view.currentIndex().row() + delta) % count
+            self._on_select(self.model.key_at(row))
+
+    def next_unread(self):
+        count = self.model.rowCount()
+        start = self.view.currentIndex().row()
+        for offset in range(1, count + 1):
+            key = self.model.key_at((start + offset) % count)
+            if self.model.unread(key):
+                self._on_select(key)
+                return
+
+    def _update_title(self, *_):
+        unread = self.model.total_unread()
+        self.title.setText(f"Conversas ({unread} não lidas)" if unread else "Conversas")
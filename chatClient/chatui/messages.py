@@ -0,0 +1,164 @@
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt
+from PyQt5.QtWidgets import QAbstractItemView, QListView
+
+# Linhas no modelo enquanto a view acompanha o fim da conversa. Com quebra
+# de linha e alturas variáveis, a view remede todas as linhas do modelo a
+# cada inserção ou remoção: o custo de um lote depende deste tamanho, não do
+# limite do histórico em memória.
+WINDOW = 200
+OLDER_PAGE = 200
+
+
+class MessageListModel(QAbstractListModel):
+    """Janela visível de um ConversationHistory.
+
+    As linhas são as posições `start` até o fim da conversa (posições
+    absolutas: as despejadas no disco vêm antes das que estão em memória).
+    Acompanhando o fim, são só as últimas `window` mensagens. Páginas
+    anteriores entram quando o usuário rola até o topo, da memória ou
+    relidas do disco (`older`), e saem ao voltar para o fim.
+    """
+
+    def __init__(self, history, formatter, parent=None, window=WINDOW):
+        super().__init__(parent)
+        self.history = history
+        self.formatter = formatter
+        self.window = window
+        self.expanded = False       # páginas anteriores abertas
+        self.start = max(0, len(history) - window)
+        self.older = history.read_spilled(self.start, history.spilled)  # posições [start, spilled)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.history) - self.start
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        position = self.start + index.row()
+        spilled = self.history.spilled
+        if position < spilled:
+            return self.formatter(self.older[position - self.start])
+        return self.formatter(self.history.messages[position - spilled])
+
+    def append(self, entry):
+        self.extend([entry])
+
+    def extend(self, entries):
+        # Um lote inteiro vira no máximo uma remoção + uma inserção de linhas
+        count = len(entries)
+        if not count:
+            return
+        history = self.history
+        if not self.expanded and count >= self.window:
+            self.beginResetModel()
+            history.extend(entries)
+            self.start = len(history) - self.window
+            self.older = history.read_spilled(self.start, history.spilled)
+            self.endResetModel()
+            return
+        drop = 0 if self.expanded else self.rowCount() + count - self.window
+        if drop > 0:
+            self._drop_top(drop)
+        row = self.rowCount()
+        self.beginInsertRows(QModelIndex(), row, row + count - 1)
+        spilled = history.spilled
+        evicted = history.extend(entries)
+        # O que sai da memória e ainda está na janela continua visível
+        if evicted and self.start < history.spilled:
+            self.older.extend(evicted[max(0, self.start - spilled):])
+        self.endInsertRows()
+
+    def _drop_top(self, count):
+        self.beginRemoveRows(QModelIndex(), 0, count - 1)
+        self.start += count
+        del self.older[:count]
+        self.endRemoveRows()
+
+    def refresh(self, entry, scan=OLDER_PAGE):
+        # Redesenha uma linha recente (ex.: mudou o estado de entrega)
+        messages = self.history.messages
+        for offset in range(1, min(scan, len(messages)) + 1):
+            if messages[-offset] is entry:
+                row = len(self.history) - offset - self.start
+                if row < 0:
+                    return False
+                index = self.index(row)
+                self.dataChanged.emit(index, index, [Qt.DisplayRole])
+                return True
+        return False
+
+    def can_load_older(self):
+        return self.start > 0
+
+    def load_older(self, count=OLDER_PAGE):
+        start = max(0, self.start - count)
+        loaded = self.start - start
+        if not loaded:
+            return 0
+        page = self.history.read_spilled(start, min(self.start, self.history.spilled))
+        self.beginInsertRows(QModelIndex(), 0, loaded - 1)
+        self.older[:0] = page
+        self.start = start
+        self.expanded = True
+        self.endInsertRows()
+        return loaded
+
+    def release_older(self):
+        # Volta a acompanhar o fim só com as últimas `window` linhas
+        if not self.expanded:
+            return
+        self.expanded = False
+        drop = self.rowCount() - self.window
+        if drop > 0:
+            self._drop_top(drop)
+
+
+class MessageView(QListView):
+    # Lista de mensagens: só pinta as linhas visíveis e carrega páginas
+    # antigas sob demanda ao rolar para o topo
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWordWrap(True)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.verticalScrollBar().valueChanged.connect(self._on_scroll)
+
+    def setModel(self, model):
+        old = self.model()
+        if old is not None:
+            old.rowsInserted.disconnect(self._on_rows_inserted)
+            old.modelReset.disconnect(self._on_reset)
+        super().setModel(model)
+        model.rowsInserted.connect(self._on_rows_inserted)
+        model.modelReset.connect(self._on_reset)
+        self._follow = True
+        self.scrollToBottom()
+
+    def at_bottom(self):
+        bar = self.verticalScrollBar()
+        return bar.value() >= bar.maximum() - 4
+
+    def _on_rows_inserted(self, parent, first, last):
+        model = self.model()
+        if first > 0 and last == model.rowCount() - 1 and self._follow:
+            self.scrollToBottom()
+
+    def _on_reset(self):
+        if self._follow:
+            self.scrollToBottom()
+
+    def _on_scroll(self, value):
+        model = self.model()
+        bar = self.verticalScrollBar()
+        self._follow = value >= bar.maximum() - 4
+        if model is None:
+            return
+        if value == bar.minimum() and model.can_load_older():
+            loaded = model.load_older()
+            if loaded:
+                self.scrollTo(model.index(loaded, 0), QAbstractItemView.PositionAtTop)
+        elif self._follow and model.expanded:
+            model.release_older()
+
+    _follow = True
@@ -0,0 +1,135 @@
+import time
+
+from PyQt5.QtCore import QAbstractListModel, QDate, QDateTime, QModelIndex, Qt, QTimer, QTime
+from PyQt5.QtWidgets import (
+    QCheckBox, QComboBox, QDateEdit, QHBoxLayout, QLabel, QLineEdit, QListView, QVBoxLayout, QWidget
+)
+
+SearchHitRole = Qt.UserRole + 2
+SEARCH_DELAY_MS = 150   # espera a digitação parar antes de consultar
+SEARCH_LIMIT = 200
+
+SCOPE_ALL = 0
+SCOPE_CURRENT = 1
+
+
+class SearchResultsModel(QAbstractListModel):
+    # Resultados de MessageStore.search, mais recentes primeiro
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._hits = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._hits)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        hit = self._hits[index.row()]
+        if role == Qt.DisplayRole:
+            where = "Geral" if hit.peer == 0 else f"Cliente {hit.peer}"
+            when = time.strftime("%d/%m %H:%M", time.localtime(hit.received_at))
+            return f"{where} · {when}\n{hit.snippet}"
+        if role == Qt.ToolTipRole:
+            return hit.content
+        if role == SearchHitRole:
+            return hit
+        return None
+
+    def set_hits(self, hits):
+        self.beginResetModel()
+        self._hits = list(hits)
+        self.endResetModel()
+
+
+class SearchPanel(QWidget):
+    """Busca no histórico local: termos, "frase exata" e prefixo*.
+
+    `search(text, scope, since, until)` faz a consulta (since/until em epoch
+    ou None); `on_select(hit)` é chamado ao clicar num resultado.
+    """
+
+    def __init__(self, search, on_select, parent=None):
+        super().__init__(parent)
+        self._search = search
+        self.model = SearchResultsModel(self)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        title = QLabel("Buscar no histórico")
+        title.setStyleSheet("font-weight: bold; font-size: 14px;")
+        layout.addWidget(title)
+
+        self.query = QLineEdit()
+        self.query.setPlaceholderText('palavra, "frase exata", prefi*')
+        self.query.setClearButtonEnabled(True)
+        layout.addWidget(self.query)
+
+        self.scope = QComboBox()
+        self.scope.addItems(["Todas as conversas", "Conversa atual"])
+        layout.addWidget(self.scope)
+
+        period = QHBoxLayout()
+        self.use_period = QCheckBox("De")
+        period.addWidget(self.use_period)
+        today = QDate.currentDate()
+        self.since = QDateEdit(today.addDays(-7))
+        self.until = QDateEdit(today)
+        for edit in (self.since, self.until):
+            edit.setCalendarPopup(True)
+            edit.setEnabled(False)
+        period.addWidget(self.since)
+        period.addWidget(QLabel("até"))
+        period.addWidget(self.until)
+        layout.addLayout(period)
+
+        self.view = QListView()
+        self.view.setModel(self.model)
+        self.view.setUniformItemSizes(True)
+        self.view.setEditTriggers(QListView.NoEditTriggers)
+        self.view.clicked.connect(lambda index: on_select(index.data(SearchHitRole)))
+        layout.addWidget(self.view)
+
+        self.status = QLabel()
+        self.status.setStyleSheet("color: gray; font-size: 10px;")
+        layout.addWidget(self.status)
+
+        # Uma consulta por pausa na digitação, não uma por tecla
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(SEARCH_DELAY_MS)
+        self.timer.timeout.connect(self.run)
+        self.query.textChanged.connect(self.schedule)
+        self.query.returnPressed.connect(self.run)
+        self.scope.currentIndexChanged.connect(self.schedule)
+        self.use_period.toggled.connect(self.since.setEnabled)
+        self.use_period.toggled.connect(self.until.setEnabled)
+        self.use_period.toggled.connect(self.schedule)
+        self.since.dateChanged.connect(self.schedule)
+        self.until.dateChanged.connect(self.schedule)
+
+    def schedule(self, *_):
+        self.timer.start()
+
+    def period(self):
+        if not self.use_period.isChecked():
+            return None, None
+        # Datas inteiras: do início de `since` até o fim de `until`
+        since = QDateTime(self.since.date(), QTime(0, 0)).toSecsSinceEpoch()
+        until = QDateTime(self.until.date().addDays(1), QTime(0, 0)).toSecsSinceEpoch()
+        return since, until
+
+    def run(self):
+        self.timer.stop()
+        text = self.query.text()
+        if not text.strip():
+            self.model.set_hits([])
+            self.status.clear()
+            return
+        since, until = self.period()
+        start = time.perf_counter()
+        hits = self._search(text, self.scope.currentIndex(), since, until)
+        elapsed = (time.perf_counter() - start) * 1000
+        self.model.set_hits(hits)
+        more = "+" if len(hits) >= SEARCH_LIMIT else ""
+        self.status.setText(f"{len(hits)}{more} resultados em {elapsed:.1f} ms")
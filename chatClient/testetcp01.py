@@ -1,32 +1,38 @@
 import socket
 import threading
-import time
-import json
+
+from chatcore import (
+    ASSIGNED_ID_PREFIX, BLOCK, DEFAULT_IDLE_TIMEOUT, FrameDecoder, MessageEncoder,
+    SocketWriter, enable_tcp_keepalive, interval_for, is_group
+)
 
 receiver_id = 0
 conversation_id = 0
+TCP_KEEPALIVE = False  # Optional kernel keepalive to notice a dead server
 
-def receive_messages(sock, client_id):
+def receive_messages(sock, writer, encoder, decoder):
     
     while True:
         try:
-            message = sock.recv(1024).decode('utf-8')
-            if message:
-                # Deserialize the JSON message
-                data = json.loads(message)
+            # Handle every complete frame already buffered before reading again
+            for data in decoder.messages():
                 print(f"\n{data['Content']}")
                 if 'SenderId' in data and data['SenderId'] == 0:
                     print("Server: " + data['Content'])
+                elif is_group(data.get('ConversationId')):
+                    # Group fan-out (/multicast): no ack, or the sender gets one per member
+                    print(f"[Group {data['ConversationId']}] Client {data['SenderId']}")
                 elif 'SenderId' in data and data['SenderId'] != 0:
-                    acknoledgment(sock, data, client_id)
-                    
-
+                    acknoledgment(writer, data, encoder)
+            if decoder.recv_into(sock) == 0:
+                print("Disconnected from server.")
+                break
                     
         except Exception as e:
             print("An error occurred:", e)
             break
 
-def send_messages(sock, client_id):
+def send_messages(writer, encoder):
     global conversation_id
     global receiver_id
     while True:
@@ -37,65 +43,18 @@ def send_messages(sock, client_id):
             conversation_id = 0
             receiver_id = 0
         if message:
-            # Create a message dictionary
-            msg_dict = {
-            "SenderId": client_id,  # Use the assigned client ID
-            "ReceiverId": receiver_id,  # This can be set when connecting to another client
-            "Content": message,
-            "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
-            "ConversationId": conversation_id
-            }
-        # Serialize the dictionary to JSON
-        json_message = json.dumps(msg_dict)
-        sock.send(json_message.encode('utf-8'))
-
-def send_heartbeat(sock, client_id):
-    
-    while True:
-        time.sleep(3)  # Send a heartbeat every 5 seconds
-        try:
-            # Create a message dictionary
-            msg_dict = {
-                "SenderId": client_id,  # Use the assigned client ID
-                "ReceiverId": receiver_id,  # This can be set when connecting to another client
-                "Content": "heartbeat",
-                "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
-                "ConversationId": conversation_id
-            }
-            # Serialize the dictionary to JSON
-            json_message = json.dumps(msg_dict)
-            sock.send(json_message.encode('utf-8'))
-        except:
-            break  # Stop if the connection is closed
+            # Encode straight to bytes; the timestamp is cached per second.
+            # With BLOCK this waits for queue space instead of the kernel buffer
+            writer.send(encoder.message(receiver_id, message, conversation_id))
 
-def acknoledgment(sock, data, client_id):
+def acknoledgment(writer, data, encoder):
     global conversation_id
     global receiver_id
     
     if data['SenderId'] != conversation_id:
-                conversation_id = data['SenderId']
-                receiver_id = data["SenderId"]
-                msg_dict = {
-                "SenderId": client_id,  # Use the assigned client ID
-                "ReceiverId": receiver_id,  # This can be set when connecting to another client
-                "Content": "/acknoledgment",
-                "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
-                "ConversationId": conversation_id
-                }
-               # Serialize the dictionary to JSON
-                json_message = json.dumps(msg_dict)
-                sock.send(json_message.encode('utf-8'))
-    else:
-                msg_dict = {
-                "SenderId": client_id,  # Use the assigned client ID
-                "ReceiverId": receiver_id,  # This can be set when connecting to another client
-                "Content": "/acknoledgment",
-                "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
-                "ConversationId": conversation_id
-                }
-                # Serialize the dictionary to JSON
-                json_message = json.dumps(msg_dict)
-                sock.send(json_message.encode('utf-8'))
+        conversation_id = data['SenderId']
+        receiver_id = data["SenderId"]
+    writer.send(encoder.ack(receiver_id), priority=True)
 
 
 def main():
@@ -104,26 +63,37 @@ def main():
 
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     client_socket.connect((server_ip, server_port))
+    if TCP_KEEPALIVE:
+        enable_tcp_keepalive(client_socket)
 
     # Start the thread to receive messages
     
 
     # Keep the main thread open to send messages
+    decoder = FrameDecoder()
     client_id = None
     while client_id is None:
         # Receive the assigned client ID
-        message = client_socket.recv(1024).decode('utf-8')
-        if message:
-            data = json.loads(message)
-            if 'Content' in data and 'Your assigned client ID is' in data['Content']:
+        if decoder.recv_into(client_socket) == 0:
+            print("Disconnected from server.")
+            return
+        for data in decoder.messages():
+            if 'Content' in data and ASSIGNED_ID_PREFIX in data['Content']:
                 client_id = data['ReceiverId']
                 print(f"Assigned Client ID: {client_id}")
+                break
     
-    threading.Thread(target=receive_messages, args=(client_socket,client_id,), daemon=True).start()
-    threading.Thread(target=send_heartbeat, args=(client_socket, client_id,), daemon=True).start()
-    print("Enter command ('/list' to see clients, '/connect <client_id>' to start conversation, '/exit' to leave conversation, 'exit' to quit): ")
-    send_messages(client_socket, client_id)
+    encoder = MessageEncoder(client_id)
+    # Single writer thread owns every send on the socket. It also sends the
+    # heartbeat, but only after an interval with no other outbound frame
+    writer = SocketWriter(client_socket, policy=BLOCK)
+    writer.set_keepalive(encoder.heartbeat, interval_for(DEFAULT_IDLE_TIMEOUT))
+    writer.start()
+    threading.Thread(target=receive_messages, args=(client_socket, writer, encoder, decoder,), daemon=True).start()
+    print("Enter command ('/list' to see clients, '/connect <client_id>' to start conversation, '/exit' to leave conversation, '/group create <name> [ids]' or '/group join <name>' for groups, '/multicast <id>,<id> <text>' to send to many, 'exit' to quit): ")
+    send_messages(writer, encoder)
     
+    writer.close()
     client_socket.close()
             
 